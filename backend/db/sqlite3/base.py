@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """SQLite backend for DB_PROFILE=sqlite.
+
+    Every new connection gets the SQLITE_PRAGMAS profile (WAL, busy timeout,
+    mmap, page cache), and transactions take the write lock when they begin.
+
+    A plain BEGIN only locks on the first write; in WAL mode a transaction
+    that read first then fails with "database is locked" if another writer
+    committed meanwhile, without waiting for the busy timeout. BEGIN
+    IMMEDIATE waits for the lock up front instead.
+    """
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute("BEGIN IMMEDIATE")
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
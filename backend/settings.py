@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 
 from pathlib import Path
 import os
+
+from django.core.exceptions import ImproperlyConfigured
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -86,18 +88,221 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DB_PROFILE picks the database setup:
+#   sqlite        WAL journal, synchronous=NORMAL, busy timeout, mmap and a
+#                 larger page cache, applied to every new connection
+#                 (SQLITE_PRAGMAS), and transactions that take the write lock
+#                 up front so concurrent bookings wait instead of failing
+#   sqlite-plain  Django's stock SQLite settings, for comparison
+#   postgres      PostgreSQL (needs psycopg) with persistent, health-checked
+#                 connections. Set POSTGRES_PGBOUNCER=1 when connecting
+#                 through PgBouncer in transaction pooling mode.
+DB_PROFILE = os.environ.get('DB_PROFILE', 'sqlite')
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 600))
+
+if DB_PROFILE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'event_booking'),
+            'USER': os.environ.get('POSTGRES_USER', 'postgres'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            # Server-side cursors don't survive PgBouncer's transaction pooling.
+            'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('POSTGRES_PGBOUNCER') == '1',
+        }
+    }
+elif DB_PROFILE == 'sqlite-plain':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+        }
+    }
+elif DB_PROFILE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'backend.db.sqlite3',
+            'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+        }
     }
+else:
+    raise ImproperlyConfigured(f"Unknown DB_PROFILE {DB_PROFILE!r}.")
+
+# Applied to each new connection by the backend.db.sqlite3 engine.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 20000)),
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    # Negative values are KiB: 64 MiB of page cache per connection.
+    'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -64 * 1024)),
 }
 
+# Read replicas: DB_REPLICAS is a comma-separated list of SQLite files, or of
+# PostgreSQL hosts with DB_PROFILE=postgres. Slot, category and preference
+# reads go to them (scheduler.routers.ReplicaRouter), except for users who
+# wrote something in the last REPLICA_STICKY_SECONDS (a signed cookie, so it
+# works across workers). Locally,
+# "python manage.py sync_replicas" copies the primary SQLite file over.
+DB_REPLICAS = [location for location in os.environ.get('DB_REPLICAS', '').split(',') if location]
+DATABASE_REPLICAS = []
+for number, location in enumerate(DB_REPLICAS, start=1):
+    alias = f'replica{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST' if DB_PROFILE == 'postgres' else 'NAME': location,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ['scheduler.routers.ReplicaRouter'] if DATABASE_REPLICAS else []
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+if DATABASE_REPLICAS:
+    MIDDLEWARE.append('scheduler.routers.ReplicaRoutingMiddleware')
+
+
+# Stateless mode trusts the verified token claims (username, is_staff,
+# is_superuser) instead of loading the User row on every request.
+# Deactivating a user, or changing their staff/superuser flags, revokes their
+# tokens in the TokenRevocation table. Each process caches the lookup for
+# AUTH_REVOCATION_CACHE_TIMEOUT seconds, which bounds how long other workers
+# keep accepting a revoked token.
+JWT_STATELESS_AUTH = os.environ.get('JWT_STATELESS_AUTH', '1') == '1'
+AUTH_USER_CACHE_TIMEOUT = int(os.environ.get('AUTH_USER_CACHE_TIMEOUT', 300))
+AUTH_REVOCATION_CACHE_TIMEOUT = int(os.environ.get('AUTH_REVOCATION_CACHE_TIMEOUT', 5))
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
+        'scheduler.authentication.StatelessJWTAuthentication'
+        if JWT_STATELESS_AUTH else
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
+    # Reverse proxies in front of the app. The per-IP login bucket takes the
+    # client address from X-Forwarded-For only past that many proxies; with
+    # 0 it uses REMOTE_ADDR, so a forged header can't pick a fresh bucket.
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
+    # Token buckets for /api/token/ and /api/register/, checked before any
+    # password is hashed: "5/min" is a burst of 5 refilled at 5 per minute.
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': os.environ.get('LOGIN_RATE_IP', '30/min'),
+        'login_username': os.environ.get('LOGIN_RATE_USERNAME', '5/min'),
+    },
+}
+
+# authenticate() checks login passwords through the hashing pool below.
+AUTHENTICATION_BACKENDS = ['scheduler.hashing.PooledModelBackend']
+
+# Password hashing for login and registration runs in a process pool so it
+# doesn't starve request workers. When all workers are busy and the queue is
+# full, API logins and registrations get 503 with Retry-After; other callers
+# of authenticate(), such as the admin login, hash inline. 0 workers always
+# hashes inline.
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+PASSWORD_HASH_QUEUE_SIZE = int(os.environ.get('PASSWORD_HASH_QUEUE_SIZE', 8))
+PASSWORD_HASH_RETRY_AFTER = int(os.environ.get('PASSWORD_HASH_RETRY_AFTER', 1))
+
+# Processes POST /api/users/bulk/ hashes passwords in, started once and shared
+# by all bulk requests (0 or 1 hashes in the request thread). The
+# provision_users command takes --workers instead and uses all cores by default.
+PROVISIONING_WORKERS = int(os.environ.get('PROVISIONING_WORKERS', 2))
+
+# Cache used for versioned week listings. Any Django backend works, e.g.
+# CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache with a directory
+# as CACHE_LOCATION to share it between worker processes without Redis.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'event-booking'),
+    }
+}
+
+SLOT_CACHE_TIMEOUT = int(os.environ.get('SLOT_CACHE_TIMEOUT', 300))
+# Preference changes only clear the cached category ids in the process that
+# handled them. With the per-process locmem default, other workers serve the
+# old ids until the entry expires, so keep it short unless the cache is shared.
+CACHE_IS_SHARED = not CACHES['default']['BACKEND'].endswith('.LocMemCache')
+PREFERENCE_CACHE_TIMEOUT = int(os.environ.get('PREFERENCE_CACHE_TIMEOUT', 3600 if CACHE_IS_SHARED else 10))
+
+# Recurring slot generation (POST /api/slots/recurring/)
+SLOT_RECURRENCE_LIMIT = int(os.environ.get('SLOT_RECURRENCE_LIMIT', 5000))
+SLOT_BULK_BATCH_SIZE = int(os.environ.get('SLOT_BULK_BATCH_SIZE', 500))
+
+# Rows fetched per database round trip by the streaming slot export
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 2000))
+
+# archive_slots: slots that ended more than SLOT_ARCHIVE_AFTER_DAYS ago move to
+# ArchivedTimeSlot, SLOT_ARCHIVE_BATCH_SIZE per transaction
+SLOT_ARCHIVE_AFTER_DAYS = int(os.environ.get('SLOT_ARCHIVE_AFTER_DAYS', 90))
+SLOT_ARCHIVE_BATCH_SIZE = int(os.environ.get('SLOT_ARCHIVE_BATCH_SIZE', 500))
+
+# Longest range, in days, served by GET /api/slots/availability/
+AVAILABILITY_MAX_DAYS = int(os.environ.get('AVAILABILITY_MAX_DAYS', 400))
+
+# Maximum number of slots in one batch book/unsubscribe request
+SLOT_BATCH_LIMIT = int(os.environ.get('SLOT_BATCH_LIMIT', 100))
+
+# Next-free-slot search (GET /api/slots/search/): default and longest range
+# in days, and the most results per request
+SLOT_SEARCH_DEFAULT_DAYS = int(os.environ.get('SLOT_SEARCH_DEFAULT_DAYS', 60))
+SLOT_SEARCH_MAX_DAYS = int(os.environ.get('SLOT_SEARCH_MAX_DAYS', 366))
+SLOT_SEARCH_MAX_LIMIT = int(os.environ.get('SLOT_SEARCH_MAX_LIMIT', 50))
+
+# Cursor pagination for /api/slots/ and /api/users/ (clients may pass ?page_size=)
+API_PAGE_SIZE = int(os.environ.get('API_PAGE_SIZE', 100))
+API_MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', 1000))
+
+
+# Live slot changes (GET /api/async/slots/events/). The in-process broadcaster
+# only reaches clients of the same process; with several workers, or WSGI and
+# ASGI servers side by side, use scheduler.events.SQLiteBroadcaster with a
+# file path as SLOT_EVENTS_LOCATION.
+SLOT_EVENTS = {
+    'BACKEND': os.environ.get('SLOT_EVENTS_BACKEND', 'scheduler.events.InProcessBroadcaster'),
+    'LOCATION': os.environ.get('SLOT_EVENTS_LOCATION', os.path.join(BASE_DIR, 'slot_events.sqlite3')),
+}
+SLOT_EVENTS_HEARTBEAT = int(os.environ.get('SLOT_EVENTS_HEARTBEAT', 15))
+
+
+# Metrics scraped from GET /api/metrics/ (Prometheus text format). With
+# several worker processes, point METRICS_DIR at a directory they share:
+# each process writes its totals there every METRICS_FLUSH_INTERVAL seconds
+# and the endpoint adds them up. Only staff users and scrapers sending
+# "Authorization: Bearer <METRICS_TOKEN>" may read them, unless
+# METRICS_PUBLIC=1 (e.g. when only reachable from a private network).
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_PUBLIC = os.environ.get('METRICS_PUBLIC') == '1'
+if METRICS_ENABLED:
+    MIDDLEWARE.insert(0, 'scheduler.metrics.MetricsMiddleware')
+
+# Request profiling (scheduler.profiling.RequestProfilingMiddleware), off
+# unless REQUEST_PROFILING=1. Sampled requests get a Server-Timing header and
+# a JSON log line on the "scheduler.profiling" logger; the full SQL is logged
+# only for requests slower than the threshold. SQL run this many times in one
+# request is flagged as a likely N+1.
+REQUEST_PROFILING = os.environ.get('REQUEST_PROFILING') == '1'
+REQUEST_PROFILING_SAMPLE_RATE = float(os.environ.get('REQUEST_PROFILING_SAMPLE_RATE', 0.1))
+REQUEST_PROFILING_SQL_THRESHOLD_MS = int(os.environ.get('REQUEST_PROFILING_SQL_THRESHOLD_MS', 500))
+REQUEST_PROFILING_REPEATED_QUERIES = int(os.environ.get('REQUEST_PROFILING_REPEATED_QUERIES', 5))
+if REQUEST_PROFILING:
+    MIDDLEWARE.insert(0, 'scheduler.profiling.RequestProfilingMiddleware')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'scheduler.profiling': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
 }
 
 
@@ -0,0 +1,145 @@
+"""Week-view latency as slot history grows, with and without archiving.
+
+For each --sizes step, that many past slots are loaded next to the current
+weeks, then GET /api/slots/?week=0 is timed (week cache cleared before every
+request, so each one hits the database) with the history still in the hot
+table. archive_slots then moves the history out and the week view is timed
+again. Once archived the hot table only holds the current weeks, so that
+latency should stay flat while the unarchived one shows what growth costs.
+
+    python benchmarks/archive_week_view.py [--sizes 10000 100000 1000000 5000000] [--repeat 200]
+"""
+import argparse
+import io
+import os
+import time
+from datetime import timedelta
+
+from common import report, setup_django, summarize, timed
+
+INSERT_BATCH = 5000
+
+
+def reset_history(cutoff):
+    from django.db import connection
+    from scheduler.models import ArchivedTimeSlot, TimeSlot
+
+    # Plain DELETEs: going through signals would take longer than the run.
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {quote(TimeSlot._meta.db_table)} WHERE {quote('start_time')} < %s",
+            [cutoff],
+        )
+        cursor.execute(f"DELETE FROM {quote(ArchivedTimeSlot._meta.db_table)}")
+
+
+def add_history(category_ids, user_ids, count):
+    from django.db import transaction
+    from django.utils import timezone
+    from scheduler.models import TimeSlot
+
+    # One slot per 15 minutes going back from a year ago, so everything is
+    # past the archive horizon; every fourth one booked.
+    newest = timezone.now() - timedelta(days=365)
+    for first in range(0, count, INSERT_BATCH):
+        with transaction.atomic():
+            TimeSlot.objects.bulk_create([
+                TimeSlot(
+                    category_id=category_ids[i % len(category_ids)],
+                    start_time=newest - timedelta(minutes=15 * i),
+                    end_time=newest - timedelta(minutes=15 * i - 10),
+                    user_id=user_ids[i % len(user_ids)] if i % 4 == 0 else None,
+                )
+                for i in range(first, min(first + INSERT_BATCH, count))
+            ])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000, 5000000])
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--current-slots', type=int, default=500, help="Slots in the four weeks around today.")
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    db_path = setup_django()
+
+    from django.contrib.auth.models import User
+    from django.core.cache import cache
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test import Client
+    from django.utils import timezone
+    from scheduler.models import ArchivedTimeSlot, EventCategory, TimeSlot
+    from scheduler.serializers import CustomTokenObtainPairSerializer
+
+    categories = EventCategory.objects.bulk_create([
+        EventCategory(name=f'Category {i}', description='') for i in range(10)
+    ])
+    users = User.objects.bulk_create([User(username=f'user{i}') for i in range(100)])
+    category_ids = [category.pk for category in categories]
+    user_ids = [user.pk for user in users]
+
+    now = timezone.now()
+    step = timedelta(days=28) / args.current_slots
+    TimeSlot.objects.bulk_create([
+        TimeSlot(
+            category_id=category_ids[i % len(category_ids)],
+            start_time=now - timedelta(days=14) + step * i,
+            end_time=now - timedelta(days=14) + step * i + step / 2,
+        )
+        for i in range(args.current_slots)
+    ])
+
+    client = Client()
+
+    def measure():
+        # Loading millions of rows outlasts an access token; get a fresh one.
+        token = f'Bearer {CustomTokenObtainPairSerializer.get_token(users[0]).access_token}'
+
+        def week_view():
+            cache.clear()
+            response = client.get('/api/slots/?week=0', HTTP_AUTHORIZATION=token)
+            assert response.status_code == 200, response.status_code
+
+        week_view()  # warm-up
+        return summarize(timed(week_view, args.repeat))
+
+    results = []
+    for size in args.sizes:
+        reset_history(now - timedelta(days=30))
+        started = time.perf_counter()
+        add_history(category_ids, user_ids, size)
+        inserted_seconds = time.perf_counter() - started
+
+        unarchived = measure()
+        hot_rows = TimeSlot.objects.count()
+
+        started = time.perf_counter()
+        call_command('archive_slots', '--pause', '0', '--batch-size', '5000', stdout=io.StringIO())
+        archive_seconds = time.perf_counter() - started
+
+        archived = measure()
+        results.append({
+            'history': size,
+            'hot_rows_before_archive': hot_rows,
+            'hot_rows_after_archive': TimeSlot.objects.count(),
+            'archived_rows': ArchivedTimeSlot.objects.count(),
+            'insert_seconds': round(inserted_seconds, 2),
+            'archive_seconds': round(archive_seconds, 2),
+            'week_view_without_archive': unarchived,
+            'week_view_with_archive': archived,
+        })
+        print(f"{size} rows: p50 {unarchived['p50_ms']} ms without archive, {archived['p50_ms']} ms with", flush=True)
+
+    report('archive_week_view', {
+        'vendor': connection.vendor,
+        'database_bytes': os.path.getsize(db_path) if connection.vendor == 'sqlite' else None,
+        'repeat': args.repeat,
+        'sizes': results,
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
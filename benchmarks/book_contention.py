@@ -0,0 +1,156 @@
+"""Write contention on POST /api/slots/<id>/book/ under each DB_PROFILE.
+
+Every thread is a different user booking (and releasing) slots drawn from a
+small shared pool, so most requests race for the same rows. A share of the
+threads use the batch endpoint, which reads before it writes. Each profile
+runs in its own process since DATABASES is fixed at startup.
+
+    python benchmarks/book_contention.py [--profiles sqlite-plain sqlite postgres] [--threads 16]
+
+The postgres profile reads POSTGRES_* from the environment and is included
+by default when POSTGRES_HOST is set.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+from common import report, setup_django, summarize
+
+
+def build_dataset(threads, slots):
+    from django.contrib.auth.models import User
+    from django.utils import timezone
+    from scheduler.models import EventCategory, TimeSlot
+    from scheduler.serializers import CustomTokenObtainPairSerializer
+
+    category = EventCategory.objects.create(name='Category', description='')
+    start = timezone.now() + timedelta(days=1)
+    # Slots don't overlap, so a user may hold several at once.
+    slot_ids = [
+        TimeSlot.objects.create(
+            category=category,
+            start_time=start + timedelta(hours=i),
+            end_time=start + timedelta(hours=i, minutes=30),
+        ).id
+        for i in range(slots)
+    ]
+    tokens = [
+        f'Bearer {CustomTokenObtainPairSerializer.get_token(User.objects.create(username=f"booker{i}")).access_token}'
+        for i in range(threads)
+    ]
+    return tokens, slot_ids
+
+
+def booker(index, token, slot_ids, batch, stop, latencies, outcomes):
+    from django.db import connection
+    from django.test import Client
+
+    client = Client()
+    rng = random.Random(index)
+    while not stop.is_set():
+        slot_id = rng.choice(slot_ids)
+        started = time.perf_counter()
+        try:
+            if batch:
+                response = client.post(
+                    '/api/slots/book/', {'slot_ids': [slot_id]}, content_type='application/json',
+                    HTTP_AUTHORIZATION=token,
+                )
+            else:
+                response = client.post(f'/api/slots/{slot_id}/book/', HTTP_AUTHORIZATION=token)
+        except Exception as e:  # "database is locked" and friends surface here
+            outcomes[type(e).__name__] += 1
+            continue
+        finally:
+            latencies.append(time.perf_counter() - started)
+        outcomes[str(response.status_code)] += 1
+        if response.status_code == 200:
+            # Give the slot back so the race goes on.
+            try:
+                client.post(f'/api/slots/{slot_id}/unsubscribe/', HTTP_AUTHORIZATION=token)
+            except Exception as e:
+                outcomes[f'unsubscribe {type(e).__name__}'] += 1
+    connection.close()
+
+
+def run_profile(args):
+    setup_django()
+    from django.conf import settings
+    from django.db import connection
+
+    tokens, slot_ids = build_dataset(args.threads, args.slots)
+    stop = threading.Event()
+    latencies, outcomes = [], Counter()
+    batch_threads = int(args.threads * args.batch_share)
+    threads = [
+        threading.Thread(target=booker, args=(i, token, slot_ids, i < batch_threads, stop, latencies, outcomes))
+        for i, token in enumerate(tokens)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    with connection.cursor() as cursor:
+        journal_mode = None
+        if connection.vendor == 'sqlite':
+            cursor.execute("PRAGMA journal_mode")
+            journal_mode = cursor.fetchone()[0]
+    return {
+        'engine': settings.DATABASES['default']['ENGINE'],
+        'journal_mode': journal_mode,
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        # A failed unsubscribe leaves its slot booked, so errors show up here too.
+        'bookings_per_second': round(outcomes['200'] / elapsed, 1),
+        'outcomes': dict(sorted(outcomes.items())),
+        'latency': summarize(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    default_profiles = ['sqlite-plain', 'sqlite'] + (['postgres'] if os.environ.get('POSTGRES_HOST') else [])
+    parser.add_argument('--profiles', nargs='+', default=default_profiles)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--slots', type=int, default=8)
+    parser.add_argument('--batch-share', type=float, default=0.25)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_profile(args)))
+        return
+
+    results = {}
+    for profile in args.profiles:
+        child = subprocess.run(
+            [sys.executable, __file__, '--child', *sys.argv[1:]],
+            env={**os.environ, 'DB_PROFILE': profile}, capture_output=True, text=True,
+        )
+        if child.returncode:
+            results[profile] = {'error': child.stderr.strip().splitlines()[-1:]}
+        else:
+            results[profile] = json.loads(child.stdout.strip().splitlines()[-1])
+
+    report('book_contention', {
+        'threads': args.threads,
+        'slots': args.slots,
+        'batch_share': args.batch_share,
+        **results,
+    })
+
+
+if __name__ == '__main__':
+    main()
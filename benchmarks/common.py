@@ -0,0 +1,72 @@
+import atexit
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django(db_path=None):
+    # Benchmarks run against a throwaway SQLite file, never the dev database.
+    # Other DB_PROFILEs get a test database that is dropped on exit.
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+
+    from django.conf import settings
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = ['testserver']
+    sqlite = 'sqlite3' in settings.DATABASES['default']['ENGINE']
+    if sqlite:
+        if db_path is None:
+            db_path = os.path.join(tempfile.mkdtemp(prefix='event-booking-bench-'), 'bench.sqlite3')
+        settings.DATABASES['default']['NAME'] = db_path
+
+    import django
+    django.setup()
+
+    from django.db import connection
+    if not sqlite:
+        db_path = connection.creation.create_test_db(verbosity=0)
+        atexit.register(connection.creation.destroy_test_db, db_path, verbosity=0)
+        return db_path
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+    return db_path
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        'count': len(samples),
+        'mean_ms': round(statistics.fmean(samples) * 1000, 4),
+        'p50_ms': round(percentile(samples, 50) * 1000, 4),
+        'p95_ms': round(percentile(samples, 95) * 1000, 4),
+        'p99_ms': round(percentile(samples, 99) * 1000, 4),
+        'max_ms': round(samples[-1] * 1000, 4),
+    }
+
+
+def percentile(sorted_samples, pct):
+    index = min(len(sorted_samples) - 1, int(round(pct / 100 * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def report(name, results, output=None):
+    text = json.dumps({'benchmark': name, **results}, indent=2, default=str)
+    print(text)
+    if output:
+        Path(output).write_text(text + '\n', encoding='utf-8')
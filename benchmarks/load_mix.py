@@ -0,0 +1,335 @@
+"""Replays realistic request mixes against the API and reports JSON.
+
+Builds a synthetic dataset (categories, users with preferences, many weeks
+of slots), then runs each scenario for --seconds with --threads clients
+driving the WSGI stack in-process through Django's test client:
+
+    browse       week listings across weeks, categories and preferred
+                 filters, revalidating with If-None-Match like a browser
+    preferences  reading and changing category preferences
+    rush         every client booking the same hot slot, and releasing it
+                 when it wins
+    admin        slot edits, weekly recurring slot creation and deletion
+    mixed        all of the above, weighted by --mix
+
+Throughput, p50/p95/p99 latency and queries per request are reported per
+scenario and per endpoint. Save runs with --output and diff them across
+commits.
+
+    python benchmarks/load_mix.py [--scenarios browse rush mixed] [--threads 8] [--seconds 10]
+"""
+import argparse
+import random
+import statistics
+import subprocess
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from common import BASE_DIR, report, setup_django, summarize
+
+SCENARIOS = ['browse', 'preferences', 'rush', 'admin', 'mixed']
+
+
+def build_dataset(users, weeks, slots_per_week, categories):
+    from django.contrib.auth.models import User
+    from django.utils import timezone
+    from scheduler.cache import get_week_start
+    from scheduler.models import EventCategory, TimeSlot, UserPreference
+
+    rng = random.Random(0)
+    category_objects = EventCategory.objects.bulk_create([
+        EventCategory(name=f'Category {i}', description='') for i in range(categories)
+    ])
+    # Recurring admin slots get a category of their own, so they never overlap.
+    admin_category = EventCategory.objects.create(name='Admin recurring', description='')
+    user_objects = User.objects.bulk_create([User(username=f'user{i}') for i in range(users)])
+    admin = User.objects.create(username='admin', is_staff=True)
+    preferences = UserPreference.objects.bulk_create([UserPreference(user=user) for user in user_objects])
+    Through = UserPreference.categories.through
+    Through.objects.bulk_create([
+        Through(userpreference_id=preference.pk, eventcategory_id=category.pk)
+        for preference in preferences
+        for category in rng.sample(category_objects, 2)
+    ])
+
+    # Weeks around today; a third of the slots already booked.
+    first_week = timezone.make_aware(timezone.datetime.combine(
+        get_week_start(-(weeks // 2)), timezone.datetime.min.time()
+    ))
+    step = timedelta(days=7) / slots_per_week
+    TimeSlot.objects.bulk_create([
+        TimeSlot(
+            category=category_objects[i % categories],
+            start_time=first_week + step * i,
+            end_time=first_week + step * i + step / 2,
+            user=user_objects[rng.randrange(users)] if i % 3 == 0 else None,
+        )
+        for i in range(weeks * slots_per_week)
+    ], batch_size=1000)
+    hot_slot = TimeSlot.objects.create(
+        category=category_objects[0],
+        start_time=timezone.now() + timedelta(days=400),
+        end_time=timezone.now() + timedelta(days=400, minutes=30),
+    )
+    return {
+        'user_ids': [user.pk for user in user_objects],
+        'admin_id': admin.pk,
+        'category_ids': [category.pk for category in category_objects],
+        'admin_category_id': admin_category.pk,
+        'slot_ids': list(TimeSlot.objects.exclude(pk=hot_slot.pk).values_list('id', flat=True)),
+        'hot_slot_id': hot_slot.pk,
+        'weeks': weeks,
+    }
+
+
+def issue_tokens(dataset):
+    # Access tokens live for minutes; every scenario gets fresh ones.
+    from django.contrib.auth.models import User
+    from scheduler.serializers import CustomTokenObtainPairSerializer
+
+    users = User.objects.in_bulk(dataset['user_ids'] + [dataset['admin_id']])
+    tokens = {pk: f'Bearer {CustomTokenObtainPairSerializer.get_token(user).access_token}' for pk, user in users.items()}
+    return [tokens[pk] for pk in dataset['user_ids']], tokens[dataset['admin_id']]
+
+
+class Client:
+    """One simulated user: a test client with its own token and ETags.
+
+    Each operation returns (endpoint, request): any lookups it needs are
+    done up front so only the request itself is timed.
+    """
+
+    def __init__(self, index, dataset, token, admin_token, admin_counter):
+        from django.test import Client as TestClient
+
+        self.client = TestClient()
+        self.rng = random.Random(index)
+        self.dataset = dataset
+        self.token = token
+        self.admin_token = admin_token
+        self.admin_counter = admin_counter
+        self.etags = {}
+        self.holds_hot_slot = False
+        self.recurrences = []
+
+    def send(self, method, path, token, data=None, **extra):
+        if method in ('get', 'delete'):
+            return getattr(self.client, method)(path, HTTP_AUTHORIZATION=token, **extra)
+        return getattr(self.client, method)(path, data, content_type='application/json', HTTP_AUTHORIZATION=token)
+
+    def browse(self):
+        weeks = self.dataset['weeks']
+        query = f'week={self.rng.randrange(-(weeks // 2), weeks - weeks // 2)}'
+        roll = self.rng.random()
+        if roll < 0.3:
+            query += f'&category={self.rng.choice(self.dataset["category_ids"])}'
+        elif roll < 0.5:
+            query += '&preferred=1'
+        path = f'/api/slots/?{query}'
+
+        def request():
+            # Browsers revalidate pages they have seen.
+            extra = {'HTTP_IF_NONE_MATCH': self.etags[path]} if path in self.etags else {}
+            response = self.send('get', path, self.token, **extra)
+            if response.has_header('ETag'):
+                self.etags[path] = response['ETag']
+            return response
+        return 'GET /api/slots/?week=', request
+
+    def preferences(self):
+        if self.rng.random() < 0.5:
+            return 'GET /api/preferences/', lambda: self.send('get', '/api/preferences/', self.token)
+        categories = self.rng.sample(self.dataset['category_ids'], self.rng.randint(1, 3))
+        return 'PATCH /api/preferences/', lambda: self.send(
+            'patch', '/api/preferences/', self.token, {'categories_ids': categories}
+        )
+
+    def rush(self):
+        hot = self.dataset['hot_slot_id']
+        if self.holds_hot_slot:
+            # Winners give the slot back so the rush goes on.
+            self.holds_hot_slot = False
+            return 'POST /api/slots/<id>/unsubscribe/ (hot)', lambda: self.send(
+                'post', f'/api/slots/{hot}/unsubscribe/', self.token
+            )
+
+        def request():
+            response = self.send('post', f'/api/slots/{hot}/book/', self.token)
+            self.holds_hot_slot = response.status_code == 200
+            return response
+        return 'POST /api/slots/<id>/book/ (hot)', request
+
+    def admin(self):
+        roll = self.rng.random()
+        if roll < 0.6:
+            slot_id = self.rng.choice(self.dataset['slot_ids'])
+            category = self.rng.choice(self.dataset['category_ids'])
+            return 'PATCH /api/slots/<id>/', lambda: self.send(
+                'patch', f'/api/slots/{slot_id}/', self.admin_token, {'category_id': category}
+            )
+        if roll < 0.85 or not self.recurrences:
+            return 'POST /api/slots/recurring/', self.create_recurrence()
+        slot_ids = self.recurrence_slot_ids(self.recurrences.pop())
+        if not slot_ids:
+            return 'POST /api/slots/recurring/', self.create_recurrence()
+        return 'DELETE /api/slots/<id>/', lambda: self.send('delete', f'/api/slots/{slot_ids[0]}/', self.admin_token)
+
+    def create_recurrence(self):
+        from django.utils import timezone
+
+        # Each recurrence gets its own hour, far from the browsed weeks.
+        with self.admin_counter['lock']:
+            self.admin_counter['next'] += 1
+            hour = self.admin_counter['next']
+        start = timezone.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=800, hours=hour)
+
+        def request():
+            response = self.send('post', '/api/slots/recurring/', self.admin_token, {
+                'category_id': self.dataset['admin_category_id'],
+                'start_time': start.isoformat(),
+                'duration': '00:30:00',
+                'freq': 'weekly',
+                'count': 4,
+            })
+            if response.status_code == 201:
+                self.recurrences.append(start)
+            return response
+        return request
+
+    def recurrence_slot_ids(self, start):
+        from scheduler.models import TimeSlot
+
+        return list(TimeSlot.objects.filter(
+            category_id=self.dataset['admin_category_id'], start_time=start,
+        ).values_list('id', flat=True))
+
+
+def worker(client, operations, weights, stop, samples):
+    from django.db import connection
+
+    queries = [0]
+
+    def count_queries(execute, sql, params, many, context):
+        queries[0] += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count_queries):
+        while not stop.is_set():
+            endpoint, request = getattr(client, client.rng.choices(operations, weights)[0])()
+            before = queries[0]
+            started = time.perf_counter()
+            try:
+                outcome = str(request().status_code)
+            except Exception as e:
+                outcome = type(e).__name__
+            samples.append((endpoint, outcome, time.perf_counter() - started, queries[0] - before))
+    connection.close()
+
+
+def run_scenario(scenario, dataset, args):
+    from django.core.cache import cache
+    from scheduler.models import TimeSlot
+
+    if scenario == 'mixed':
+        operations, weights = zip(*args.mix.items())
+    else:
+        operations, weights = (scenario,), (1,)
+    cache.clear()
+    # A winner of the previous rush may still hold the hot slot.
+    TimeSlot.objects.filter(pk=dataset['hot_slot_id']).update(user=None)
+    tokens, admin_token = issue_tokens(dataset)
+    admin_counter = {'lock': threading.Lock(), 'next': SCENARIOS.index(scenario) * 10000}
+    stop = threading.Event()
+    samples = []
+    threads = [
+        threading.Thread(target=worker, args=(
+            Client(i, dataset, tokens[i % len(tokens)], admin_token, admin_counter), operations, weights, stop, samples,
+        ))
+        for i in range(args.threads)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    endpoints = defaultdict(list)
+    for sample in samples:
+        endpoints[sample[0]].append(sample)
+    return {
+        'requests': len(samples),
+        'throughput_rps': round(len(samples) / elapsed, 1),
+        'latency': summarize([latency for _, _, latency, _ in samples]),
+        'queries_per_request': round(statistics.fmean(queries for *_, queries in samples), 2),
+        'endpoints': {
+            endpoint: {
+                'requests': len(rows),
+                'statuses': dict(sorted(Counter(outcome for _, outcome, _, _ in rows).items())),
+                'latency': summarize([latency for _, _, latency, _ in rows]),
+                'queries_per_request': round(statistics.fmean(queries for *_, queries in rows), 2),
+                'max_queries': max(queries for *_, queries in rows),
+            }
+            for endpoint, rows in sorted(endpoints.items())
+        },
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_mix(value):
+    # "browse=80,rush=10,preferences=5,admin=5"
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name not in SCENARIOS[:-1]:
+            raise argparse.ArgumentTypeError(f'unknown scenario {name!r}')
+        mix[name] = float(weight)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('browse=80,rush=10,preferences=5,admin=5'))
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--weeks', type=int, default=26)
+    parser.add_argument('--slots-per-week', type=int, default=200)
+    parser.add_argument('--categories', type=int, default=8)
+    parser.add_argument('--output', help="Also write the JSON results to this file.")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+
+    dataset = build_dataset(args.users, args.weeks, args.slots_per_week, args.categories)
+    results = {scenario: run_scenario(scenario, dataset, args) for scenario in args.scenarios}
+    report('load_mix', {
+        'git_commit': git_commit(),
+        'db_profile': settings.DB_PROFILE,
+        'threads': args.threads,
+        'seconds': args.seconds,
+        'mix': args.mix,
+        'dataset': {
+            'users': args.users, 'weeks': args.weeks, 'slots': len(dataset['slot_ids']) + 1,
+            'categories': args.categories,
+        },
+        'scenarios': results,
+    }, output=args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""Booking latency while /api/token/ is flooded with logins.
+
+Runs the same booking workload three times: without logins, during a login
+storm with inline hashing (PASSWORD_HASH_WORKERS=0), and during a storm with
+the hashing pool. Login throttling is disabled so every login is hashed.
+
+    python benchmarks/login_storm.py [--seconds 10] [--storm-threads 16] [--hash-workers 1]
+"""
+import argparse
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+from common import report, setup_django, summarize
+
+
+def build_dataset(bookers, storm_users):
+    from django.contrib.auth.hashers import make_password
+    from django.contrib.auth.models import User
+    from django.utils import timezone
+    from scheduler.models import EventCategory, TimeSlot
+    from scheduler.serializers import CustomTokenObtainPairSerializer
+
+    # One real PBKDF2 hash, shared by every storm account.
+    password = make_password('storm-password')
+    User.objects.bulk_create([User(username=f'storm{i}', password=password) for i in range(storm_users)])
+
+    category = EventCategory.objects.create(name='Category', description='')
+    start = timezone.now() + timedelta(days=1)
+    tokens, slot_ids = [], []
+    for i in range(bookers):
+        user = User.objects.create(username=f'booker{i}')
+        tokens.append(f'Bearer {CustomTokenObtainPairSerializer.get_token(user).access_token}')
+        slot = TimeSlot.objects.create(
+            category=category,
+            start_time=start + timedelta(hours=i),
+            end_time=start + timedelta(hours=i, minutes=30),
+        )
+        slot_ids.append(slot.id)
+    return tokens, slot_ids
+
+
+def booker(token, slot_id, stop, latencies):
+    from django.db import connection
+    from django.test import Client
+
+    client = Client()
+    book_url, unsubscribe_url = f'/api/slots/{slot_id}/book/', f'/api/slots/{slot_id}/unsubscribe/'
+    while not stop.is_set():
+        for url in (book_url, unsubscribe_url):
+            started = time.perf_counter()
+            client.post(url, HTTP_AUTHORIZATION=token)
+            latencies.append(time.perf_counter() - started)
+    connection.close()
+
+
+def stormer(index, storm_users, stop, statuses):
+    from django.db import connection
+    from django.test import Client
+
+    client = Client()
+    attempt = 0
+    while not stop.is_set():
+        username = f'storm{(index + attempt) % storm_users}'
+        attempt += 1
+        response = client.post(
+            '/api/token/', {'username': username, 'password': 'storm-password'}, content_type='application/json'
+        )
+        statuses[response.status_code] += 1
+    connection.close()
+
+
+def run_phase(seconds, tokens, slot_ids, storm_threads, storm_users):
+    stop = threading.Event()
+    latencies, statuses = [], Counter()
+    threads = [
+        threading.Thread(target=booker, args=(token, slot_id, stop, latencies))
+        for token, slot_id in zip(tokens, slot_ids)
+    ] + [
+        threading.Thread(target=stormer, args=(i, storm_users, stop, statuses))
+        for i in range(storm_threads)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return {
+        'booking_requests': len(latencies),
+        'booking_latency': summarize(latencies),
+        'login_statuses': {str(code): count for code, count in sorted(statuses.items())},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--bookers', type=int, default=4)
+    parser.add_argument('--storm-threads', type=int, default=16)
+    parser.add_argument('--storm-users', type=int, default=200)
+    parser.add_argument('--hash-workers', type=int, default=1)
+    parser.add_argument('--hash-queue', type=int, default=4)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import override_settings
+    from scheduler.throttling import LoginIPThrottle, LoginUsernameThrottle
+
+    tokens, slot_ids = build_dataset(args.bookers, args.storm_users)
+    # Throttle classes read their rates at import; switch them off directly.
+    LoginIPThrottle.THROTTLE_RATES = LoginUsernameThrottle.THROTTLE_RATES = {'login_ip': None, 'login_username': None}
+
+    results = {'baseline': run_phase(args.seconds, tokens, slot_ids, 0, args.storm_users)}
+    with override_settings(PASSWORD_HASH_WORKERS=0):
+        results['storm_inline_hashing'] = run_phase(args.seconds, tokens, slot_ids, args.storm_threads, args.storm_users)
+    with override_settings(PASSWORD_HASH_WORKERS=args.hash_workers, PASSWORD_HASH_QUEUE_SIZE=args.hash_queue):
+        results['storm_hashing_pool'] = run_phase(args.seconds, tokens, slot_ids, args.storm_threads, args.storm_users)
+
+    report('login_storm', {
+        'bookers': args.bookers,
+        'storm_threads': args.storm_threads,
+        'hash_workers': args.hash_workers,
+        'hash_queue': args.hash_queue,
+        **results,
+    })
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""Per-user overlap check for a user with a long booking history.
+
+    python benchmarks/overlap_check.py [--bookings 10000] [--repeat 2000]
+"""
+import argparse
+import random
+from datetime import timedelta
+
+from common import report, setup_django, summarize, timed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bookings', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.contrib.auth.models import User
+    from django.utils import timezone
+    from scheduler.booking import overlapping_bookings
+    from scheduler.models import EventCategory, TimeSlot
+
+    user = User.objects.create(username='bench')
+    category = EventCategory.objects.create(name='Bench', description='Benchmark category')
+    now = timezone.now()
+    # History is mostly in the past, with a handful of upcoming bookings.
+    TimeSlot.objects.bulk_create([
+        TimeSlot(
+            category=category,
+            start_time=now - timedelta(hours=2 * i) + timedelta(days=7),
+            end_time=now - timedelta(hours=2 * i) + timedelta(days=7, hours=1),
+            user=user,
+        )
+        for i in range(args.bookings)
+    ], batch_size=1000)
+
+    rng = random.Random(0)
+
+    def check():
+        start = now + timedelta(minutes=rng.randrange(0, 60 * 24 * 14))
+        overlapping_bookings(user, start, start + timedelta(hours=1)).exists()
+
+    samples = timed(check, args.repeat)
+    query = overlapping_bookings(user, now, now + timedelta(hours=1))
+    report('overlap_check', {
+        'bookings': args.bookings,
+        'plan': query.explain(),
+        'latency': summarize(samples),
+    })
+
+
+if __name__ == '__main__':
+    main()
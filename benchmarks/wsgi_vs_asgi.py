@@ -0,0 +1,185 @@
+"""Week listing throughput over the WSGI (DRF) and ASGI (async view) paths.
+
+Both handlers are driven in-process, so no server needs to be installed:
+WSGI requests are served by a fixed pool of worker threads, as under a
+threaded WSGI server, while ASGI requests all run on one event loop.
+--client-delay-ms keeps each response "on the wire" for a while to model
+slow clients, which ties up a WSGI thread but only a coroutine under ASGI.
+
+    python benchmarks/wsgi_vs_asgi.py [--connections 500] [--requests 3000]
+"""
+import argparse
+import asyncio
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from common import report, setup_django, summarize
+
+
+def build_dataset(slots):
+    from django.contrib.auth.models import User
+    from django.utils import timezone
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from scheduler.cache import get_week_start
+    from scheduler.models import EventCategory, TimeSlot
+
+    user = User.objects.create(username='bench')
+    categories = EventCategory.objects.bulk_create([
+        EventCategory(name=f'Category {i}', description='') for i in range(5)
+    ])
+    start = timezone.make_aware(timezone.datetime.combine(get_week_start(), timezone.datetime.min.time()))
+    TimeSlot.objects.bulk_create([
+        TimeSlot(
+            category=categories[i % len(categories)],
+            start_time=start + timedelta(minutes=15 * i),
+            end_time=start + timedelta(minutes=15 * i + 15),
+        )
+        for i in range(slots)
+    ])
+    return f'Bearer {RefreshToken.for_user(user).access_token}'
+
+
+def run_wsgi(path, query, token, connections, requests, threads, client_delay):
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.db import connection
+
+    handler = WSGIHandler()
+    environ_base = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query,
+        'SERVER_NAME': 'testserver', 'SERVER_PORT': '80', 'HTTP_HOST': 'testserver',
+        'HTTP_AUTHORIZATION': token, 'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(),
+        'wsgi.errors': io.StringIO(), 'wsgi.multithread': True, 'wsgi.multiprocess': False,
+        'wsgi.run_once': False, 'wsgi.version': (1, 0),
+    }
+    statuses = []
+
+    def serve(queued_at):
+        def start_response(status, headers, exc_info=None):
+            statuses.append(int(status.split()[0]))
+        body = b''.join(handler(dict(environ_base, **{'wsgi.input': io.BytesIO()}), start_response))
+        if client_delay:
+            time.sleep(client_delay)
+        return time.perf_counter() - queued_at, len(body)
+
+    def close_connection():
+        connection.close()
+
+    latencies = []
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        # `connections` clients keep one request in flight each until the
+        # total is reached; extra requests queue for a free worker thread.
+        pending = set()
+        issued = 0
+        while issued < requests or pending:
+            while issued < requests and len(pending) < connections:
+                pending.add(pool.submit(serve, time.perf_counter()))
+                issued += 1
+            done = {future for future in pending if future.done()}
+            if not done:
+                time.sleep(0.0005)
+                continue
+            latencies.extend(future.result()[0] for future in done)
+            pending -= done
+        for _ in range(threads):
+            pool.submit(close_connection)
+    elapsed = time.perf_counter() - started
+    return elapsed, latencies, statuses
+
+
+def run_asgi(path, query, token, connections, requests, client_delay):
+    from django.core.handlers.asgi import ASGIHandler
+
+    handler = ASGIHandler()
+    statuses = []
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+        'headers': [(b'host', b'testserver'), (b'authorization', token.encode())],
+        'server': ('testserver', 80), 'client': ('127.0.0.1', 50000),
+    }
+
+    async def one_request():
+        queued_at = time.perf_counter()
+        messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+        finished = asyncio.Event()
+
+        async def receive():
+            # The body arrives once; afterwards the client stays connected
+            # until the response has been sent.
+            if messages:
+                return messages.pop()
+            await finished.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                statuses.append(message['status'])
+            elif message['type'] == 'http.response.body' and not message.get('more_body'):
+                if client_delay:
+                    await asyncio.sleep(client_delay)
+                finished.set()
+
+        await handler(dict(scope), receive, send)
+        return time.perf_counter() - queued_at
+
+    async def client(count, latencies):
+        for _ in range(count):
+            latencies.append(await one_request())
+
+    async def main():
+        latencies = []
+        per_client, extra = divmod(requests, connections)
+        await asyncio.gather(*(
+            client(per_client + (1 if i < extra else 0), latencies) for i in range(connections)
+        ))
+        return latencies
+
+    started = time.perf_counter()
+    latencies = asyncio.run(main())
+    return time.perf_counter() - started, latencies, statuses
+
+
+def summarize_run(elapsed, latencies, statuses):
+    return {
+        'requests': len(latencies),
+        'errors': sum(1 for status in statuses if status >= 400),
+        'requests_per_sec': round(len(latencies) / elapsed, 1),
+        'latency': summarize(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--connections', type=int, default=500)
+    parser.add_argument('--requests', type=int, default=3000)
+    parser.add_argument('--threads', type=int, default=32, help="WSGI worker threads.")
+    parser.add_argument('--slots', type=int, default=200, help="Slots in the benchmarked week.")
+    parser.add_argument('--client-delay-ms', type=float, default=0)
+    parser.add_argument('--cache', action='store_true', help="Keep the week cache enabled.")
+    args = parser.parse_args()
+
+    setup_django()
+    if not args.cache:
+        from django.test import override_settings
+        override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}).enable()
+
+    token = build_dataset(args.slots)
+    delay = args.client_delay_ms / 1000
+    wsgi = run_wsgi('/api/slots/', 'week=0', token, args.connections, args.requests, args.threads, delay)
+    asgi = run_asgi('/api/async/slots/', 'week=0', token, args.connections, args.requests, delay)
+
+    report('wsgi_vs_asgi', {
+        'connections': args.connections,
+        'wsgi_threads': args.threads,
+        'client_delay_ms': args.client_delay_ms,
+        'cache': args.cache,
+        'wsgi': summarize_run(*wsgi),
+        'asgi': summarize_run(*asgi),
+    })
+
+
+if __name__ == '__main__':
+    main()
@@ -46,8 +46,15 @@ function AdminView({ isAdmin }) {
     axios.get('/api/categories/').then(res => setCategories(res.data));
   };
 
-  const fetchUsers = () => {
-    axios.get('/api/users/').then(res => setUsers(res.data));
+  const fetchUsers = async () => {
+    let url = '/api/users/';
+    let allUsers = [];
+    while (url) {
+      const res = await axios.get(url);
+      allUsers = allUsers.concat(res.data.results);
+      url = res.data.next;
+    }
+    setUsers(allUsers);
   };
 
   const handleChange = e => {
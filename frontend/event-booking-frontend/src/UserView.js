@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import axios from 'axios';
 import { jwtDecode } from 'jwt-decode';
 import Preferences from './Preferences';
@@ -42,6 +42,9 @@ function groupSlotsByDay(slots, weekOffset) {
   return days;
 }
 
+// Set once the server refuses the event stream (WSGI), for the page's lifetime.
+let liveUpdatesUnavailable = false;
+
 function UserView({ categories }) {
   const [selectedCategories, setSelectedCategories] = useState([]);
   const [slots, setSlots] = useState([]);
@@ -49,6 +52,8 @@ function UserView({ categories }) {
   const [loading, setLoading] = useState(true);
   const [userId, setUserId] = useState(null);
   const [username, setUsername] = useState(null);
+  const slotsRef = useRef(slots);
+  slotsRef.current = slots;
 
   useEffect(() => {
     const token = localStorage.getItem('access_token');
@@ -63,6 +68,56 @@ function UserView({ categories }) {
     fetchSlots();
   }, [weekOffset]);
 
+  // Live updates for the visible week instead of refetching it on every click.
+  // Only ASGI servers stream; under WSGI the server answers 204 and the
+  // EventSource closes without ever opening, so we stop trying.
+  const liveRef = useRef(false);
+  const refetchTimer = useRef(null);
+
+  useEffect(() => {
+    const token = localStorage.getItem('access_token');
+    if (!token || liveUpdatesUnavailable) return undefined;
+
+    const source = new EventSource(
+      `/api/async/slots/events/?week=${weekOffset}&token=${encodeURIComponent(token)}`
+    );
+    // Coalesces bursts (e.g. a recurring series being created) into one refetch.
+    const scheduleRefetch = () => {
+      clearTimeout(refetchTimer.current);
+      refetchTimer.current = setTimeout(fetchSlots, 500);
+    };
+    source.addEventListener('open', () => {
+      liveRef.current = true;
+    });
+    source.addEventListener('error', () => {
+      if (source.readyState === EventSource.CLOSED) {
+        if (!liveRef.current) liveUpdatesUnavailable = true;
+        liveRef.current = false;
+      }
+    });
+    source.addEventListener('slot', (e) => {
+      const change = JSON.parse(e.data);
+      if (change.state === 'deleted') {
+        setSlots(current => current.filter(slot => slot.id !== change.id));
+      } else if (!slotsRef.current.some(slot => slot.id === change.id) || change.previous_start_time) {
+        // New or moved slot: the event doesn't carry enough to render it.
+        scheduleRefetch();
+      } else {
+        setSlots(current => current.map(slot =>
+          slot.id === change.id
+            ? { ...slot, user: change.state === 'booked' ? slot.user || 'booked' : null }
+            : slot
+        ));
+      }
+    });
+    source.addEventListener('reset', scheduleRefetch);
+    return () => {
+      clearTimeout(refetchTimer.current);
+      liveRef.current = false;
+      source.close();
+    };
+  }, [weekOffset]);
+
   const fetchSlots = () => {
     setLoading(true);
     axios
@@ -74,12 +129,28 @@ function UserView({ categories }) {
       .catch(() => setLoading(false));
   };
 
+  // With a live stream the slot event updates the calendar; otherwise refetch.
+  const refetchUnlessLive = () => {
+    if (!liveRef.current) fetchSlots();
+  };
+
+  // Slot events don't say who booked, so mark our own changes locally.
+  const setSlotUser = (id, user) => {
+    setSlots(current => current.map(slot => (slot.id === id ? { ...slot, user } : slot)));
+  };
+
   const handleBook = (id) => {
-    axios.post(`/api/slots/${id}/book/`).then(fetchSlots);
+    axios.post(`/api/slots/${id}/book/`).then(() => {
+      setSlotUser(id, username);
+      refetchUnlessLive();
+    });
   };
 
   const handleUnsubscribe = (id) => {
-    axios.post(`/api/slots/${id}/unsubscribe/`).then(fetchSlots);
+    axios.post(`/api/slots/${id}/unsubscribe/`).then(() => {
+      setSlotUser(id, null);
+      refetchUnlessLive();
+    });
   };
 
   const isHighlighted = (categoryId) =>
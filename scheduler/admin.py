@@ -1,5 +1,25 @@
 from django.contrib import admin
-from .models import EventCategory, TimeSlot, UserPreference
+from .models import ArchivedTimeSlot, EventCategory, TimeSlot, UserPreference, WaitlistEntry
 
 
-admin.site.register((EventCategory, TimeSlot, UserPreference))
+admin.site.register((EventCategory, TimeSlot, UserPreference, WaitlistEntry))
+
+
+@admin.register(ArchivedTimeSlot)
+class ArchivedTimeSlotAdmin(admin.ModelAdmin):
+    # History is read-only; archive_slots is the only writer.
+    list_display = ('original_id', 'category', 'start_time', 'end_time', 'user', 'archived_at')
+    list_filter = ('category',)
+    list_select_related = ('category', 'user')
+    date_hierarchy = 'start_time'
+    search_fields = ('=original_id', 'user__username')
+    raw_id_fields = ('user',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
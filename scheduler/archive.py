@@ -0,0 +1,38 @@
+from django.db import connections, router, transaction
+
+from .models import ArchivedTimeSlot, TimeSlot, WaitlistEntry
+
+
+def archive_slots_batch(cutoff, batch_size):
+    """Moves up to ``batch_size`` slots that ended before ``cutoff`` to
+    ArchivedTimeSlot in one short transaction. Returns how many were moved.
+    """
+    with transaction.atomic():
+        # Oldest first along the start_time index.
+        slots = list(
+            TimeSlot.objects.filter(start_time__lt=cutoff, end_time__lt=cutoff)
+            .order_by('start_time', 'id')
+            .values_list('id', 'category_id', 'start_time', 'end_time', 'user_id')[:batch_size]
+        )
+        if not slots:
+            return 0
+        ids = [slot[0] for slot in slots]
+        ArchivedTimeSlot.objects.bulk_create([
+            ArchivedTimeSlot(
+                original_id=pk, category_id=category_id, start_time=start_time, end_time=end_time, user_id=user_id,
+            )
+            for pk, category_id, start_time, end_time, user_id in slots
+        ])
+        # Nobody can be promoted into a slot that is over.
+        WaitlistEntry.objects.filter(slot_id__in=ids).delete()
+        # A plain DELETE skips the delete signals on purpose: past weeks need
+        # no cache bump or live event, and SlotAvailability keeps counting
+        # archived slots.
+        connection = connections[router.db_for_write(TimeSlot)]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {connection.ops.quote_name(TimeSlot._meta.db_table)} "
+                f"WHERE {connection.ops.quote_name(TimeSlot._meta.pk.column)} IN ({', '.join(['%s'] * len(ids))})",
+                ids,
+            )
+    return len(slots)
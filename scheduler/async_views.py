@@ -0,0 +1,197 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.settings import api_settings as drf_settings
+from rest_framework_simplejwt.exceptions import TokenError
+from datetime import datetime, timedelta
+from functools import wraps
+import json
+
+from .booking import book_slot, unsubscribe_slot
+from .cache import (etag_matches,
+                    get_cached_week,
+                    get_etag,
+                    get_week_cache_key,
+                    get_week_start,
+                    get_week_version,
+                    parse_week_offset,
+                    set_cached_week,
+                    )
+from .events import get_broadcaster
+from .metrics import record_booking, record_unsubscribe
+from .models import EventCategory, TimeSlot
+from .routers import read_from_replica, use_primary
+from .serializers import EventCategorySerializer, TimeSlotSerializer
+
+# ASGI-native versions of the hot endpoints. DRF views are synchronous, so
+# these are plain Django async views that mirror the DRF responses. Like
+# DRF's JWT-authenticated views they are exempt from CSRF checks.
+
+# Same authentication as the DRF views, so the stateless mode applies here too.
+jwt_authentication = drf_settings.DEFAULT_AUTHENTICATION_CLASSES[0]()
+
+
+async def aauthenticate(request, query_param=None):
+    header = jwt_authentication.get_header(request)
+    if header is not None:
+        raw_token = jwt_authentication.get_raw_token(header)
+    elif query_param:
+        # EventSource can't send headers, so streams may pass ?token= instead.
+        raw_token = request.GET.get(query_param, '').encode() or None
+    else:
+        raw_token = None
+    if raw_token is None:
+        return None
+    # Token validation is CPU only; get_user may hit the cache or database.
+    validated_token = jwt_authentication.get_validated_token(raw_token)
+    return await sync_to_async(jwt_authentication.get_user)(validated_token)
+
+
+def async_login_required(view=None, query_param=None):
+    if view is None:
+        return lambda view: async_login_required(view, query_param)
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            request.user = await aauthenticate(request, query_param)
+        except (AuthenticationFailed, TokenError) as e:
+            return JsonResponse({"detail": str(e)}, status=401)
+        if request.user is None:
+            return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+@require_GET
+@read_from_replica
+async def async_category_list(request):
+    categories = [category async for category in EventCategory.objects.all()]
+    return JsonResponse(EventCategorySerializer(categories, many=True).data, safe=False)
+
+
+@require_GET
+@async_login_required
+@read_from_replica
+async def async_slot_list(request):
+    start_of_week = get_week_start(parse_week_offset(request.GET.get('week', '0')))
+    category = request.GET.get('category', '')
+    if category and not category.isdigit():
+        return JsonResponse({"category": ["Select a valid choice."]}, status=400)
+
+    # Same key as the synchronous week listing, so both paths share entries.
+    version = await sync_to_async(get_week_version, thread_sensitive=False)(start_of_week)
+    cache_key = get_week_cache_key(start_of_week, version, category, '', False)
+    etag = get_etag(cache_key)
+
+    if etag_matches(request.headers.get('If-None-Match'), etag):
+        response = HttpResponse(status=304)
+    else:
+        data = await sync_to_async(get_cached_week, thread_sensitive=False)(cache_key)
+        if data is None:
+            qs = TimeSlot.objects.select_related('category', 'user').filter(
+                start_time__gte=start_of_week, start_time__lte=start_of_week + timedelta(days=7)
+            )
+            if category:
+                qs = qs.filter(category_id=category)
+            # Cached under the current version, so read what was committed.
+            with use_primary():
+                slots = [slot async for slot in qs]
+            data = list(TimeSlotSerializer(slots, many=True).data)
+            await sync_to_async(set_cached_week, thread_sensitive=False)(cache_key, data)
+        response = JsonResponse(data, safe=False)
+
+    response['ETag'] = etag
+    patch_vary_headers(response, ['Authorization'])
+    return response
+
+
+@csrf_exempt
+@require_POST
+@async_login_required
+async def async_slot_book(request, pk):
+    # One transaction for the slot and its availability row, which the async
+    # ORM can't hold open.
+    status, detail = await sync_to_async(book_slot)(request.user, pk)
+    record_booking(status)
+    return JsonResponse({"detail": detail}, status=status)
+
+
+@csrf_exempt
+@require_POST
+@async_login_required
+async def async_slot_unsubscribe(request, pk):
+    status, detail = await sync_to_async(unsubscribe_slot)(request.user, pk)
+    record_unsubscribe(status)
+    return JsonResponse({"detail": detail}, status=status)
+
+
+def week_bounds(start_of_week):
+    start = timezone.make_aware(datetime.combine(start_of_week, datetime.min.time()))
+    return start, start + timedelta(days=7)
+
+
+def event_matches(event, bounds, category):
+    if category and event['category'] != int(category):
+        return False
+    if bounds is None:
+        return True
+    start, end = bounds
+    return any(
+        start <= datetime.fromisoformat(event[field]) <= end
+        for field in ('start_time', 'previous_start_time') if field in event
+    )
+
+
+def format_event(event, name='slot'):
+    return f'id: {event["version"]}\nevent: {name}\ndata: {json.dumps(event, separators=(",", ":"))}\n\n'
+
+
+async def stream_slot_events(after, bounds, category):
+    subscription, complete = get_broadcaster().subscribe(after)
+    try:
+        yield 'retry: 3000\n\n'
+        if not complete:
+            # Events were missed (pruned, or the server restarted): refetch.
+            yield 'event: reset\ndata: {}\n\n'
+        while not subscription.overflowed:
+            events = await subscription.get(timeout=settings.SLOT_EVENTS_HEARTBEAT)
+            if not events:
+                yield ': keep-alive\n\n'
+                continue
+            chunk = ''.join(format_event(event) for event in events if event_matches(event, bounds, category))
+            if not event_matches(events[-1], bounds, category):
+                # Moves the client's Last-Event-ID past the filtered events.
+                chunk += f'id: {events[-1]["version"]}\n\n'
+            yield chunk
+    finally:
+        subscription.close()
+
+
+@require_GET
+@async_login_required(query_param='token')
+async def async_slot_events(request):
+    if not isinstance(request, ASGIRequest):
+        # Under WSGI the endless stream would be drained into memory by a
+        # worker thread that never comes back. 204 tells EventSource to stop
+        # reconnecting, so browsers fall back to refetching.
+        return HttpResponse(status=204)
+    bounds = None
+    if 'week' in request.GET:
+        bounds = week_bounds(get_week_start(parse_week_offset(request.GET['week'])))
+    category = request.GET.get('category', '')
+    if category and not category.isdigit():
+        return JsonResponse({"category": ["Select a valid choice."]}, status=400)
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    after = int(last_event_id) if last_event_id.isdigit() else None
+
+    response = StreamingHttpResponse(stream_slot_events(after, bounds, category), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,109 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import TokenRevocation
+
+# Claims added by CustomTokenObtainPairSerializer; together they are enough
+# for IsAuthenticated/IsAdminUser and for showing who is logged in.
+USER_CLAIMS = ('username', 'is_staff', 'is_superuser')
+
+
+def _user_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def _revoked_key(user_id):
+    return f'auth:revoked:{user_id}'
+
+
+def get_cached_user(user_id):
+    # Bounded by the cache backend (locmem keeps at most MAX_ENTRIES keys).
+    key = _user_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = User.objects.filter(pk=user_id).first()
+        if user is not None:
+            cache.set(key, user, timeout=settings.AUTH_USER_CACHE_TIMEOUT)
+    return user
+
+
+def get_user_instance(user):
+    # A model instance for request.user, whichever way it was authenticated.
+    if isinstance(user, TokenUser):
+        return get_cached_user(user.pk)
+    return user
+
+
+def invalidate_cached_user(user_id):
+    cache.delete(_user_key(user_id))
+
+
+def revoke_user_tokens(user_id):
+    # Access tokens issued until now are rejected for as long as they could
+    # still be valid. Call this after bulk updates that bypass User signals.
+    now = int(time.time())
+    # Access tokens minted by /api/token/refresh/ copy the refresh token's iat
+    # and claims, so a row has to outlive the refresh token, not just the
+    # access token, before nothing can match it any more.
+    lifetime = int(max(api_settings.ACCESS_TOKEN_LIFETIME, api_settings.REFRESH_TOKEN_LIFETIME).total_seconds())
+    TokenRevocation.objects.update_or_create(user_id=user_id, defaults={'revoked_at': now})
+    TokenRevocation.objects.filter(revoked_at__lt=now - lifetime).delete()
+    cache.set(_revoked_key(user_id), now, timeout=settings.AUTH_REVOCATION_CACHE_TIMEOUT)
+    invalidate_cached_user(user_id)
+
+
+def clear_revoked_tokens(user_id):
+    # For a new user that reuses the id of a deleted one.
+    TokenRevocation.objects.filter(user_id=user_id).delete()
+    cache.delete(_revoked_key(user_id))
+
+
+def get_revoked_at(user_id):
+    # The table is the source of truth, shared by every process; the cache only
+    # saves the lookup for AUTH_REVOCATION_CACHE_TIMEOUT seconds, so losing an
+    # entry costs a query, never a revocation. 0 means "not revoked".
+    key = _revoked_key(user_id)
+    revoked_at = cache.get(key)
+    if revoked_at is None:
+        revoked_at = TokenRevocation.objects.filter(user_id=user_id).values_list('revoked_at', flat=True).first() or 0
+        cache.set(key, revoked_at, timeout=settings.AUTH_REVOCATION_CACHE_TIMEOUT)
+    return revoked_at
+
+
+def is_token_revoked(user_id, validated_token):
+    revoked_at = get_revoked_at(user_id)
+    return bool(revoked_at) and validated_token.get('iat', 0) <= revoked_at
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """Authenticates from the token claims without loading the user row.
+
+    Tokens that lack the custom claims (e.g. minted by RefreshToken.for_user)
+    fall back to a cached User instance.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+
+        if is_token_revoked(user_id, validated_token):
+            raise AuthenticationFailed("User is inactive", code='user_inactive')
+        if all(claim in validated_token for claim in USER_CLAIMS):
+            return TokenUser(validated_token)
+
+        user = get_cached_user(user_id)
+        if user is None:
+            raise AuthenticationFailed("User not found", code='user_not_found')
+        if not user.is_active:
+            raise AuthenticationFailed("User is inactive", code='user_inactive')
+        return user
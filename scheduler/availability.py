@@ -0,0 +1,103 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import ArchivedTimeSlot, SlotAvailability, TimeSlot
+
+
+def slot_day(start_time):
+    return timezone.localtime(start_time).date()
+
+
+# (category, day) pairs per UPDATE; each adds a term to the WHERE clause,
+# and SQLite caps expression depth at 1000.
+UPDATE_CHUNK_SIZE = 200
+
+
+def update_availability(changes):
+    """Applies slot changes to the summary, in the caller's transaction.
+
+    ``changes`` holds (category_id, start_time, total change, booked change)
+    tuples, e.g. (category_id, start_time, 0, 1) for a booking. Runs one
+    UPDATE per 200 days touched, plus one INSERT when slots were added.
+    """
+    deltas = defaultdict(lambda: [0, 0])
+    for category_id, start_time, total, booked in changes:
+        delta = deltas[category_id, slot_day(start_time)]
+        delta[0] += total
+        delta[1] += booked
+    deltas = [
+        (category_id, day, total, booked)
+        for (category_id, day), (total, booked) in deltas.items() if total or booked
+    ]
+    for index in range(0, len(deltas), UPDATE_CHUNK_SIZE):
+        _apply_deltas(deltas[index:index + UPDATE_CHUNK_SIZE])
+
+
+def _apply_deltas(deltas):
+    # Days gaining slots may not have a row yet. Conflicts are ignored, so
+    # concurrent transactions creating the same row don't fail, and the
+    # increments below then apply to whichever row won.
+    missing = [
+        SlotAvailability(category_id=category_id, day=day) for category_id, day, total, _ in deltas if total > 0
+    ]
+    if missing:
+        SlotAvailability.objects.bulk_create(missing, ignore_conflicts=True)
+
+    rows = Q()
+    cases = {'total': [], 'booked': []}
+    for category_id, day, total, booked in deltas:
+        row = Q(category_id=category_id, day=day)
+        rows |= row
+        cases['total'].append(When(row, then=Value(total)))
+        cases['booked'].append(When(row, then=Value(booked)))
+    changed = {name: F(name) + Case(*whens, default=Value(0)) for name, whens in cases.items()}
+    # Rows a decrement can't find were deleted with their category, or the
+    # table has drifted (see the rebuild_availability command).
+    SlotAvailability.objects.filter(rows).update(**changed)
+
+
+def rebuild_availability(start=None, end=None):
+    """Recomputes the summary from TimeSlot and ArchivedTimeSlot for days in
+    [start, end).
+
+    Returns the number of summary rows written.
+    """
+    summary = SlotAvailability.objects.all()
+    if start is not None:
+        summary = summary.filter(day__gte=start)
+    if end is not None:
+        summary = summary.filter(day__lt=end)
+
+    with transaction.atomic():
+        counts = defaultdict(lambda: [0, 0])
+        for model in (TimeSlot, ArchivedTimeSlot):
+            slots = model.objects.annotate(day=TruncDate('start_time'))
+            if start is not None:
+                slots = slots.filter(day__gte=start)
+            if end is not None:
+                slots = slots.filter(day__lt=end)
+            for category_id, day, total, booked in slots.order_by().values('category_id', 'day').annotate(
+                total=Count('id'), booked=Count('user_id'),
+            ).values_list('category_id', 'day', 'total', 'booked'):
+                counts[category_id, day][0] += total
+                counts[category_id, day][1] += booked
+        rows = [
+            SlotAvailability(category_id=category_id, day=day, total=total, booked=booked)
+            for (category_id, day), (total, booked) in counts.items()
+        ]
+        summary.delete()
+        SlotAvailability.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def get_availability(start, end, category=None):
+    # One range scan on the (day, category) index, or on the unique
+    # (category, day) index when filtered by category.
+    rows = SlotAvailability.objects.filter(day__gte=start, day__lt=end, total__gt=0)
+    if category is not None:
+        rows = rows.filter(category_id=category)
+    return rows.order_by('day', 'category_id').values_list('day', 'category_id', 'total', 'booked')
@@ -0,0 +1,195 @@
+from datetime import time
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Exists, F, OuterRef
+
+from .availability import update_availability
+from .cache import bump_week_versions
+from .events import BOOKED, FREE, publish_slot_events, slot_event
+from .metrics import WAITLIST_PROMOTIONS
+from .models import TimeSlot, WaitlistEntry
+from .recurrence import find_overlaps
+
+
+def overlapping_bookings(user, start_time=OuterRef('start_time'), end_time=OuterRef('end_time')):
+    # Filtering on end_time first lets the (user, end_time) index skip the
+    # user's past bookings, so the scan only touches bookings that end later.
+    return TimeSlot.objects.filter(user_id=user.pk, end_time__gt=start_time, start_time__lt=end_time)
+
+
+def find_free_slots(user, start, end, limit, category_ids=None, from_time=None, to_time=None, weekdays=None,
+                    min_duration=None):
+    # Walks the (user, start_time) index from ``start`` for rows with
+    # user IS NULL, in order, so the LIMIT stops the scan at the first
+    # ``limit`` matches. The other filters are checked on the rows visited.
+    qs = TimeSlot.objects.filter(
+        ~Exists(overlapping_bookings(user)), user__isnull=True, start_time__gte=start, start_time__lt=end
+    )
+    if category_ids:
+        qs = qs.filter(category_id__in=category_ids)
+    if from_time is not None or to_time is not None:
+        # Times of day in TIME_ZONE; the slot has to fit inside the window.
+        window = (from_time or time.min, to_time or time.max)
+        qs = qs.filter(start_time__time__range=window, end_time__time__range=window)
+    if weekdays:
+        qs = qs.filter(start_time__iso_week_day__in=[day + 1 for day in weekdays])
+    if min_duration is not None:
+        qs = qs.filter(end_time__gte=F('start_time') + min_duration)
+    return qs.select_related('category').order_by('start_time', 'id')[:limit]
+
+
+def lock_user_bookings(user):
+    # Serialises booking changes per user so two parallel requests cannot both
+    # pass the overlap check. SQLite has no row locks, but it only ever runs
+    # one writer at a time, which gives the same guarantee.
+    if connection.features.has_select_for_update:
+        list(User.objects.select_for_update().filter(pk=user.pk).values_list('pk', flat=True))
+
+
+def get_batch_conflicts(user, slot_ids):
+    slots = {
+        pk: (start_time, end_time, user_id, category_id)
+        for pk, start_time, end_time, user_id, category_id in TimeSlot.objects.filter(pk__in=slot_ids).values_list(
+            'id', 'start_time', 'end_time', 'user_id', 'category_id'
+        )
+    }
+    conflicts = {
+        'conflicts': [pk for pk in slot_ids if pk in slots and slots[pk][2] is not None],
+        'not_found': [pk for pk in slot_ids if pk not in slots],
+        'overlaps': [],
+    }
+
+    free = [(start_time, end_time, pk) for pk, (start_time, end_time, user_id, _) in slots.items() if user_id is None]
+    if free:
+        bookings = overlapping_bookings(
+            user, min(slot[0] for slot in free), max(slot[1] for slot in free)
+        ).values_list('start_time', 'end_time', 'id')
+        overlapping = set()
+        for first, second in find_overlaps(free + list(bookings)):
+            overlapping.update({first[2], second[2]})
+        conflicts['overlaps'] = [
+            pk for pk in slot_ids if pk in overlapping and slots.get(pk, (None, None, True))[2] is None
+        ]
+
+    return slots, conflicts
+
+
+def book_slot(user, pk):
+    # Single conditional UPDATE: only one concurrent caller can flip user
+    # from NULL, and only if it doesn't clash with the caller's bookings.
+    with transaction.atomic():
+        lock_user_bookings(user)
+        booked = TimeSlot.objects.filter(
+            ~Exists(overlapping_bookings(user)), pk=pk, user__isnull=True
+        ).update(user_id=user.pk)
+        if booked:
+            start_time, category_id = TimeSlot.objects.filter(pk=pk).values_list('start_time', 'category_id').get()
+            update_availability([(category_id, start_time, 0, 1)])
+            bump_week_versions(start_time)
+            publish_slot_events(slot_event(pk, start_time, category_id, BOOKED))
+
+    if booked:
+        return 200, "Successfully booked."
+
+    owner = TimeSlot.objects.filter(pk=pk).values_list('user_id', flat=True)
+    if not owner:
+        return 404, "Slot not found."
+    if owner[0] is not None:
+        return 409, "Slot already taken."
+    return 409, "Slot overlaps with one of your bookings."
+
+
+def lock_waiting_users(slot_ids):
+    """Locks the users waiting for ``slot_ids`` and returns their ids.
+
+    Booking locks the user row before it touches a slot, so freeing a slot
+    has to lock its waiters before the UPDATE that frees it, or the two can
+    deadlock. Locks are taken in id order so concurrent releases agree too.
+    """
+    waiting = WaitlistEntry.objects.filter(slot_id__in=slot_ids).values('user_id')
+    if connection.features.has_select_for_update:
+        users = User.objects.select_for_update().filter(pk__in=waiting).order_by('pk')
+        return set(users.values_list('pk', flat=True))
+    return set(waiting.values_list('user_id', flat=True))
+
+
+def promote_waitlist(slot_ids, user_ids):
+    """Books each freed slot for the first user waiting on it.
+
+    Must run in the transaction that freed the slots, with ``user_ids`` from
+    lock_waiting_users() called before they were freed; anyone who joined
+    the queue since waits for the next release. Users who now have a
+    clashing booking are skipped and keep their place. Returns
+    {slot_id: user_id} for the slots that were handed on.
+    """
+    promoted = {}
+    pending = set(slot_ids)
+    if not user_ids:
+        return promoted
+    entries = WaitlistEntry.objects.filter(slot_id__in=slot_ids, user_id__in=user_ids).order_by('slot_id', 'id')
+    # Read lazily off the (slot, id) index: usually only the head is needed.
+    for entry_id, slot_id, user_id in entries.values_list('id', 'slot_id', 'user_id').iterator():
+        if slot_id not in pending:
+            continue
+        if TimeSlot.objects.filter(
+            ~Exists(overlapping_bookings(User(pk=user_id))), pk=slot_id, user__isnull=True
+        ).update(user_id=user_id):
+            WaitlistEntry.objects.filter(pk=entry_id).delete()
+            WAITLIST_PROMOTIONS.inc()
+            promoted[slot_id] = user_id
+            pending.discard(slot_id)
+            if not pending:
+                break
+    return promoted
+
+
+def unsubscribe_slot(user, pk):
+    with transaction.atomic():
+        waiting = lock_waiting_users([pk])
+        released = TimeSlot.objects.filter(pk=pk, user_id=user.pk).update(user=None)
+        if released:
+            start_time, category_id = TimeSlot.objects.filter(pk=pk).values_list('start_time', 'category_id').get()
+            promoted = promote_waitlist([pk], waiting)
+            if not promoted:
+                update_availability([(category_id, start_time, 0, -1)])
+            bump_week_versions(start_time)
+            publish_slot_events(slot_event(pk, start_time, category_id, BOOKED if promoted else FREE))
+
+    if released:
+        return 200, "Unsubscribed."
+
+    if not TimeSlot.objects.filter(pk=pk).exists():
+        return 404, "Slot not found."
+    return 403, "You are not subscribed to this slot."
+
+
+def waitlist_position(user, pk):
+    # 1-based; both lookups are range scans on the (slot, id) index.
+    entry_id = WaitlistEntry.objects.filter(slot_id=pk, user_id=user.pk).values_list('id', flat=True).first()
+    if entry_id is None:
+        return None
+    return WaitlistEntry.objects.filter(slot_id=pk, id__lte=entry_id).count()
+
+
+def join_waitlist(user, pk):
+    with transaction.atomic():
+        # Locks the slot row, so it can't be freed between the check and the
+        # insert and leave the user queued for a free slot.
+        owner = TimeSlot.objects.select_for_update().filter(pk=pk).values_list('user_id', flat=True)
+        if not owner:
+            return 404, "Slot not found.", None
+        if owner[0] is None:
+            return 409, "Slot is free; book it instead.", None
+        if owner[0] == user.pk:
+            return 409, "You already booked this slot.", None
+        _, created = WaitlistEntry.objects.get_or_create(slot_id=pk, user_id=user.pk)
+        position = waitlist_position(user, pk)
+    if created:
+        return 201, "Joined the waitlist.", position
+    return 200, "Already on the waitlist.", position
+
+
+def leave_waitlist(user, pk):
+    deleted, _ = WaitlistEntry.objects.filter(slot_id=pk, user_id=user.pk).delete()
+    return bool(deleted)
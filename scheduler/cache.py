@@ -0,0 +1,110 @@
+import hashlib
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import UserPreference
+
+
+def parse_week_offset(week):
+    try:
+        return int(week)
+    except ValueError:
+        return 0
+
+
+def parse_flag(value):
+    # Query string flags: "1", "true" and "yes" turn them on; anything else,
+    # "0" and "false" included, leaves them off.
+    return str(value or '').strip().lower() in {'1', 'true', 'yes'}
+
+
+def get_week_start(week_offset=0):
+    today = timezone.now().date()
+    start_of_week = today - timedelta(days=today.weekday())
+    return start_of_week + timedelta(weeks=week_offset)
+
+
+def get_slot_weeks(start_time):
+    # The week filter is inclusive on both ends, so a slot starting exactly at
+    # Monday midnight is also listed in the previous week.
+    local = timezone.localtime(start_time)
+    day = local.date()
+    week_start = day - timedelta(days=day.weekday())
+    weeks = [week_start]
+    if day.weekday() == 0 and local.time() == local.time().min:
+        weeks.append(week_start - timedelta(weeks=1))
+    return weeks
+
+
+def _version_key(week_start):
+    return f'slots:week:{week_start.isoformat()}:version'
+
+
+def get_week_version(week_start):
+    key = _version_key(week_start)
+    version = cache.get(key)
+    if version is None:
+        # Seeding from the clock keeps versions unique if the key was evicted.
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_week_versions(*start_times):
+    weeks = {week for start_time in start_times if start_time for week in get_slot_weeks(start_time)}
+
+    def bump():
+        # A fresh clock value rather than incr(): the file-based backend has no
+        # atomic increment, and a unique value per write is all readers need.
+        for week_start in weeks:
+            cache.set(_version_key(week_start), time.time_ns(), timeout=None)
+
+    if weeks:
+        transaction.on_commit(bump)
+
+
+def get_week_cache_key(week_start, version, *variant):
+    parts = ':'.join(str(part) for part in variant)
+    return f'slots:list:{week_start.isoformat()}:{parts}:{version}'
+
+
+def get_etag(cache_key):
+    return '"%s"' % hashlib.md5(cache_key.encode()).hexdigest()
+
+
+def etag_matches(if_none_match, etag):
+    return etag in [tag.strip() for tag in (if_none_match or '').split(',')]
+
+
+def get_cached_week(cache_key):
+    return cache.get(cache_key)
+
+
+def set_cached_week(cache_key, data):
+    cache.set(cache_key, data, timeout=settings.SLOT_CACHE_TIMEOUT)
+
+
+def _preferences_key(user_id):
+    return f'preferences:{user_id}:categories'
+
+
+def get_preferred_category_ids(user):
+    key = _preferences_key(user.pk)
+    category_ids = cache.get(key)
+    if category_ids is None:
+        category_ids = sorted(
+            UserPreference.categories.through.objects.filter(
+                userpreference__user_id=user.pk
+            ).values_list('eventcategory_id', flat=True)
+        )
+        cache.set(key, category_ids, timeout=settings.PREFERENCE_CACHE_TIMEOUT)
+    return category_ids
+
+
+def invalidate_preferred_categories(user_id):
+    transaction.on_commit(lambda: cache.delete(_preferences_key(user_id)))
@@ -0,0 +1,222 @@
+import asyncio
+import itertools
+import json
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+BOOKED = 'booked'
+FREE = 'free'
+DELETED = 'deleted'
+
+
+def slot_event(pk, start_time, category_id, state, previous_start_time=None):
+    event = {'id': pk, 'state': state, 'category': category_id, 'start_time': start_time.isoformat()}
+    if previous_start_time is not None and previous_start_time != start_time:
+        # Lets listeners of the old week drop a slot that moved away.
+        event['previous_start_time'] = previous_start_time.isoformat()
+    return event
+
+
+def publish_slot_events(*events):
+    # Like the week cache bump, listeners only hear about committed changes.
+    events = [event for event in events if event['id'] is not None]
+    if events:
+        transaction.on_commit(lambda: get_broadcaster().publish(events))
+
+
+class Subscription:
+    def __init__(self, broadcaster, max_queue):
+        self.broadcaster = broadcaster
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.pending = []
+        self.overflowed = False
+
+    def put(self, events):
+        # Called from whichever thread published; hands the events over to
+        # the subscriber's event loop.
+        try:
+            self.loop.call_soon_threadsafe(self._put, events)
+        except RuntimeError:
+            self.broadcaster.unsubscribe(self)
+
+    def _put(self, events):
+        for event in events:
+            try:
+                self.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # A client this far behind reconnects and replays instead.
+                self.overflowed = True
+                return
+
+    async def get(self, timeout):
+        if self.pending:
+            events, self.pending = self.pending, []
+            return events
+        try:
+            events = [await asyncio.wait_for(self.queue.get(), timeout)]
+        except asyncio.TimeoutError:
+            return []
+        while not self.queue.empty():
+            events.append(self.queue.get_nowait())
+        return events
+
+    def close(self):
+        self.broadcaster.unsubscribe(self)
+
+
+class InProcessBroadcaster:
+    """Fans events out to the subscribers of this process only."""
+
+    def __init__(self, location=None, backlog=1000, max_queue=1000):
+        self.lock = threading.Lock()
+        self.subscribers = set()
+        self.backlog = deque(maxlen=backlog)
+        self.sequence = itertools.count(1)
+        self.max_queue = max_queue
+
+    def publish(self, events):
+        with self.lock:
+            events = [dict(event, version=next(self.sequence)) for event in events]
+            self.backlog.extend(events)
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            subscriber.put(events)
+
+    def subscribe(self, after=None):
+        # Must run on the subscriber's event loop. Returns the subscription
+        # and whether every event after ``after`` could be replayed.
+        subscription = Subscription(self, self.max_queue)
+        with self.lock:
+            self.subscribers.add(subscription)
+            complete = True
+            if after is not None:
+                subscription.pending, complete = self.replay(after)
+        return subscription, complete
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+
+    def close(self):
+        pass
+
+    def replay(self, after):
+        events = [event for event in self.backlog if event['version'] > after]
+        oldest = events[0]['version'] if events else (self.backlog[-1]['version'] + 1 if self.backlog else 1)
+        return events, oldest == after + 1
+
+
+class SQLiteBroadcaster(InProcessBroadcaster):
+    """Shares events between processes through a SQLite file.
+
+    Publishers append rows; one poller thread per process reads new rows and
+    fans them out to that process's subscribers. Row ids are the versions.
+    """
+
+    def __init__(self, location, poll_interval=0.2, retention=3600, **kwargs):
+        super().__init__(**kwargs)
+        self.location = str(location)
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.local = threading.local()
+        self.poller = None
+        self.stopped = threading.Event()
+        self.pruned_at = 0
+        with self.connect() as db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS slot_events '
+                '(id INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT NOT NULL, created REAL NOT NULL)'
+            )
+        self.last_seen = self.latest_version()
+
+    def connect(self):
+        if getattr(self.local, 'db', None) is None:
+            self.local.db = sqlite3.connect(self.location, timeout=5)
+        return self.local.db
+
+    def latest_version(self):
+        return self.connect().execute('SELECT COALESCE(MAX(id), 0) FROM slot_events').fetchone()[0]
+
+    def publish(self, events):
+        now = time.time()
+        with self.connect() as db:
+            db.executemany(
+                'INSERT INTO slot_events (payload, created) VALUES (?, ?)',
+                [(json.dumps(event), now) for event in events],
+            )
+            if now - self.pruned_at > 60:
+                db.execute('DELETE FROM slot_events WHERE created < ?', (now - self.retention,))
+                self.pruned_at = now
+
+    def subscribe(self, after=None):
+        with self.lock:
+            if self.poller is None:
+                self.poller = threading.Thread(target=self.poll, name='slot-events-poller', daemon=True)
+                self.poller.start()
+        return super().subscribe(after)
+
+    def replay(self, after):
+        rows = self.connect().execute(
+            'SELECT id, payload FROM slot_events WHERE id > ? AND id <= ? ORDER BY id', (after, self.last_seen)
+        ).fetchall()
+        events = [dict(json.loads(payload), version=pk) for pk, payload in rows]
+        if after >= self.last_seen:
+            # Nothing to replay, unless the client is ahead of a recreated file.
+            return events, after == self.last_seen
+        return events, bool(rows) and rows[0][0] == after + 1
+
+    def close(self):
+        self.stopped.set()
+
+    def poll(self):
+        while not self.stopped.wait(self.poll_interval):
+            if not self.subscribers:
+                # Nobody to deliver to: skip ahead instead of reading rows.
+                latest = self.latest_version()
+                with self.lock:
+                    if not self.subscribers:
+                        self.last_seen = latest
+                        continue
+            rows = self.connect().execute(
+                'SELECT id, payload FROM slot_events WHERE id > ? ORDER BY id', (self.last_seen,)
+            ).fetchall()
+            if not rows:
+                continue
+            events = [dict(json.loads(payload), version=pk) for pk, payload in rows]
+            with self.lock:
+                self.last_seen = rows[-1][0]
+                subscribers = list(self.subscribers)
+            for subscriber in subscribers:
+                subscriber.put(events)
+
+
+_broadcaster = None
+_broadcaster_lock = threading.Lock()
+
+
+def get_broadcaster():
+    global _broadcaster
+    if _broadcaster is None:
+        with _broadcaster_lock:
+            if _broadcaster is None:
+                config = settings.SLOT_EVENTS
+                _broadcaster = import_string(config['BACKEND'])(config.get('LOCATION'), **config.get('OPTIONS', {}))
+    return _broadcaster
+
+
+@receiver(setting_changed)
+def reset_broadcaster(setting, **kwargs):
+    global _broadcaster
+    if setting == 'SLOT_EVENTS' and _broadcaster is not None:
+        _broadcaster.close()
+        _broadcaster = None
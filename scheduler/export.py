@@ -0,0 +1,64 @@
+import csv
+import json
+from datetime import datetime, time
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+EXPORT_FIELDS = (
+    'id', 'category_id', 'category__name', 'start_time', 'end_time', 'user_id', 'user__username',
+)
+EXPORT_HEADER = ('id', 'category_id', 'category', 'start_time', 'end_time', 'user_id', 'username')
+# Archived slots export under the id they had in TimeSlot.
+ARCHIVE_EXPORT_FIELDS = ('original_id',) + EXPORT_FIELDS[1:]
+
+# Rows are written out in groups so the response isn't one tiny chunk per row.
+ROWS_PER_CHUNK = 500
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def parse_export_datetime(value):
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            if day is None:
+                return None
+            parsed = datetime.combine(day, time.min)
+    except ValueError:
+        return None
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _format_row(row):
+    return [value.isoformat() if isinstance(value, datetime) else value for value in row]
+
+
+def stream_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_HEADER)
+    chunk = []
+    for row in rows:
+        chunk.append(writer.writerow(_format_row(row)))
+        if len(chunk) >= ROWS_PER_CHUNK:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def stream_ndjson(rows):
+    chunk = []
+    for row in rows:
+        chunk.append(json.dumps(dict(zip(EXPORT_HEADER, _format_row(row)))) + '\n')
+        if len(chunk) >= ROWS_PER_CHUNK:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
@@ -0,0 +1,228 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from itertools import chain
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import make_password, verify_password
+from django.contrib.auth.models import User
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .metrics import LOGIN_HASH
+
+
+class HashingPoolFull(Exception):
+    """Raised by HashingPool.run when every worker and queue slot is taken."""
+
+
+class HashingUnavailable(APIException):
+    # What the API views answer with when the pool is full.
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Too many sign-ins in progress, try again shortly."
+    default_code = 'hashing_unavailable'
+
+    def __init__(self):
+        super().__init__()
+        # DRF's exception handler turns ``wait`` into a Retry-After header.
+        self.wait = settings.PASSWORD_HASH_RETRY_AFTER
+
+
+def _init_worker(settings_module):
+    # Spawned workers (Windows, macOS) start without Django configured.
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+
+def _validate_and_hash(username, password):
+    try:
+        validate_password(password, User(username=username))
+    except ValidationError as e:
+        return e.messages, None
+    return [], make_password(password)
+
+
+def _validate_and_hash_many(credentials):
+    return [_validate_and_hash(username, password) for username, password in credentials]
+
+
+def _new_executor(workers):
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'backend.settings'),),
+    )
+
+
+class HashingPool:
+    """Runs password hashing in worker processes, off the request thread.
+
+    At most ``workers + queue_size`` jobs are accepted at once; beyond that
+    callers get HashingPoolFull immediately instead of queueing up.
+    """
+
+    def __init__(self, workers, queue_size):
+        self.executor = _new_executor(workers)
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+
+    def run(self, fn, *args):
+        if not self.slots.acquire(blocking=False):
+            raise HashingPoolFull()
+        try:
+            future = self.executor.submit(fn, *args)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda future: self.slots.release())
+        return future.result()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class InlineHashing:
+    # PASSWORD_HASH_WORKERS=0: hash in the request thread, as Django does.
+    def run(self, fn, *args):
+        return fn(*args)
+
+    def shutdown(self):
+        pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_hashing_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                if settings.PASSWORD_HASH_WORKERS:
+                    _pool = HashingPool(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_QUEUE_SIZE)
+                else:
+                    _pool = InlineHashing()
+    return _pool
+
+
+@receiver(setting_changed)
+def reset_hashing_pool(setting, **kwargs):
+    global _pool
+    if setting in ('PASSWORD_HASH_WORKERS', 'PASSWORD_HASH_QUEUE_SIZE') and _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
+
+def validate_and_hash_password(username, password):
+    # Returns (validation messages, encoded password or None).
+    return get_hashing_pool().run(_validate_and_hash, username, password)
+
+
+_fail_when_full = ContextVar('hashing_fail_when_full', default=False)
+
+
+@contextmanager
+def fail_when_full():
+    # Inside the block PooledModelBackend lets HashingPoolFull through, so an
+    # API view can answer 503. Elsewhere, e.g. the admin login form, a full
+    # pool falls back to hashing in the request thread.
+    token = _fail_when_full.set(True)
+    try:
+        yield
+    finally:
+        _fail_when_full.reset(token)
+
+
+class PooledModelBackend(ModelBackend):
+    """ModelBackend with the password hashing done by the hashing pool."""
+
+    def run(self, pool, fn, *args):
+        try:
+            return pool.run(fn, *args)
+        except HashingPoolFull:
+            if _fail_when_full.get():
+                raise
+            return fn(*args)
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        pool = get_hashing_pool()
+        try:
+            user = User._default_manager.get_by_natural_key(username)
+        except User.DoesNotExist:
+            # Hash anyway so unknown usernames take as long as wrong passwords.
+            started = time.perf_counter()
+            self.run(pool, make_password, password)
+            LOGIN_HASH.observe(time.perf_counter() - started)
+            return None
+
+        started = time.perf_counter()
+        valid, must_update = self.run(pool, verify_password, password, user.password)
+        LOGIN_HASH.observe(time.perf_counter() - started)
+        if not valid or not self.user_can_authenticate(user):
+            return None
+        if must_update:
+            user.password = self.run(pool, make_password, password)
+            user.save(update_fields=['password'])
+        return user
+
+
+def _hash_many_with(executor, workers):
+    def hash_many(credentials):
+        # A few chunks per worker keeps them busy without per-row IPC.
+        size = max(1, -(-len(credentials) // (workers * 4)))
+        chunks = [credentials[i:i + size] for i in range(0, len(credentials), size)]
+        return list(chain.from_iterable(executor.map(_validate_and_hash_many, chunks)))
+    return hash_many
+
+
+@contextmanager
+def parallel_hashing(workers=None):
+    # Yields hash_many([(username, password), ...]) -> [(messages, encoded), ...]
+    # spread over ``workers`` processes, all cores by default. Bulk jobs get
+    # their own processes so they never take the login pool's slots.
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        yield _validate_and_hash_many
+        return
+
+    with _new_executor(workers) as executor:
+        yield _hash_many_with(executor, workers)
+
+
+_provisioning_executor = None
+
+
+def shared_hash_many(credentials):
+    # parallel_hashing's hash_many for requests: PROVISIONING_WORKERS processes
+    # started on first use and shared by every bulk request in this server
+    # process, so concurrent uploads queue up instead of each starting a pool.
+    global _provisioning_executor
+    workers = settings.PROVISIONING_WORKERS
+    if workers <= 1:
+        return _validate_and_hash_many(credentials)
+    if _provisioning_executor is None:
+        with _pool_lock:
+            if _provisioning_executor is None:
+                _provisioning_executor = _new_executor(workers)
+    return _hash_many_with(_provisioning_executor, workers)(credentials)
+
+
+@receiver(setting_changed)
+def reset_provisioning_executor(setting, **kwargs):
+    global _provisioning_executor
+    if setting == 'PROVISIONING_WORKERS' and _provisioning_executor is not None:
+        _provisioning_executor.shutdown(wait=False, cancel_futures=True)
+        _provisioning_executor = None
@@ -0,0 +1,47 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from scheduler.archive import archive_slots_batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Move slots that ended more than --days ago from TimeSlot to ArchivedTimeSlot. Each batch is "
+        "its own short transaction, so bookings carry on while it runs; safe to interrupt and rerun."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.SLOT_ARCHIVE_AFTER_DAYS)
+        parser.add_argument('--batch-size', type=int, default=settings.SLOT_ARCHIVE_BATCH_SIZE)
+        parser.add_argument(
+            '--pause', type=float, default=0.05,
+            help="Seconds to sleep between batches, leaving room for other writers.",
+        )
+        parser.add_argument('--limit', type=int, help="Stop after archiving this many slots.")
+
+    def handle(self, *args, **options):
+        if options['days'] < 1:
+            raise CommandError("--days must be at least 1.")
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        limit = options['limit']
+
+        archived = 0
+        started = time.perf_counter()
+        while limit is None or archived < limit:
+            batch_size = options['batch_size'] if limit is None else min(options['batch_size'], limit - archived)
+            moved = archive_slots_batch(cutoff, batch_size)
+            archived += moved
+            if moved < batch_size:
+                break
+            time.sleep(options['pause'])
+
+        self.stdout.write(
+            f"Archived {archived} slots that ended before {cutoff:%Y-%m-%d %H:%M} "
+            f"in {time.perf_counter() - started:.1f}s."
+        )
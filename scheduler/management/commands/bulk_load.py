@@ -0,0 +1,208 @@
+import csv
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+from itertools import islice
+
+from django.contrib.auth.hashers import identify_hasher, is_password_usable, make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from scheduler.availability import update_availability
+from scheduler.cache import bump_week_versions
+from scheduler.models import BulkLoadProgress, EventCategory, TimeSlot
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+
+
+def read_rows(path, file_format):
+    with open(path, newline='', encoding='utf-8') as f:
+        if file_format == 'csv':
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def parse_bool(value, default=False):
+    if value is None or value == '':
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in TRUE_VALUES
+
+
+def parse_time(value, row_number, field, tz):
+    # fromisoformat() is much cheaper than parse_datetime() over millions of rows.
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        parsed = parse_datetime(value or '')
+    if parsed is None:
+        raise CommandError(f"Row {row_number}: invalid {field} {value!r}.")
+    if parsed.tzinfo is None:
+        parsed = timezone.make_aware(parsed, tz)
+    return parsed
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream categories, users or time slots from a JSONL or CSV file into the database "
+        "in batches. Progress is checkpointed so an interrupted load can be resumed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=['categories', 'users', 'slots'])
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['jsonl', 'csv'], help="Defaults to the file extension.")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--checkpoint', help="Checkpoint file, defaults to <path>.checkpoint.")
+        parser.add_argument('--resume', action='store_true', help="Continue from an existing checkpoint.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError("--batch-size must be positive.")
+        self.checkpoint_path = options['checkpoint'] or f'{path}.checkpoint'
+        self.kind = options['kind']
+
+        progress = self.read_checkpoint(options['resume'])
+        builder = getattr(self, f'build_{self.kind}')
+        self.load_lookups()
+
+        done = progress.rows
+        rows = enumerate(read_rows(path, file_format), start=1)
+        rows = islice(rows, done, None)
+        loaded = skipped = 0
+        started = time.perf_counter()
+
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            objects = [obj for obj in (builder(number, row) for number, row in batch) if obj is not None]
+            with transaction.atomic():
+                self.insert(objects)
+                BulkLoadProgress.objects.filter(pk=progress.pk).update(rows=batch[-1][0])
+            done = batch[-1][0]
+
+            loaded += len(objects)
+            skipped += len(batch) - len(objects)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"{self.kind}: {done} rows read, {loaded} inserted, {skipped} skipped "
+                f"({loaded / elapsed if elapsed else 0:,.0f} rows/sec)"
+            )
+
+        progress.delete()
+        os.remove(self.checkpoint_path)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Loaded {loaded} {self.kind} in {elapsed:.1f}s "
+            f"({loaded / elapsed if elapsed else 0:,.0f} rows/sec), skipped {skipped}."
+        ))
+
+    def read_checkpoint(self, resume):
+        # The file only names the run; its committed row count lives in
+        # BulkLoadProgress, written in the same transaction as each batch.
+        if not os.path.exists(self.checkpoint_path):
+            progress = BulkLoadProgress.objects.create(load_id=uuid.uuid4(), kind=self.kind)
+            tmp_path = f'{self.checkpoint_path}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump({'kind': self.kind, 'load': str(progress.load_id)}, f)
+            os.replace(tmp_path, self.checkpoint_path)
+            return progress
+        if not resume:
+            raise CommandError(
+                f"Found checkpoint {self.checkpoint_path}; pass --resume to continue or delete it."
+            )
+        with open(self.checkpoint_path) as f:
+            checkpoint = json.load(f)
+        if checkpoint['kind'] != self.kind:
+            raise CommandError(f"Checkpoint belongs to a '{checkpoint['kind']}' load.")
+        progress = BulkLoadProgress.objects.filter(pk=checkpoint.get('load')).first()
+        if progress is None:
+            raise CommandError(f"Checkpoint {self.checkpoint_path} has no progress in this database.")
+        self.stdout.write(f"Resuming after row {progress.rows}.")
+        return progress
+
+    def load_lookups(self):
+        # One query per table up front instead of one lookup per row.
+        self.categories = dict(EventCategory.objects.values_list('name', 'id'))
+        self.users = dict(User.objects.values_list('username', 'id'))
+        self.tz = timezone.get_current_timezone()
+
+    def insert(self, objects):
+        if self.kind == 'categories':
+            created = EventCategory.objects.bulk_create(objects)
+            self.categories.update((category.name, category.id) for category in created)
+        elif self.kind == 'users':
+            created = User.objects.bulk_create(objects)
+            self.users.update((user.username, user.id) for user in created)
+        else:
+            TimeSlot.objects.bulk_create(objects)
+            update_availability(
+                (slot.category_id, slot.start_time, 1, 1 if slot.user_id else 0) for slot in objects
+            )
+            bump_week_versions(*{slot.start_time for slot in objects})
+
+    def build_categories(self, number, row):
+        name = (row.get('name') or '').strip()
+        if not name:
+            raise CommandError(f"Row {number}: category name is required.")
+        # Names already in the database (or earlier in the file) are skipped,
+        # which also makes re-running an interrupted batch harmless.
+        if name in self.categories:
+            return None
+        self.categories[name] = None
+        return EventCategory(name=name, description=row.get('description') or '')
+
+    def build_users(self, number, row):
+        username = (row.get('username') or '').strip()
+        if not username:
+            raise CommandError(f"Row {number}: username is required.")
+        if username in self.users:
+            return None
+        # Passwords must already be hashed; rows without one get an unusable password.
+        password = row.get('password') or make_password(None)
+        if is_password_usable(password):
+            try:
+                identify_hasher(password)
+            except ValueError:
+                raise CommandError(
+                    f"Row {number}: password is not a Django password hash; "
+                    "use provision_users for plain-text passwords."
+                )
+        self.users[username] = None
+        return User(
+            username=username,
+            email=row.get('email') or '',
+            password=password,
+            is_staff=parse_bool(row.get('is_staff')),
+            is_superuser=parse_bool(row.get('is_superuser')),
+            is_active=parse_bool(row.get('is_active'), default=True),
+        )
+
+    def build_slots(self, number, row):
+        category_id = self.categories.get(row.get('category'))
+        if category_id is None:
+            raise CommandError(f"Row {number}: unknown category {row.get('category')!r}.")
+        username = row.get('user') or None
+        user_id = None
+        if username is not None:
+            user_id = self.users.get(username)
+            if user_id is None:
+                raise CommandError(f"Row {number}: unknown user {username!r}.")
+        start_time = parse_time(row.get('start_time'), number, 'start_time', self.tz)
+        end_time = parse_time(row.get('end_time'), number, 'end_time', self.tz)
+        if start_time >= end_time:
+            raise CommandError(f"Row {number}: start_time must be before end_time.")
+        return TimeSlot(category_id=category_id, start_time=start_time, end_time=end_time, user_id=user_id)
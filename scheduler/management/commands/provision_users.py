@@ -0,0 +1,40 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from scheduler.provisioning import UserProvisioner, read_user_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Create users from a CSV or JSONL file of usernames, plain-text passwords and preferred "
+        "categories. Passwords are validated and hashed on all cores; rows that fail are reported "
+        "and skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['jsonl', 'csv'], help="Defaults to the file extension.")
+        parser.add_argument('--workers', type=int, help="Hashing processes, defaults to the number of cores.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be positive.")
+
+        started = time.perf_counter()
+        with open(path, newline='', encoding='utf-8') as f:
+            result = UserProvisioner(options['batch_size']).run(
+                read_user_rows(f, file_format), workers=options['workers']
+            )
+        elapsed = time.perf_counter() - started
+
+        for error in result['errors']:
+            self.stderr.write(json.dumps(error))
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {result['created']} users in {elapsed:.1f}s "
+            f"({result['created'] / elapsed if elapsed else 0:,.0f} users/sec), {len(result['errors'])} rows failed."
+        ))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from scheduler.availability import rebuild_availability
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the SlotAvailability summary from the slots table, repairing any drift "
+        "(e.g. after raw SQL changes). Rebuilds every day unless --start/--end are given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help="First day to rebuild (YYYY-MM-DD).")
+        parser.add_argument('--end', help="Day after the last one to rebuild (YYYY-MM-DD).")
+
+    def handle(self, *args, **options):
+        dates = {}
+        for name in ('start', 'end'):
+            value = options[name]
+            try:
+                dates[name] = parse_date(value) if value else None
+            except ValueError:
+                dates[name] = None
+            if value and dates[name] is None:
+                raise CommandError(f"Invalid --{name} date: {value}")
+        rows = rebuild_availability(dates['start'], dates['end'])
+        self.stdout.write(f"Rebuilt {rows} availability rows.")
@@ -0,0 +1,48 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database over each replica in DATABASE_REPLICAS, for trying out "
+        "read replicas locally. PostgreSQL replicas are kept up to date by streaming replication instead."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float,
+            help="Keep copying every INTERVAL seconds until interrupted, simulating replication lag.",
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError("No replicas configured; set DB_REPLICAS.")
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite':
+            raise CommandError("sync_replicas only copies SQLite databases.")
+
+        while True:
+            started = time.perf_counter()
+            for alias in settings.DATABASE_REPLICAS:
+                self.copy(primary, connections[alias].settings_dict['NAME'])
+            self.stdout.write(
+                f"Copied primary to {len(settings.DATABASE_REPLICAS)} replicas "
+                f"in {(time.perf_counter() - started) * 1000:.0f} ms."
+            )
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def copy(self, primary, path):
+        # The backup API takes a consistent snapshot while the primary stays
+        # writable, and readers of the replica see the new pages once it's done.
+        primary.ensure_connection()
+        target = sqlite3.connect(path)
+        try:
+            primary.connection.backup(target)
+        finally:
+            target.close()
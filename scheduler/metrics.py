@@ -0,0 +1,314 @@
+import json
+import math
+import os
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from rest_framework.exceptions import APIException
+from rest_framework.settings import api_settings
+
+# Every thread records into its own shard, so the hot path never waits on a
+# lock. A background thread merges the shards and writes the process total
+# to METRICS_DIR/<pid>.json; the scrape endpoint adds up all those files.
+_shards = []  # (thread, shard)
+_retired = {}  # totals of threads that have exited
+_shards_lock = threading.Lock()  # taken when a thread first records and when merging
+_local = threading.local()
+_flusher = {'started': False}
+
+_metrics = {}
+
+
+def _shard():
+    shard = getattr(_local, 'shard', None)
+    if shard is None:
+        shard = _local.shard = {}
+        with _shards_lock:
+            _shards.append((threading.current_thread(), shard))
+            # Servers that start a thread per request would otherwise pile up shards.
+            if len(_shards) > 2 * threading.active_count():
+                _retire_exited_threads()
+            if settings.METRICS_DIR and not _flusher['started']:
+                _flusher['started'] = True
+                threading.Thread(target=_flush_forever, daemon=True).start()
+    return shard
+
+
+def _retire_exited_threads():
+    for entry in [entry for entry in _shards if not entry[0].is_alive()]:
+        _shards.remove(entry)
+        for key, value in entry[1].items():
+            _merge(_retired, key, value)
+
+
+def _reset_after_fork():
+    # Forked workers start from zero and write their own file.
+    global _local, _shards_lock
+    _local = threading.local()
+    _shards_lock = threading.Lock()
+    _shards.clear()
+    _retired.clear()
+    _flusher['started'] = False
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name, self.help, self.labels = name, help_text, labels
+        _metrics[name] = self
+
+    def inc(self, *labels, amount=1):
+        shard = _shard()
+        key = (self.name, labels)
+        shard[key] = shard.get(key, 0) + amount
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=()):
+        self.name, self.help, self.labels, self.buckets = name, help_text, labels, buckets
+        _metrics[name] = self
+
+    def observe(self, value, *labels):
+        shard = _shard()
+        key = (self.name, labels)
+        # Per-bucket (not cumulative) counts, then +Inf, sum and count.
+        values = shard.get(key)
+        if values is None:
+            values = shard[key] = [0] * (len(self.buckets) + 3)
+        index = 0
+        while index < len(self.buckets) and value > self.buckets[index]:
+            index += 1
+        values[index] += 1
+        values[-2] += value
+        values[-1] += 1
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', "Request latency by URL name.", ('view', 'method'), LATENCY_BUCKETS
+)
+REQUEST_QUERIES = Counter('db_queries_total', "Database queries run by requests, by URL name.", ('view',))
+BOOKINGS = Counter('bookings_total', "Single-slot booking attempts by result.", ('result',))
+UNSUBSCRIBES = Counter('unsubscribes_total', "Single-slot unsubscribe attempts by result.", ('result',))
+WAITLIST_PROMOTIONS = Counter('waitlist_promotions_total', "Freed slots handed to the first user waiting.")
+LOGIN_HASH = Histogram(
+    'login_hash_seconds', "Password hashing time per login, including waiting for the pool.", (),
+    (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+BOOKING_RESULTS = {200: 'booked', 404: 'not_found', 409: 'conflict'}
+UNSUBSCRIBE_RESULTS = {200: 'unsubscribed', 403: 'not_subscribed', 404: 'not_found'}
+
+
+def record_booking(status):
+    BOOKINGS.inc(BOOKING_RESULTS.get(status, str(status)))
+
+
+def record_unsubscribe(status):
+    UNSUBSCRIBES.inc(UNSUBSCRIBE_RESULTS.get(status, str(status)))
+
+
+def _merge(total, key, value):
+    if isinstance(value, list):
+        current = total.get(key)
+        total[key] = value[:] if current is None else [a + b for a, b in zip(current, value)]
+    else:
+        total[key] = total.get(key, 0) + value
+
+
+def process_snapshot():
+    total = {}
+    with _shards_lock:
+        _retire_exited_threads()
+        shards = [shard for _, shard in _shards]
+        for key, value in _retired.items():
+            _merge(total, key, value)
+    for shard in shards:
+        # dict() copies in one step, so other threads may keep recording.
+        for key, value in dict(shard).items():
+            _merge(total, key, value)
+    return total
+
+
+def _snapshot_path(pid):
+    return os.path.join(settings.METRICS_DIR, f'{pid}.json')
+
+
+def write_snapshot(snapshot, pid):
+    path = _snapshot_path(pid)
+    with open(f'{path}.tmp', 'w', encoding='utf-8') as f:
+        json.dump([[name, list(labels), value] for (name, labels), value in snapshot.items()], f)
+    os.replace(f'{path}.tmp', path)
+
+
+def _flush_forever():
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    while True:
+        time.sleep(settings.METRICS_FLUSH_INTERVAL)
+        write_snapshot(process_snapshot(), os.getpid())
+
+
+def collect():
+    # This process live, other processes as of their last flush.
+    total = process_snapshot()
+    if settings.METRICS_DIR and os.path.isdir(settings.METRICS_DIR):
+        own = f'{os.getpid()}.json'
+        for filename in os.listdir(settings.METRICS_DIR):
+            if not filename.endswith('.json') or filename == own:
+                continue
+            try:
+                with open(os.path.join(settings.METRICS_DIR, filename), encoding='utf-8') as f:
+                    rows = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for name, labels, value in rows:
+                _merge(total, (name, tuple(labels)), value)
+    return total
+
+
+def reset_metrics():
+    with _shards_lock:
+        _retired.clear()
+        for _, shard in _shards:
+            shard.clear()
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_number(value):
+    if isinstance(value, float) and math.isinf(value):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_metrics(snapshot):
+    # Prometheus text exposition format.
+    lines = []
+    for name, metric in _metrics.items():
+        lines.append(f'# HELP {name} {metric.help}')
+        lines.append(f'# TYPE {name} {metric.type}')
+        for (key_name, labels), value in sorted(snapshot.items(), key=lambda item: item[0]):
+            if key_name != name:
+                continue
+            if metric.type == 'counter':
+                lines.append(f'{name}{_format_labels(metric.labels, labels)} {_format_number(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(metric.buckets + (math.inf,), value[:-2]):
+                cumulative += count
+                le = [('le', _format_number(float(bound)))]
+                lines.append(f'{name}_bucket{_format_labels(metric.labels, labels, le)} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(metric.labels, labels)} {_format_number(float(value[-2]))}')
+            lines.append(f'{name}_count{_format_labels(metric.labels, labels)} {value[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+def _may_scrape(request):
+    # The scraper's METRICS_TOKEN, or a staff user: logged in to the admin or
+    # sending an API token.
+    if settings.METRICS_PUBLIC:
+        return True
+    if settings.METRICS_TOKEN and request.headers.get('Authorization') == f'Bearer {settings.METRICS_TOKEN}':
+        return True
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_staff:
+        return True
+    for authentication_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        try:
+            result = authentication_class().authenticate(request)
+        except APIException:
+            return False
+        if result is not None:
+            return result[0].is_staff
+    return False
+
+
+def metrics_view(request):
+    if not _may_scrape(request):
+        return HttpResponse(status=401)
+    return HttpResponse(render_metrics(collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+STANDARD_METHODS = frozenset({'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'})
+
+# Queries run by the current request; None outside MetricsMiddleware.
+_request_queries = ContextVar('request_queries', default=None)
+
+
+def _count_query(execute, sql, params, many, context):
+    queries = _request_queries.get()
+    if queries is not None:
+        queries[0] += 1
+    return execute(sql, params, many, context)
+
+
+def _install_query_counter(connection, **kwargs):
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+class MetricsMiddleware:
+    """Records latency and query count of every request, by URL name."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        connection_created.connect(_install_query_counter, dispatch_uid='scheduler.metrics')
+        for connection in connections.all(initialized_only=True):
+            _install_query_counter(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        queries = [0]
+        token = _request_queries.set(queries)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_queries.reset(token)
+        self.record(request, time.perf_counter() - started, queries[0])
+        return response
+
+    async def __acall__(self, request):
+        queries = [0]
+        token = _request_queries.set(queries)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_queries.reset(token)
+        self.record(request, time.perf_counter() - started, queries[0])
+        return response
+
+    def record(self, request, seconds, queries):
+        match = request.resolver_match
+        view = match.url_name if match is not None and match.url_name else 'unmatched'
+        # Arbitrary methods would each start a new series.
+        method = request.method if request.method in STANDARD_METHODS else 'other'
+        REQUEST_DURATION.observe(seconds, view, method)
+        if queries:
+            REQUEST_QUERIES.inc(view, amount=queries)
@@ -0,0 +1,46 @@
+# Generated by Django 5.0.4 on 2026-10-18 20:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def populate_availability(apps, schema_editor):
+    TimeSlot = apps.get_model('scheduler', 'TimeSlot')
+    SlotAvailability = apps.get_model('scheduler', 'SlotAvailability')
+    rows = TimeSlot.objects.annotate(day=TruncDate('start_time')).order_by().values('category_id', 'day').annotate(
+        total=Count('id'), booked=Count('user_id'),
+    )
+    SlotAvailability.objects.bulk_create(
+        [SlotAvailability(**row) for row in rows.values('category_id', 'day', 'total', 'booked')], batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0003_timeslot_user_end_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotAvailability',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('total', models.IntegerField(default=0)),
+                ('booked', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='scheduler.eventcategory')),
+            ],
+            options={
+                'verbose_name_plural': 'Slot availability',
+                'indexes': [models.Index(fields=['day', 'category'], name='slotavailability_day_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='slotavailability',
+            constraint=models.UniqueConstraint(fields=('category', 'day'), name='slotavailability_category_day_uniq'),
+        ),
+        migrations.RunPython(populate_availability, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.4 on 2026-10-18 22:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('scheduler', '0007_tokenrevocation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BulkLoadProgress',
+            fields=[
+                ('load_id', models.UUIDField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(max_length=20)),
+                ('rows', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
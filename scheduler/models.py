@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 
 
@@ -19,11 +19,102 @@ class TimeSlot(models.Model):
     end_time = models.DateTimeField()
     user = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['start_time'], name='timeslot_start_idx'),
+            models.Index(fields=['category', 'start_time'], name='timeslot_category_start_idx'),
+            models.Index(fields=['user', 'start_time'], name='timeslot_user_start_idx'),
+            models.Index(fields=['user', 'end_time'], name='timeslot_user_end_idx'),
+        ]
+
     def __str__(self):
         return f"{self.category.name} | {self.start_time.strftime('%Y-%m-%d %H:%M')}"
+
+    def save(self, *args, **kwargs):
+        # The save signals update SlotAvailability; keep both in one transaction.
+        with transaction.atomic(using=kwargs.get('using'), savepoint=False):
+            super().save(*args, **kwargs)
     
 
+class ArchivedTimeSlot(models.Model):
+    # Past slots moved out of TimeSlot by the archive_slots command, so the
+    # hot table and its indexes only hold recent and upcoming slots.
+    original_id = models.BigIntegerField(db_index=True)
+    category = models.ForeignKey(EventCategory, on_delete=models.CASCADE)
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    user = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['start_time'], name='archivedslot_start_idx'),
+            models.Index(fields=['user', 'start_time'], name='archivedslot_user_start_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.category.name} | {self.start_time.strftime('%Y-%m-%d %H:%M')} (archived)"
+
+
+class WaitlistEntry(models.Model):
+    # First come, first served: the queue is ordered by id.
+    slot = models.ForeignKey(TimeSlot, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = "Waitlist entries"
+        constraints = [
+            models.UniqueConstraint(fields=['slot', 'user'], name='waitlistentry_slot_user_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['slot', 'id'], name='waitlistentry_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} waiting for {self.slot_id}"
+
+
+class TokenRevocation(models.Model):
+    # Access tokens for user_id issued at or before revoked_at (Unix time, as
+    # in the iat claim) are refused. Not a foreign key: a deleted user's tokens
+    # stay revoked until they expire.
+    user_id = models.IntegerField(primary_key=True)
+    revoked_at = models.IntegerField()
+
+    def __str__(self):
+        return f"{self.user_id} revoked at {self.revoked_at}"
+
+
+class BulkLoadProgress(models.Model):
+    # Rows of a bulk_load run committed so far. Updated in the same
+    # transaction as each batch, so a resumed run continues exactly there.
+    load_id = models.UUIDField(primary_key=True)
+    kind = models.CharField(max_length=20)
+    rows = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.kind} load {self.load_id}: {self.rows} rows"
+
+
 class UserPreference(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     categories = models.ManyToManyField(EventCategory)
 
+
+class SlotAvailability(models.Model):
+    # Slot counts per category and day (in TIME_ZONE), kept up to date by
+    # scheduler.availability.update_availability on every slot change.
+    category = models.ForeignKey(EventCategory, on_delete=models.CASCADE)
+    day = models.DateField()
+    total = models.IntegerField(default=0)
+    booked = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "Slot availability"
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'day'], name='slotavailability_category_day_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['day', 'category'], name='slotavailability_day_idx'),
+        ]
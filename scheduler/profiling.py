@@ -0,0 +1,177 @@
+import json
+import logging
+import random
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework.serializers import BaseSerializer
+
+logger = logging.getLogger('scheduler.profiling')
+
+# Profile of the sampled request being handled, if any.
+_current_profile = ContextVar('request_profile', default=None)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = []  # (sql, params, seconds, alias)
+        self.db = 0.0
+        self.serialize = 0.0
+        self.render = 0.0
+        self.serializing = False
+        self.render_started = None
+
+    def add_query(self, sql, params, seconds, alias):
+        self.queries.append((sql, params, seconds, alias))
+        self.db += seconds
+
+    def repeated_queries(self):
+        # Same SQL with different parameters, over and over: usually N+1.
+        counts = Counter(sql for sql, _, _, _ in self.queries)
+        threshold = settings.REQUEST_PROFILING_REPEATED_QUERIES
+        return [(sql, count) for sql, count in counts.most_common() if count >= threshold]
+
+
+def _profile_query(execute, sql, params, many, context):
+    profile = _current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.add_query(sql, params, time.perf_counter() - started, context['connection'].alias)
+
+
+def _install_query_wrapper(connection, **kwargs):
+    if _profile_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_profile_query)
+
+
+_serializer_data = BaseSerializer.data
+
+
+def _profiled_serializer_data(self):
+    profile = _current_profile.get()
+    if profile is None or profile.serializing:
+        return _serializer_data.fget(self)
+    profile.serializing = True
+    started = time.perf_counter()
+    try:
+        return _serializer_data.fget(self)
+    finally:
+        profile.serialize += time.perf_counter() - started
+        profile.serializing = False
+
+
+def _install_hooks():
+    # Only done once the middleware is enabled, so the hooks cost nothing
+    # otherwise; unsampled requests pay one context variable lookup.
+    if BaseSerializer.data.fget is not _profiled_serializer_data:
+        BaseSerializer.data = property(_profiled_serializer_data)
+    connection_created.connect(_install_query_wrapper, dispatch_uid='scheduler.profiling')
+    for connection in connections.all(initialized_only=True):
+        _install_query_wrapper(connection)
+
+
+class RequestProfilingMiddleware:
+    """Times sampled requests and reports where the time went.
+
+    Adds a Server-Timing header (total, db, serialize, render) and logs one
+    JSON line per sampled request to the "scheduler.profiling" logger. The
+    full SQL is included for requests slower than
+    REQUEST_PROFILING_SQL_THRESHOLD_MS, and queries repeated
+    REQUEST_PROFILING_REPEATED_QUERIES times or more are flagged as likely
+    N+1s of the view. Put it first in MIDDLEWARE.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        _install_hooks()
+
+    def sampled(self):
+        rate = settings.REQUEST_PROFILING_SAMPLE_RATE
+        return rate >= 1 or (rate > 0 and random.random() < rate)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+        profile = RequestProfile()
+        token = _current_profile.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+        self.report(request, response, profile)
+        return response
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+        profile = RequestProfile()
+        token = _current_profile.set(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+        self.report(request, response, profile)
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered right after this hook returns.
+        profile = _current_profile.get()
+        if profile is not None:
+            profile.render_started = time.perf_counter()
+            response.add_post_render_callback(lambda response: self.rendered(profile))
+        return response
+
+    def rendered(self, profile):
+        profile.render += time.perf_counter() - profile.render_started
+
+    def report(self, request, response, profile):
+        total = time.perf_counter() - profile.started
+        view = request.resolver_match.view_name if request.resolver_match else None
+        repeated = profile.repeated_queries()
+
+        response['Server-Timing'] = ', '.join([
+            f'total;dur={total * 1000:.1f}',
+            f'db;dur={profile.db * 1000:.1f};desc="{len(profile.queries)} queries"',
+            f'serialize;dur={profile.serialize * 1000:.1f}',
+            f'render;dur={profile.render * 1000:.1f}',
+        ])
+
+        line = {
+            'method': request.method,
+            'path': request.path,
+            'view': view,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'db_ms': round(profile.db * 1000, 2),
+            'queries': len(profile.queries),
+            'serialize_ms': round(profile.serialize * 1000, 2),
+            'render_ms': round(profile.render * 1000, 2),
+        }
+        if repeated:
+            line['repeated_queries'] = [{'sql': sql, 'count': count} for sql, count in repeated]
+        if total * 1000 >= settings.REQUEST_PROFILING_SQL_THRESHOLD_MS:
+            line['sql'] = [
+                {'sql': sql, 'params': params, 'ms': round(seconds * 1000, 3), 'db': alias}
+                for sql, params, seconds, alias in profile.queries
+            ]
+        logger.info(json.dumps(line, default=str))
+
+        for sql, count in repeated:
+            logger.warning("Possible N+1 in %s: %d identical queries: %s", view, count, sql)
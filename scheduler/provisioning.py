@@ -0,0 +1,142 @@
+import csv
+import json
+from contextlib import nullcontext
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+
+from .hashing import parallel_hashing
+from .models import EventCategory, UserPreference
+
+
+def read_user_rows(f, file_format):
+    # (row number, dict) pairs from a text file of CSV or JSON lines.
+    if file_format == 'csv':
+        yield from enumerate(csv.DictReader(f), start=1)
+        return
+    for number, line in enumerate(f, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else {'_invalid': line.strip()}
+
+
+def parse_categories(value):
+    # JSON rows give a list; CSV cells separate names with "|" or ";".
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.replace(';', '|').split('|')
+    return [str(item).strip() for item in value if str(item).strip()]
+
+
+class UserProvisioner:
+    """Creates users (and their preferences) from rows in batches.
+
+    Rows that fail are reported and skipped; the rest of the batch is saved.
+    """
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        # Categories may be given by name or id; names win on a clash.
+        categories = list(EventCategory.objects.values_list('name', 'id'))
+        self.categories = {str(pk): pk for name, pk in categories}
+        self.categories.update(categories)
+        self.seen = set()
+        self.created = 0
+        self.errors = []
+
+    def run(self, rows, workers=None, hash_many=None):
+        # ``hash_many`` (e.g. hashing.shared_hash_many) replaces the pool of
+        # ``workers`` processes started for this run.
+        rows = iter(rows)
+        with nullcontext(hash_many) if hash_many else parallel_hashing(workers) as hash_many:
+            while True:
+                batch = list(islice(rows, self.batch_size))
+                if not batch:
+                    break
+                self.provision_batch(batch, hash_many)
+        return {"created": self.created, "errors": self.errors}
+
+    def error(self, number, username, messages):
+        self.errors.append({"row": number, "username": username, "errors": messages})
+
+    def check_row(self, number, row, existing):
+        if '_invalid' in row:
+            self.error(number, '', ["Invalid row."])
+            return None
+        username = User.normalize_username(str(row.get('username') or '').strip())
+        messages = []
+        if not username:
+            messages.append("Username is required.")
+        else:
+            try:
+                User.username_validator(username)
+            except ValidationError as e:
+                messages.extend(e.messages)
+            if username in existing or username in self.seen:
+                messages.append("Username already exists.")
+
+        category_ids = []
+        for name in parse_categories(row.get('categories')):
+            if name in self.categories:
+                category_ids.append(self.categories[name])
+            else:
+                messages.append(f"Unknown category {name!r}.")
+
+        if messages:
+            self.error(number, username, messages)
+            return None
+        self.seen.add(username)
+        password = str(row['password']) if row.get('password') else None
+        return number, username, password, str(row.get('email') or '').strip(), category_ids
+
+    def provision_batch(self, batch, hash_many):
+        usernames = [User.normalize_username(str(row.get('username') or '').strip()) for _, row in batch]
+        existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        candidates = [c for c in (self.check_row(number, row, existing) for number, row in batch) if c]
+
+        # Validators and hashing are the expensive part: all rows of the batch
+        # go to the worker processes at once.
+        hashed = iter(hash_many([(username, password) for _, username, password, _, _ in candidates if password]))
+        users = []
+        for number, username, password, email, category_ids in candidates:
+            messages, encoded = next(hashed) if password else ([], make_password(None))
+            if messages:
+                self.seen.discard(username)
+                self.error(number, username, messages)
+                continue
+            users.append((number, User(username=username, email=email, password=encoded), category_ids))
+        if not users:
+            return
+
+        try:
+            self.save_users(users)
+        except IntegrityError:
+            # Someone registered one of these usernames meanwhile; save the
+            # rest of the batch row by row so only that row fails.
+            for number, user, category_ids in users:
+                try:
+                    self.save_users([(number, User(username=user.username, email=user.email,
+                                                   password=user.password), category_ids)])
+                except IntegrityError:
+                    self.seen.discard(user.username)
+                    self.error(number, user.username, ["Could not be saved; the username may already exist."])
+
+    def save_users(self, users):
+        with transaction.atomic():
+            created = User.objects.bulk_create([user for _, user, _ in users])
+            preferences = UserPreference.objects.bulk_create([UserPreference(user=user) for user in created])
+            Through = UserPreference.categories.through
+            Through.objects.bulk_create([
+                Through(userpreference_id=preference.pk, eventcategory_id=category_id)
+                for preference, (_, _, category_ids) in zip(preferences, users)
+                for category_id in category_ids
+            ])
+        self.created += len(users)
@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+
+from django.utils import timezone
+
+DAILY = 'daily'
+WEEKLY = 'weekly'
+
+
+def expand_recurrence(start_time, freq, interval=1, by_weekday=None, until=None, count=None,
+                      exclude=(), limit=None):
+    # Occurrences keep the wall-clock time of start_time, so a weekly 18:00
+    # session stays at 18:00 across DST changes.
+    local_start = timezone.localtime(start_time)
+    first_day = local_start.date()
+    wall_time = local_start.time()
+    tz = local_start.tzinfo
+    exclude = set(exclude)
+
+    if freq == DAILY:
+        def candidate_days():
+            step = 0
+            while True:
+                yield first_day + timedelta(days=step)
+                step += interval
+    else:
+        weekdays = sorted(set(by_weekday or [first_day.weekday()]))
+        week_start = first_day - timedelta(days=first_day.weekday())
+
+        def candidate_days():
+            step = 0
+            while True:
+                for weekday in weekdays:
+                    day = week_start + timedelta(weeks=step, days=weekday)
+                    if day >= first_day:
+                        yield day
+                step += interval
+
+    # As with iCalendar EXDATE, excluded dates still count towards ``count``.
+    occurrences = []
+    generated = 0
+    for day in candidate_days():
+        occurrence = timezone.make_aware(datetime.combine(day, wall_time), tz)
+        if until is not None and occurrence > until:
+            break
+        if count is not None and generated >= count:
+            break
+        if limit is not None and generated >= limit:
+            raise ValueError(f"Recurrence expands to more than {limit} occurrences.")
+        generated += 1
+        if day not in exclude:
+            occurrences.append(occurrence)
+    return occurrences
+
+
+def find_overlaps(intervals):
+    # Sorted sweep over (start, end, ...) tuples; returns the pairs that
+    # overlap an earlier one.
+    overlaps = []
+    latest_end = None
+    latest = None
+    for interval in sorted(intervals):
+        start, end = interval[:2]
+        if latest_end is not None and start < latest_end:
+            overlaps.append((latest, interval))
+        if latest_end is None or end > latest_end:
+            latest_end = end
+            latest = interval
+    return overlaps
@@ -0,0 +1,151 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Reads of these tables may be served by a replica.
+REPLICA_MODELS = {
+    'scheduler.timeslot',
+    'scheduler.eventcategory',
+    'scheduler.userpreference',
+    'scheduler.userpreference_categories',
+    'scheduler.slotavailability',
+    'scheduler.waitlistentry',
+}
+
+# The request being handled, set by ReplicaRoutingMiddleware.
+_current_request = ContextVar('replica_request', default=None)
+_use_primary = ContextVar('replica_use_primary', default=False)
+
+
+def read_from_replica(view):
+    # Marks a function view whose safe-method reads may go to a replica.
+    # Class-based views set ``read_from_replica = True`` instead.
+    view.read_from_replica = True
+    return view
+
+
+@contextmanager
+def use_primary():
+    # Reads inside the block go to the primary, e.g. to fill a cache that
+    # must not be seeded with a lagging replica's data.
+    token = _use_primary.set(True)
+    try:
+        yield
+    finally:
+        _use_primary.reset(token)
+
+
+# The pin travels with the client as a signed cookie, so every worker sees it
+# without a shared cache.
+PIN_COOKIE = 'replica_pin'
+_PIN_SALT = 'scheduler.routers.pin'
+
+
+def pin_to_primary(response, user_id):
+    response.set_signed_cookie(
+        PIN_COOKIE, str(user_id), salt=_PIN_SALT,
+        max_age=settings.REPLICA_STICKY_SECONDS, httponly=True, samesite='Lax',
+    )
+
+
+def is_pinned_to_primary(request, user_id):
+    # The signature's timestamp bounds the pin even if the cookie is replayed.
+    pinned_id = request.get_signed_cookie(
+        PIN_COOKIE, default=None, salt=_PIN_SALT, max_age=settings.REPLICA_STICKY_SECONDS,
+    )
+    return pinned_id == str(user_id)
+
+
+def _replica_allowed(request):
+    if not getattr(request, 'read_from_replica', False) or request.method not in SAFE_METHODS:
+        return False
+    pinned = getattr(request, '_pinned_to_primary', None)
+    if pinned is None:
+        # Evaluated on the first routed read, once the view has authenticated.
+        user = getattr(request, 'user', None)
+        pinned = bool(user is not None and user.is_authenticated and is_pinned_to_primary(request, user.pk))
+        request._pinned_to_primary = pinned
+    return not pinned
+
+
+class ReplicaRouter:
+    """Sends reads of slots, categories and preferences to a replica.
+
+    Only safe-method requests to views marked ``read_from_replica`` are
+    routed, and not for users who wrote something in the last
+    REPLICA_STICKY_SECONDS, so they see their own bookings. Everything else,
+    including all writes and migrations, uses the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.label_lower not in REPLICA_MODELS or _use_primary.get():
+            return None
+        request = _current_request.get()
+        if request is None or not settings.DATABASE_REPLICAS or not _replica_allowed(request):
+            return None
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Replicas are copies of the primary (see the sync_replicas command).
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    # Exposes the request to ReplicaRouter and pins users to the primary
+    # after a successful write.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _current_request.set(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_request.reset(token)
+        self.pin_after_write(request, response)
+        return response
+
+    async def __acall__(self, request):
+        token = _current_request.set(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_request.reset(token)
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            await sync_to_async(self.pin_after_write)(request, response)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'cls', None)
+        request.read_from_replica = bool(
+            getattr(view_func, 'read_from_replica', False) or getattr(view_class, 'read_from_replica', False)
+        )
+
+    def pin_after_write(self, request, response):
+        if request.method in SAFE_METHODS or response.status_code >= 400:
+            return
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            pin_to_primary(response, user.pk)
@@ -1,4 +1,14 @@
+from django.conf import settings
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
+from .authentication import get_user_instance
+from .availability import update_availability
+from .booking import lock_user_bookings, overlapping_bookings
+from .cache import bump_week_versions, invalidate_preferred_categories
+from .events import FREE, publish_slot_events, slot_event
+from .recurrence import DAILY, WEEKLY, expand_recurrence, find_overlaps
 from .models import (
     EventCategory, 
     UserPreference,
@@ -6,6 +16,7 @@ from .models import (
     )
 from django.contrib.auth.models import User
 
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -35,6 +46,7 @@ class UserPreferenceSerializer(serializers.ModelSerializer):
         categories = validated_data.pop('categories', [])
         if categories:
             instance.categories.set(categories)
+            invalidate_preferred_categories(instance.user_id)
         instance.save()
         return instance
     
@@ -55,7 +67,8 @@ class TimeSlotBookingSerializer(serializers.ModelSerializer):
         fields = ['id', 'category', 'category_id', 'start_time', 'end_time', 'user']
 
     def update(self, instance, validated_data):
-        user = self.context['request'].user
+        # Token-authenticated users are claim-backed; assigning needs the row.
+        user = get_user_instance(self.context['request'].user)
 
         if instance.user is not None and instance.user != user:
             raise serializers.ValidationError("Slot is already booked by another user.")
@@ -87,8 +100,149 @@ class TimeSlotCreateSerializer(serializers.ModelSerializer):
         if start_time and end_time and start_time >= end_time:
             raise serializers.ValidationError("Start time must be before end time")
         return data
+
+    def check_user_overlap(self, validated_data):
+        user = validated_data.get('user', getattr(self.instance, 'user', None))
+        if user is None:
+            return
+        lock_user_bookings(user)
+        clashes = overlapping_bookings(
+            user,
+            validated_data.get('start_time', getattr(self.instance, 'start_time', None)),
+            validated_data.get('end_time', getattr(self.instance, 'end_time', None)),
+        )
+        if self.instance is not None:
+            clashes = clashes.exclude(pk=self.instance.pk)
+        if clashes.exists():
+            raise serializers.ValidationError({'user_id': "User already has a booking overlapping this slot."})
+
+    def create(self, validated_data):
+        with transaction.atomic():
+            self.check_user_overlap(validated_data)
+            return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            self.check_user_overlap(validated_data)
+            return super().update(instance, validated_data)
     
 
+class TimeSlotRecurrenceSerializer(serializers.Serializer):
+    category_id = serializers.PrimaryKeyRelatedField(queryset=EventCategory.objects.all(), source='category')
+    start_time = serializers.DateTimeField()
+    duration = serializers.DurationField()
+    freq = serializers.ChoiceField(choices=[DAILY, WEEKLY])
+    interval = serializers.IntegerField(min_value=1, default=1)
+    by_weekday = serializers.ListField(
+        child=serializers.IntegerField(min_value=0, max_value=6),
+        required=False
+    )
+    until = serializers.DateTimeField(required=False)
+    count = serializers.IntegerField(min_value=1, required=False)
+    exclude = serializers.ListField(child=serializers.DateField(), required=False)
+    dry_run = serializers.BooleanField(default=False)
+
+    def validate(self, data):
+        if data['duration'].total_seconds() <= 0:
+            raise serializers.ValidationError("Duration must be positive.")
+        if 'until' not in data and 'count' not in data:
+            raise serializers.ValidationError("Either 'until' or 'count' is required.")
+        if data.get('by_weekday') and data['freq'] != WEEKLY:
+            raise serializers.ValidationError("'by_weekday' is only allowed for weekly recurrence.")
+
+        try:
+            starts = expand_recurrence(
+                data['start_time'],
+                data['freq'],
+                interval=data['interval'],
+                by_weekday=data.get('by_weekday'),
+                until=data.get('until'),
+                count=data.get('count'),
+                exclude=data.get('exclude', ()),
+                limit=settings.SLOT_RECURRENCE_LIMIT,
+            )
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
+        if not starts:
+            raise serializers.ValidationError("Recurrence produces no occurrences.")
+
+        occurrences = [(start, start + data['duration']) for start in starts]
+        existing = TimeSlot.objects.filter(
+            category=data['category'],
+            start_time__lt=occurrences[-1][1],
+            end_time__gt=occurrences[0][0],
+        ).values_list('start_time', 'end_time')
+        # Tagged so clashes among the existing slots themselves don't count;
+        # any new occurrence that overlaps something shows up in some pair.
+        overlaps = [
+            (first, second)
+            for first, second in find_overlaps(
+                [(start, end, True) for start, end in occurrences] + [(start, end, False) for start, end in existing]
+            )
+            if first[2] or second[2]
+        ]
+        if overlaps:
+            raise serializers.ValidationError({
+                'overlaps': [
+                    [first[0].isoformat(), second[0].isoformat()] for first, second in overlaps
+                ]
+            })
+
+        data['occurrences'] = occurrences
+        return data
+
+    def create(self, validated_data):
+        category = validated_data['category']
+        slots = [
+            TimeSlot(category=category, start_time=start, end_time=end)
+            for start, end in validated_data['occurrences']
+        ]
+        with transaction.atomic():
+            TimeSlot.objects.bulk_create(slots, batch_size=settings.SLOT_BULK_BATCH_SIZE)
+            update_availability((slot.category_id, slot.start_time, 1, 0) for slot in slots)
+            bump_week_versions(*(slot.start_time for slot in slots))
+            publish_slot_events(*(slot_event(slot.pk, slot.start_time, slot.category_id, FREE) for slot in slots))
+        return slots
+
+
+class TimeSlotSearchSerializer(serializers.Serializer):
+    # Query parameters of the next-free-slot search; lists repeat the
+    # parameter (?categories=1&categories=2).
+    categories = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False)
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+    from_time = serializers.TimeField(required=False)
+    to_time = serializers.TimeField(required=False)
+    weekdays = serializers.ListField(
+        child=serializers.IntegerField(min_value=0, max_value=6),
+        required=False
+    )
+    min_duration = serializers.DurationField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=settings.SLOT_SEARCH_MAX_LIMIT, default=5)
+
+    def validate(self, data):
+        data.setdefault('start', timezone.now())
+        data.setdefault('end', data['start'] + timedelta(days=settings.SLOT_SEARCH_DEFAULT_DAYS))
+        if data['end'] <= data['start']:
+            raise serializers.ValidationError("'end' must be after 'start'.")
+        if data['end'] - data['start'] > timedelta(days=settings.SLOT_SEARCH_MAX_DAYS):
+            raise serializers.ValidationError(f"At most {settings.SLOT_SEARCH_MAX_DAYS} days per search.")
+        if data.get('from_time') and data.get('to_time') and data['from_time'] >= data['to_time']:
+            raise serializers.ValidationError("'to_time' must be after 'from_time'.")
+        return data
+
+
+class TimeSlotBatchSerializer(serializers.Serializer):
+    slot_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.SLOT_BATCH_LIMIT
+    )
+
+    def validate_slot_ids(self, value):
+        return list(dict.fromkeys(value))
+
+
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
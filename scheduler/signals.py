@@ -0,0 +1,99 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .authentication import USER_CLAIMS, clear_revoked_tokens, invalidate_cached_user, revoke_user_tokens
+from .availability import update_availability
+from .cache import bump_week_versions
+from .events import BOOKED, DELETED, FREE, publish_slot_events, slot_event
+from .models import ArchivedTimeSlot, TimeSlot
+
+
+@receiver(pre_save, sender=TimeSlot)
+def remember_previous_state(sender, instance, raw, **kwargs):
+    instance._previous_state = None
+    if instance.pk is not None:
+        instance._previous_state = (
+            sender.objects.filter(pk=instance.pk).values_list('start_time', 'category_id', 'user_id').first()
+        )
+    instance._previous_start_time = instance._previous_state[0] if instance._previous_state else None
+
+
+@receiver(post_save, sender=TimeSlot)
+def update_availability_on_save(sender, instance, **kwargs):
+    # Fixture loads (raw) count too, or the summary would miss their slots.
+    changes = [(instance.category_id, instance.start_time, 1, 1 if instance.user_id else 0)]
+    if instance._previous_state is not None:
+        start_time, category_id, user_id = instance._previous_state
+        changes.append((category_id, start_time, -1, -1 if user_id else 0))
+    update_availability(changes)
+
+
+@receiver(post_save, sender=TimeSlot)
+def invalidate_week_on_save(sender, instance, raw, **kwargs):
+    if raw:
+        return
+    previous_start_time = getattr(instance, '_previous_start_time', None)
+    bump_week_versions(instance.start_time, previous_start_time)
+    publish_slot_events(slot_event(
+        instance.pk, instance.start_time, instance.category_id,
+        BOOKED if instance.user_id else FREE, previous_start_time,
+    ))
+
+
+@receiver(post_delete, sender=TimeSlot)
+def invalidate_week_on_delete(sender, instance, **kwargs):
+    bump_week_versions(instance.start_time)
+    publish_slot_events(slot_event(instance.pk, instance.start_time, instance.category_id, DELETED))
+
+
+@receiver(post_delete, sender=TimeSlot)
+def update_availability_on_delete(sender, instance, **kwargs):
+    update_availability([(instance.category_id, instance.start_time, -1, -1 if instance.user_id else 0)])
+
+
+@receiver(pre_save, sender=User)
+def remember_previous_claims(sender, instance, raw, update_fields, **kwargs):
+    instance._previous_claims = None
+    # update_last_login saves last_login alone on every login; skip the read.
+    if update_fields is not None and not set(update_fields) & set(USER_CLAIMS):
+        return
+    if instance.pk is not None and not raw:
+        instance._previous_claims = sender.objects.filter(pk=instance.pk).values_list(*USER_CLAIMS).first()
+
+
+@receiver(post_save, sender=User)
+def revoke_inactive_user(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    if created:
+        clear_revoked_tokens(instance.pk)
+    # Claim-backed tokens never hit the database, so deactivation, and any
+    # change to the claims they carry (e.g. losing is_staff), has to revoke
+    # them explicitly.
+    previous_claims = getattr(instance, '_previous_claims', None)
+    claims_changed = previous_claims is not None and previous_claims != tuple(
+        getattr(instance, claim) for claim in USER_CLAIMS
+    )
+    if instance.is_active and not claims_changed:
+        invalidate_cached_user(instance.pk)
+    else:
+        revoke_user_tokens(instance.pk)
+
+
+@receiver(pre_delete, sender=User)
+def release_deleted_user_slots(sender, instance, **kwargs):
+    # SET_NULL frees the user's bookings, archived ones included, with one
+    # UPDATE and no slot signals.
+    update_availability(
+        (category_id, start_time, 0, -1)
+        for model in (TimeSlot, ArchivedTimeSlot)
+        for category_id, start_time in model.objects.filter(user_id=instance.pk).values_list(
+            'category_id', 'start_time'
+        )
+    )
+
+
+@receiver(post_delete, sender=User)
+def revoke_deleted_user(sender, instance, **kwargs):
+    revoke_user_tokens(instance.pk)
@@ -1,13 +1,49 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from unittest import mock, skipIf
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.signals import user_login_failed
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 from django.contrib.auth.models import User
-from scheduler.models import TimeSlot, EventCategory, UserPreference
-from datetime import timedelta
+from scheduler.models import (
+    ArchivedTimeSlot, BulkLoadProgress, EventCategory, SlotAvailability, TimeSlot, TokenRevocation, UserPreference,
+    WaitlistEntry,
+)
+from scheduler.booking import find_free_slots, overlapping_bookings
+from scheduler.authentication import revoke_user_tokens
+from scheduler.cache import get_slot_weeks, get_week_start
+from scheduler.events import SQLiteBroadcaster, get_broadcaster
+from scheduler import hashing
+from scheduler.hashing import get_hashing_pool
+from scheduler.metrics import reset_metrics, write_snapshot
+from scheduler.provisioning import UserProvisioner
+from scheduler.routers import PIN_COOKIE, ReplicaRouter
+from scheduler.serializers import CustomTokenObtainPairSerializer
+from datetime import datetime, timedelta
 from django.utils import timezone
 from rest_framework_simplejwt.tokens import RefreshToken
 
+
 class TimeSlotCRUDTests(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -108,6 +144,7 @@ class TimeSlotCRUDTests(TestCase):
 
 class TimeSlotBookingTests(TestCase):
     def setUp(self):
+        cache.clear()
         self.client = APIClient()
 
         self.user = User.objects.create_user(username='user', password='user123')
@@ -145,7 +182,7 @@ class TimeSlotBookingTests(TestCase):
 
         # Another user tries to book
         response = self.client.post(self.book_url, **self.get_auth_headers(self.user))
-        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
         self.assertIn('Slot already taken', response.data.get('detail', ''))
 
     def test_user_cannot_book_twice(self):
@@ -155,7 +192,7 @@ class TimeSlotBookingTests(TestCase):
 
         # User tries to book again (should fail)
         response = self.client.post(self.book_url, **self.get_auth_headers(self.user))
-        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
 
     def test_user_can_unsubscribe(self):
         # User books the slot first
@@ -185,6 +222,26 @@ class TimeSlotBookingTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
         self.assertIn('not subscribed', response.data.get('detail', ''))
 
+    def test_book_missing_slot_returns_404(self):
+        url = reverse('timeslot_book', kwargs={'pk': self.slot.id + 1000})
+        response = self.client.post(url, **self.get_auth_headers(self.user))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_book_is_single_update_query(self):
+        # A token as issued by /api/token/, whose claims stand in for the user
+        # row; one request first warms the cached revocation check.
+        token = CustomTokenObtainPairSerializer.get_token(self.user).access_token
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+        self.client.get(reverse('timeslot-list'), {'page_size': 1}, **headers)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.book_url, **headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # The conditional UPDATE that books, the read of the slot's day for the
+        # week cache and live event, and the availability counter UPDATE. The
+        # savepoints are the atomic block (BEGIN/COMMIT outside tests).
+        statements = [query['sql'].split()[0] for query in queries.captured_queries]
+        self.assertEqual(statements, ['SAVEPOINT', 'UPDATE', 'SELECT', 'UPDATE', 'RELEASE'])
+
     def test_unauthenticated_user_cannot_book_or_unsubscribe(self):
         # Without auth header
         response = self.client.post(self.book_url)
@@ -194,14 +251,30 @@ class TimeSlotBookingTests(TestCase):
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
-class UserPreferenceTests(TestCase):
+class BookingOverlapTests(TestCase):
     def setUp(self):
         self.client = APIClient()
+        self.admin = User.objects.create_user(username='admin', password='admin123', is_staff=True)
         self.user = User.objects.create_user(username='user', password='user123')
-        self.category1 = EventCategory.objects.create(name="Category 1", description="Desc 1")
-        self.category2 = EventCategory.objects.create(name="Category 2", description="Desc 2")
-        self.pref_url = reverse('user_preference_detail')
-    
+        self.category = EventCategory.objects.create(name="Category 1", description="Description 1")
+        self.start = timezone.now() + timedelta(days=1)
+        self.booked = TimeSlot.objects.create(
+            category=self.category,
+            start_time=self.start,
+            end_time=self.start + timedelta(hours=1),
+            user=self.user,
+        )
+        self.overlapping = TimeSlot.objects.create(
+            category=self.category,
+            start_time=self.start + timedelta(minutes=30),
+            end_time=self.start + timedelta(hours=2),
+        )
+        self.adjacent = TimeSlot.objects.create(
+            category=self.category,
+            start_time=self.start + timedelta(hours=1),
+            end_time=self.start + timedelta(hours=2),
+        )
+
     def get_auth_headers(self, user):
         refresh = RefreshToken.for_user(user)
         return {
@@ -209,74 +282,2406 @@ class UserPreferenceTests(TestCase):
             'Content-Type': 'application/json'
         }
 
-    def test_get_user_preference(self):
-        pref = UserPreference.objects.create(user=self.user)
-        pref.categories.add(self.category1)
-        pref.save()
+    def test_user_cannot_book_overlapping_slot(self):
+        response = self.client.post(
+            reverse('timeslot_book', kwargs={'pk': self.overlapping.id}), **self.get_auth_headers(self.user)
+        )
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertIn('overlaps', response.data['detail'])
+        self.overlapping.refresh_from_db()
+        self.assertIsNone(self.overlapping.user)
 
-        response = self.client.get(self.pref_url, **self.get_auth_headers(self.user))
+    def test_user_can_book_adjacent_slot(self):
+        response = self.client.post(
+            reverse('timeslot_book', kwargs={'pk': self.adjacent.id}), **self.get_auth_headers(self.user)
+        )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
-        categories = response.data['categories']
-        category_ids = [cat['id'] for cat in categories]
-        self.assertIn(self.category1.id, category_ids)
+    def test_admin_cannot_assign_overlapping_slot(self):
+        response = self.client.patch(
+            reverse('timeslot-detail', kwargs={'pk': self.overlapping.id}),
+            data={'user_id': self.user.id},
+            format='json',
+            **self.get_auth_headers(self.admin)
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('user_id', response.data)
 
+    def test_admin_cannot_move_booked_slot_onto_another_booking(self):
+        self.adjacent.user = self.user
+        self.adjacent.save()
+        response = self.client.patch(
+            reverse('timeslot-detail', kwargs={'pk': self.adjacent.id}),
+            data={'start_time': (self.start + timedelta(minutes=45)).isoformat()},
+            format='json',
+            **self.get_auth_headers(self.admin)
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
-class RegisterViewTests(TestCase):
+    def test_admin_can_reassign_slot_to_same_user(self):
+        response = self.client.patch(
+            reverse('timeslot-detail', kwargs={'pk': self.booked.id}),
+            data={'user_id': self.user.id, 'end_time': (self.start + timedelta(minutes=50)).isoformat()},
+            format='json',
+            **self.get_auth_headers(self.admin)
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_overlap_check_uses_index(self):
+        plan = overlapping_bookings(self.user, self.start, self.start + timedelta(hours=1)).explain()
+        self.assertNotIn(f'SCAN {TimeSlot._meta.db_table}\n', plan + '\n')
+        self.assertNotIn('Seq Scan', plan)
+
+
+class TimeSlotBatchBookingTests(TestCase):
     def setUp(self):
         self.client = APIClient()
-        self.register_url = reverse('register')
+        self.user = User.objects.create_user(username='user', password='user123')
+        self.other_user = User.objects.create_user(username='otheruser', password='other123')
+        self.category = EventCategory.objects.create(name="Category 1", description="Description 1")
+        now = timezone.now()
+        self.slots = TimeSlot.objects.bulk_create([
+            TimeSlot(
+                category=self.category,
+                start_time=now + timedelta(days=i + 1),
+                end_time=now + timedelta(days=i + 1, hours=1),
+            )
+            for i in range(60)
+        ])
+        self.ids = [slot.id for slot in self.slots]
+        self.book_url = reverse('timeslot_batch_book')
+        self.unsubscribe_url = reverse('timeslot_batch_unsubscribe')
+        self.headers = self.get_auth_headers(self.user)
 
-    def test_register_success(self):
-        payload = {
-            "username": "newuser",
-            "password": "StrongPass123!"
+    def get_auth_headers(self, user):
+        refresh = RefreshToken.for_user(user)
+        return {
+            'HTTP_AUTHORIZATION': f'Bearer {str(refresh.access_token)}',
+            'Content-Type': 'application/json'
         }
-        response = self.client.post(self.register_url, data=payload, format='json')
-        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
-        self.assertEqual(response.data['detail'], "User successfully created.")
-        self.assertTrue(User.objects.filter(username="newuser").exists())
 
-    def test_register_missing_fields(self):
-        response = self.client.post(self.register_url, data={}, format='json')
-        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    def post(self, url, slot_ids):
+        return self.client.post(url, data={'slot_ids': slot_ids}, format='json', **self.headers)
 
-    def test_register_existing_username(self):
-        User.objects.create_user(username="existing", password="pass123")
-        response = self.client.post(self.register_url, data={"username": "existing", "password": "newpass"}, format='json')
+    def test_user_can_book_all_slots(self):
+        response = self.post(self.book_url, self.ids[:5])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['booked'], self.ids[:5])
+        self.assertEqual(TimeSlot.objects.filter(user=self.user).count(), 5)
+
+    def test_conflict_books_nothing(self):
+        TimeSlot.objects.filter(pk=self.ids[2]).update(user=self.other_user)
+
+        response = self.post(self.book_url, self.ids[:5])
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['conflicts'], [self.ids[2]])
+        self.assertEqual(response.data['not_found'], [])
+        self.assertFalse(TimeSlot.objects.filter(user=self.user).exists())
+
+    def test_missing_slot_books_nothing(self):
+        missing = max(self.ids) + 1
+        response = self.post(self.book_url, [self.ids[0], missing])
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['not_found'], [missing])
+        self.assertFalse(TimeSlot.objects.filter(user=self.user).exists())
+
+    def test_query_count_does_not_depend_on_batch_size(self):
+        self.post(self.unsubscribe_url, self.ids[:1])  # warms the JWT user cache
+        with CaptureQueriesContext(connection) as small:
+            self.post(self.book_url, self.ids[:2])
+        with CaptureQueriesContext(connection) as large:
+            self.post(self.book_url, self.ids[10:60])
+        self.assertEqual(len(small), len(large))
+
+        TimeSlot.objects.filter(pk=self.ids[5]).update(user=self.other_user)
+        with CaptureQueriesContext(connection) as small:
+            self.assertEqual(self.post(self.book_url, self.ids[4:6]).status_code, status.HTTP_409_CONFLICT)
+        with CaptureQueriesContext(connection) as large:
+            self.assertEqual(self.post(self.book_url, self.ids[2:10]).status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(len(small), len(large))
+
+    def test_batch_overlapping_existing_booking_books_nothing(self):
+        clash = TimeSlot.objects.create(
+            category=self.category,
+            start_time=self.slots[1].start_time - timedelta(minutes=30),
+            end_time=self.slots[1].start_time + timedelta(minutes=30),
+            user=self.user,
+        )
+        response = self.post(self.book_url, self.ids[:3])
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['overlaps'], [self.ids[1]])
+        self.assertEqual(list(TimeSlot.objects.filter(user=self.user)), [clash])
+
+    def test_batch_with_overlapping_slots_books_nothing(self):
+        twin = TimeSlot.objects.create(
+            category=self.category,
+            start_time=self.slots[0].start_time,
+            end_time=self.slots[0].end_time,
+        )
+        response = self.post(self.book_url, [self.ids[0], twin.id])
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['overlaps'], [self.ids[0], twin.id])
+        self.assertFalse(TimeSlot.objects.filter(user=self.user).exists())
+
+    def test_batch_limit(self):
+        response = self.post(self.book_url, list(range(1, settings.SLOT_BATCH_LIMIT + 2)))
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
-        self.assertIn("Username already exists", response.data['detail'])
 
-    def test_register_weak_password(self):
-        payload = {
-            "username": "user2",
-            "password": "123" 
+    def test_user_can_unsubscribe_all_slots(self):
+        TimeSlot.objects.filter(pk__in=self.ids[:3]).update(user=self.user)
+        response = self.post(self.unsubscribe_url, self.ids[:3])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(TimeSlot.objects.filter(user=self.user).exists())
+
+    def test_partial_unsubscribe_releases_nothing(self):
+        TimeSlot.objects.filter(pk__in=self.ids[:2]).update(user=self.user)
+        TimeSlot.objects.filter(pk=self.ids[2]).update(user=self.other_user)
+
+        response = self.post(self.unsubscribe_url, self.ids[:4])
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(response.data['not_subscribed'], self.ids[2:4])
+        self.assertEqual(TimeSlot.objects.filter(user=self.user).count(), 2)
+
+    def test_unauthenticated_user_cannot_batch_book(self):
+        response = self.client.post(self.book_url, data={'slot_ids': self.ids[:2]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class TimeSlotBookingConcurrencyTests(TransactionTestCase):
+    THREADS = 16
+
+    def setUp(self):
+        self.category = EventCategory.objects.create(name="Category 1", description="Description 1")
+        self.slot = TimeSlot.objects.create(
+            category=self.category,
+            start_time=timezone.now() + timedelta(days=1),
+            end_time=timezone.now() + timedelta(days=1, hours=1),
+        )
+        self.users = [
+            User.objects.create_user(username=f'user{i}', password='user123')
+            for i in range(self.THREADS)
+        ]
+        self.book_url = reverse('timeslot_book', kwargs={'pk': self.slot.id})
+
+    def book(self, user, barrier, results):
+        # The test client re-raises exceptions from requests on other threads,
+        # so take each thread's own response. SQLite's shared in-memory test
+        # database reports lock contention immediately instead of waiting;
+        # those requests fail as a whole (500) and are retried.
+        client = APIClient(raise_request_exception=False)
+        token = str(RefreshToken.for_user(user).access_token)
+        try:
+            barrier.wait()
+            for _ in range(50):
+                response = client.post(self.book_url, HTTP_AUTHORIZATION=f'Bearer {token}')
+                if response.status_code != status.HTTP_500_INTERNAL_SERVER_ERROR:
+                    results[user.id] = response.status_code
+                    break
+                time.sleep(0.01)
+        finally:
+            connection.close()
+
+    def test_exactly_one_winner(self):
+        barrier = threading.Barrier(self.THREADS)
+        results = {}
+        threads = [
+            threading.Thread(target=self.book, args=(user, barrier, results))
+            for user in self.users
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(results), self.THREADS)
+        winners = [user_id for user_id, code in results.items() if code == status.HTTP_200_OK]
+        self.slot.refresh_from_db()
+        self.assertEqual(winners, [self.slot.user_id])
+        losers = [code for user_id, code in results.items() if user_id != self.slot.user_id]
+        self.assertEqual(losers, [status.HTTP_409_CONFLICT] * (self.THREADS - 1))
+
+
+class WaitlistTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.holder = User.objects.create_user(username='holder', password='holder123')
+        self.first = User.objects.create_user(username='first', password='first123')
+        self.second = User.objects.create_user(username='second', password='second123')
+        self.category = EventCategory.objects.create(name="Category 1", description="Description 1")
+        self.slot = TimeSlot.objects.create(
+            category=self.category,
+            start_time=timezone.now() + timedelta(days=1),
+            end_time=timezone.now() + timedelta(days=1, hours=1),
+            user=self.holder,
+        )
+        self.url = reverse('timeslot_waitlist', kwargs={'pk': self.slot.id})
+        self.unsubscribe_url = reverse('timeslot_unsubscribe', kwargs={'pk': self.slot.id})
+
+    def get_auth_headers(self, user):
+        refresh = RefreshToken.for_user(user)
+        return {
+            'HTTP_AUTHORIZATION': f'Bearer {str(refresh.access_token)}',
+            'Content-Type': 'application/json'
         }
-        response = self.client.post(self.register_url, data=payload, format='json')
-        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
-        self.assertTrue(isinstance(response.data['detail'], list))
 
+    def test_join_position_and_leave(self):
+        response = self.client.post(self.url, **self.get_auth_headers(self.first))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['position'], 1)
+        response = self.client.post(self.url, **self.get_auth_headers(self.second))
+        self.assertEqual(response.data['position'], 2)
+        response = self.client.post(self.url, **self.get_auth_headers(self.second))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(WaitlistEntry.objects.count(), 2)
+
+        response = self.client.delete(self.url, **self.get_auth_headers(self.first))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        response = self.client.get(self.url, **self.get_auth_headers(self.second))
+        self.assertEqual(response.data, {'position': 1})
 
-class JWTLoginTests(TestCase):
+        response = self.client.get(self.url, **self.get_auth_headers(self.first))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.delete(self.url, **self.get_auth_headers(self.first))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cannot_join_free_own_or_missing_slot(self):
+        response = self.client.post(self.url, **self.get_auth_headers(self.holder))
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        missing = reverse('timeslot_waitlist', kwargs={'pk': self.slot.id + 1000})
+        response = self.client.post(missing, **self.get_auth_headers(self.first))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        TimeSlot.objects.filter(pk=self.slot.pk).update(user=None)
+        response = self.client.post(self.url, **self.get_auth_headers(self.first))
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(WaitlistEntry.objects.exists())
+
+    def test_unsubscribe_promotes_head_of_queue(self):
+        WaitlistEntry.objects.create(slot=self.slot, user=self.first)
+        WaitlistEntry.objects.create(slot=self.slot, user=self.second)
+
+        with override_settings(SLOT_EVENTS={'BACKEND': 'scheduler.events.InProcessBroadcaster'}):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(self.unsubscribe_url, **self.get_auth_headers(self.holder))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            # Listeners see the slot change hands, never a free slot.
+            self.assertEqual([event['state'] for event in get_broadcaster().backlog], ['booked'])
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.user, self.first)
+        self.assertEqual(list(WaitlistEntry.objects.values_list('user_id', flat=True)), [self.second.id])
+        self.assertEqual(SlotAvailability.objects.get().booked, 1)
+
+    def test_promotion_skips_users_with_clashing_bookings(self):
+        TimeSlot.objects.create(
+            category=self.category,
+            start_time=self.slot.start_time,
+            end_time=self.slot.end_time,
+            user=self.first,
+        )
+        WaitlistEntry.objects.create(slot=self.slot, user=self.first)
+        WaitlistEntry.objects.create(slot=self.slot, user=self.second)
+
+        self.client.post(self.unsubscribe_url, **self.get_auth_headers(self.holder))
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.user, self.second)
+        self.assertEqual(list(WaitlistEntry.objects.values_list('user_id', flat=True)), [self.first.id])
+
+    def test_batch_unsubscribe_promotes(self):
+        other = TimeSlot.objects.create(
+            category=self.category,
+            start_time=self.slot.start_time + timedelta(days=1),
+            end_time=self.slot.end_time + timedelta(days=1),
+            user=self.holder,
+        )
+        WaitlistEntry.objects.create(slot=self.slot, user=self.first)
+        WaitlistEntry.objects.create(slot=other, user=self.first)
+
+        response = self.client.post(
+            reverse('timeslot_batch_unsubscribe'), {'slot_ids': [self.slot.id, other.id]}, format='json',
+            **self.get_auth_headers(self.holder),
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(TimeSlot.objects.filter(user=self.first).count(), 2)
+        self.assertFalse(WaitlistEntry.objects.exists())
+
+    def test_unsubscribe_without_waitlist_frees_slot(self):
+        self.client.post(self.unsubscribe_url, **self.get_auth_headers(self.holder))
+        self.slot.refresh_from_db()
+        self.assertIsNone(self.slot.user)
+        self.assertEqual(SlotAvailability.objects.get().booked, 0)
+
+
+class WaitlistConcurrencyTests(TransactionTestCase):
+    THREADS = 8
+
+    def setUp(self):
+        self.category = EventCategory.objects.create(name="Category 1", description="Description 1")
+        self.holder = User.objects.create_user(username='holder', password='holder123')
+        self.slot = TimeSlot.objects.create(
+            category=self.category,
+            start_time=timezone.now() + timedelta(days=1),
+            end_time=timezone.now() + timedelta(days=1, hours=1),
+            user=self.holder,
+        )
+        self.waiting = [
+            User.objects.create_user(username=f'user{i}', password='user123')
+            for i in range(3)
+        ]
+        for user in self.waiting:
+            WaitlistEntry.objects.create(slot=self.slot, user=user)
+        self.unsubscribe_url = reverse('timeslot_unsubscribe', kwargs={'pk': self.slot.id})
+
+    def unsubscribe(self, user, barrier, results):
+        # The test client re-raises exceptions from requests on other threads,
+        # so take each thread's own response and retry the ones SQLite's
+        # shared in-memory test database failed with "table is locked".
+        client = APIClient(raise_request_exception=False)
+        token = str(RefreshToken.for_user(user).access_token)
+        try:
+            barrier.wait()
+            for _ in range(50):
+                response = client.post(self.unsubscribe_url, HTTP_AUTHORIZATION=f'Bearer {token}')
+                if response.status_code != status.HTTP_500_INTERNAL_SERVER_ERROR:
+                    results.append((user, response.status_code))
+                    break
+                time.sleep(0.01)
+        finally:
+            connection.close()
+
+    def test_promotion_is_exactly_once(self):
+        # The holder unsubscribes from several threads while the head of the
+        # queue, who may be promoted at any moment, tries to unsubscribe too.
+        head = self.waiting[0]
+        users = [self.holder, head] * (self.THREADS // 2)
+        barrier = threading.Barrier(self.THREADS)
+        results = []
+        threads = [threading.Thread(target=self.unsubscribe, args=(user, barrier, results)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(results), self.THREADS)
+        holder_codes = sorted(code for user, code in results if user == self.holder)
+        head_codes = sorted(code for user, code in results if user == head)
+        self.assertEqual(holder_codes, [status.HTTP_200_OK] + [status.HTTP_403_FORBIDDEN] * (self.THREADS // 2 - 1))
+        self.slot.refresh_from_db()
+        if status.HTTP_200_OK in head_codes:
+            # The head was promoted and then let go, which promoted the next.
+            self.assertEqual(head_codes, [status.HTTP_200_OK] + [status.HTTP_403_FORBIDDEN] * (self.THREADS // 2 - 1))
+            self.assertEqual(self.slot.user, self.waiting[1])
+            remaining = self.waiting[2:]
+        else:
+            self.assertEqual(head_codes, [status.HTTP_403_FORBIDDEN] * (self.THREADS // 2))
+            self.assertEqual(self.slot.user, head)
+            remaining = self.waiting[1:]
+        self.assertEqual(
+            list(WaitlistEntry.objects.order_by('id').values_list('user_id', flat=True)),
+            [user.id for user in remaining],
+        )
+        self.assertEqual(SlotAvailability.objects.get().booked, 1)
+
+
+class QueryCountTests(TestCase):
     def setUp(self):
+        cache.clear()
         self.client = APIClient()
-        self.login_url = reverse('token_obtain_pair')  # or your custom URL name
-        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.admin = User.objects.create_user(username='admin', password='admin123', is_staff=True)
+        self.categories = [
+            EventCategory.objects.create(name=f"Category {i}", description=f"Description {i}")
+            for i in range(3)
+        ]
+        self.users = User.objects.bulk_create([User(username=f'user{i}') for i in range(10)])
+        now = timezone.now()
+        TimeSlot.objects.bulk_create([
+            TimeSlot(
+                category=self.categories[i % 3],
+                start_time=now + timedelta(hours=i),
+                end_time=now + timedelta(hours=i, minutes=30),
+                user=self.users[i % 10],
+            )
+            for i in range(30)
+        ])
+        self.headers = self.get_auth_headers(self.admin)
 
-    def test_login_success(self):
-        payload = {
-            "username": "testuser",
-            "password": "testpass123"
+    def get_auth_headers(self, user):
+        refresh = RefreshToken.for_user(user)
+        return {
+            'HTTP_AUTHORIZATION': f'Bearer {str(refresh.access_token)}',
+            'Content-Type': 'application/json'
         }
-        response = self.client.post(self.login_url, data=payload, format='json')
+
+    def test_slot_list_query_budget(self):
+        # Cold cache: the token revocation check and the JWT user lookup (both
+        # cached for later requests) + the slot list with its joined relations.
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('timeslot-list'), **self.headers)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertIn('access', response.data)
-        self.assertIn('refresh', response.data)
+        self.assertEqual(len(response.data['results']), 30)
 
-    def test_login_wrong_credentials(self):
-        payload = {
-            "username": "testuser",
-            "password": "wrongpass"
+    def test_slot_week_list_query_budget(self):
+        cache.clear()
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('timeslot-list'), {'week': 0}, **self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_slot_retrieve_query_budget(self):
+        slot = TimeSlot.objects.first()
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('timeslot-detail', kwargs={'pk': slot.id}), **self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['category']['id'], slot.category_id)
+
+    def test_user_list_query_budget(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('user-list'), **self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class PaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.admin = User.objects.create_user(username='admin', password='admin123', is_staff=True)
+        self.category = EventCategory.objects.create(name="Category 1", description="Description 1")
+        User.objects.bulk_create([User(username=f'user{i}') for i in range(14)])
+        now = timezone.now()
+        # Pairs of slots share a start_time so the id tiebreaker is exercised.
+        TimeSlot.objects.bulk_create([
+            TimeSlot(
+                category=self.category,
+                start_time=now + timedelta(days=30, hours=i // 2),
+                end_time=now + timedelta(days=30, hours=i // 2, minutes=30),
+            )
+            for i in range(25)
+        ])
+        self.headers = self.get_auth_headers(self.admin)
+
+    def get_auth_headers(self, user):
+        refresh = RefreshToken.for_user(user)
+        return {
+            'HTTP_AUTHORIZATION': f'Bearer {str(refresh.access_token)}',
+            'Content-Type': 'application/json'
         }
-        response = self.client.post(self.login_url, data=payload, format='json')
-        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def collect_pages(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url, **self.headers)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data['results']), 10)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_slots_are_paginated_by_start_time_and_id(self):
+        ids = self.collect_pages(reverse('timeslot-list') + '?page_size=10')
+        expected = list(
+            TimeSlot.objects.order_by('start_time', 'id').values_list('id', flat=True)
+        )
+        self.assertEqual(ids, expected)
+
+    def test_users_are_paginated_by_id(self):
+        ids = self.collect_pages(reverse('user-list') + '?page_size=10')
+        self.assertEqual(ids, list(User.objects.order_by('id').values_list('id', flat=True)))
+
+    def test_plain_user_list_is_not_paginated(self):
+        response = self.client.get(reverse('user-list'), **self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([user['id'] for user in response.data], list(User.objects.order_by('id').values_list('id', flat=True)))
+
+    def test_week_listing_is_not_paginated(self):
+        TimeSlot.objects.create(
+            category=self.category,
+            start_time=timezone.now(),
+            end_time=timezone.now() + timedelta(hours=1),
+        )
+        response = self.client.get(reverse('timeslot-list'), {'week': 0}, **self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsInstance(response.data, list)
+
+
+class WeekCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.admin = User.objects.create_user(username='admin', password='admin123', is_staff=True)
+        self.user = User.objects.create_user(username='user', password='user123')
+        self.category = EventCategory.objects.create(name="Category 1", description="Description 1")
+        self.week_start = get_week_start()
+        start = self.at_midnight(self.week_start) + timedelta(hours=12)
+        self.slot = TimeSlot.objects.create(
+            category=self.category,
+            start_time=start,
+            end_time=start + timedelta(hours=1),
+        )
+        self.url = reverse('timeslot-list')
+        self.headers = self.get_auth_headers(self.user)
+
+    def get_auth_headers(self, user):
+        refresh = RefreshToken.for_user(user)
+        return {
+            'HTTP_AUTHORIZATION': f'Bearer {str(refresh.access_token)}',
+            'Content-Type': 'application/json'
+        }
+
+    def at_midnight(self, day):
+        return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+    def get_week(self, week=0, **extra):
+        return self.client.get(self.url, {'week': week}, **self.headers, **extra)
+
+    def test_repeated_week_request_is_served_from_cache(self):
+        first = self.get_week()
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertIn('ETag', first)
+
+        # The JWT user is cached too, so nothing reaches the database.
+        with self.assertNumQueries(0):
+            second = self.get_week()
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_matching_etag_returns_304(self):
+        etag = self.get_week()['ETag']
+        with self.assertNumQueries(0):
+            response = self.get_week(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_category_is_part_of_the_key(self):
+        other = EventCategory.objects.create(name="Category 2", description="Description 2")
+        all_slots = self.get_week()
+        response = self.client.get(self.url, {'week': 0, 'category': other.id}, **self.headers)
+        self.assertNotEqual(response['ETag'], all_slots['ETag'])
+        self.assertEqual(response.data, [])
+
+    def test_booking_invalidates_week(self):
+        etag = self.get_week()['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('timeslot_book', kwargs={'pk': self.slot.id}), **self.headers)
+
+        response = self.get_week(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.data[0]['user'], 'user')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('timeslot_unsubscribe', kwargs={'pk': self.slot.id}), **self.headers)
+        self.assertIsNone(self.get_week().data[0]['user'])
+
+    def test_moving_slot_invalidates_both_weeks(self):
+        this_week = self.get_week()
+        self.assertEqual(self.get_week(1).data, [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                reverse('timeslot-detail', kwargs={'pk': self.slot.id}),
+                data={
+                    'start_time': (self.slot.start_time + timedelta(days=7)).isoformat(),
+                    'end_time': (self.slot.end_time + timedelta(days=7)).isoformat(),
+                },
+                format='json',
+                **self.get_auth_headers(self.admin)
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertNotEqual(self.get_week()['ETag'], this_week['ETag'])
+        self.assertEqual(self.get_week().data, [])
+        self.assertEqual(len(self.get_week(1).data), 1)
+
+    def test_slot_at_monday_midnight_belongs_to_both_weeks(self):
+        monday = self.at_midnight(self.week_start)
+        self.assertEqual(
+            get_slot_weeks(monday), [self.week_start, self.week_start - timedelta(weeks=1)]
+        )
+        self.assertEqual(get_slot_weeks(monday + timedelta(minutes=1)), [self.week_start])
+
+    def test_works_with_file_based_cache(self):
+        with tempfile.TemporaryDirectory() as location:
+            file_cache = {
+                'default': {
+                    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                    'LOCATION': location,
+                }
+            }
+            with override_settings(CACHES=file_cache):
+                first = self.get_week()
+                with self.assertNumQueries(0):
+                    second = self.get_week(HTTP_IF_NONE_MATCH=first['ETag'])
+                self.assertEqual(second.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+class PreferredSlotFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='user', password='user123')
+        self.other_user = User.objects.create_user(username='otheruser', password='other123')
+        self.categories = [
+            EventCategory.objects.create(name=f"Category {i}", description=f"Description {i}")
+            for i in range(4)
+        ]
+        start = timezone.make_aware(datetime.combine(get_week_start(), datetime.min.time())) + timedelta(hours=12)
+        self.slots = TimeSlot.objects.bulk_create([
+            TimeSlot(
+                category=self.categories[i % 4],
+                start_time=start + timedelta(minutes=i),
+                end_time=start + timedelta(minutes=i + 1),
+                user=self.other_user if i % 2 else None,
+            )
+            for i in range(8)
+        ])
+        self.preference = UserPreference.objects.create(user=self.user)
+        self.preference.categories.set(self.categories[:2])
+        self.url = reverse('timeslot-list')
+        self.headers = self.get_auth_headers(self.user)
+
+    def get_auth_headers(self, user):
+        refresh = RefreshToken.for_user(user)
+        return {
+            'HTTP_AUTHORIZATION': f'Bearer {str(refresh.access_token)}',
+            'Content-Type': 'application/json'
+        }
+
+    def get_ids(self, params):
+        response = self.client.get(self.url, params, **self.headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['results'] if 'results' in response.data else response.data
+        return sorted(slot['id'] for slot in results)
+
+    def test_preferred_filters_by_user_categories(self):
+        expected = sorted(slot.id for slot in self.slots if slot.category in self.categories[:2])
+        self.assertEqual(self.get_ids({'preferred': 1}), expected)
+        self.assertEqual(self.get_ids({'preferred': 1, 'week': 0}), expected)
+
+    def test_only_free(self):
+        expected = sorted(
+            slot.id for slot in self.slots if slot.category in self.categories[:2] and slot.user is None
+        )
+        self.assertEqual(self.get_ids({'preferred': 1, 'only_free': 1, 'week': 0}), expected)
+
+    def test_false_flags_are_off(self):
+        everything = sorted(slot.id for slot in self.slots)
+        preferred = self.get_ids({'preferred': 'true', 'only_free': 'yes', 'week': 0})
+        # Same week and filters spelled as "off": not served from the cached
+        # filtered listing.
+        self.assertEqual(self.get_ids({'preferred': 'false', 'only_free': '0', 'week': 0}), everything)
+        self.assertEqual(self.get_ids({'preferred': 'TRUE', 'only_free': '1', 'week': 0}), preferred)
+        self.assertLess(len(preferred), len(everything))
+
+    def test_user_without_preferences_sees_everything(self):
+        self.preference.categories.clear()
+        self.assertEqual(self.get_ids({'preferred': 1}), sorted(slot.id for slot in self.slots))
+
+    def test_category_ids_are_cached(self):
+        self.get_ids({'preferred': 1})
+        # Only the slot page; the JWT user is cached as well.
+        with self.assertNumQueries(1):
+            self.get_ids({'preferred': 1})
+
+    def test_updating_preferences_invalidates_cache(self):
+        self.assertEqual(len(self.get_ids({'preferred': 1, 'week': 0})), 4)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                reverse('user_preference_detail'),
+                data={'categories_ids': [self.categories[3].id]},
+                format='json',
+                **self.headers
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        expected = sorted(slot.id for slot in self.slots if slot.category == self.categories[3])
+        self.assertEqual(self.get_ids({'preferred': 1, 'week': 0}), expected)
+
+
+class TimeSlotExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = User.objects.create_user(username='admin', password='admin123', is_staff=True)
+        self.user = User.objects.create_user(username='user', password='user123')
+        self.category = EventCategory.objects.create(name="Category 1", description="Description 1")
+        self.other_category = EventCategory.objects.create(name="Category 2", description="Description 2")
+        self.start = timezone.make_aware(datetime(2030, 1, 1, 9, 0))
+        self.slots = TimeSlot.objects.bulk_create([
+            TimeSlot(
+                category=self.category if i % 2 == 0 else self.other_category,
+                start_time=self.start + timedelta(days=i),
+                end_time=self.start + timedelta(days=i, hours=1),
+                user=self.user if i == 0 else None,
+            )
+            for i in range(6)
+        ])
+        self.headers = self.get_auth_headers(self.admin)
+
+    def get_auth_headers(self, user):
+        refresh = RefreshToken.for_user(user)
+        return {
+            'HTTP_AUTHORIZATION': f'Bearer {str(refresh.access_token)}',
+            'Content-Type': 'application/json'
+        }
+
+    def export(self, export_format, params=None, user=None):
+        return self.client.get(
+            reverse('timeslot_export', kwargs={'export_format': export_format}),
+            params or {},
+            **self.get_auth_headers(user or self.admin)
+        )
+
+    def test_csv_export(self):
+        response = self.export('csv')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([int(row['id']) for row in rows], [slot.id for slot in self.slots])
+        self.assertEqual(rows[0]['category'], 'Category 1')
+        self.assertEqual(rows[0]['username'], 'user')
+        self.assertEqual(rows[1]['username'], '')
+        self.assertEqual(rows[0]['start_time'], self.start.isoformat())
+
+    def test_ndjson_export_with_filters(self):
+        response = self.export('ndjson', {
+            'start': '2030-01-02',
+            'end': (self.start + timedelta(days=5)).isoformat(),
+            'category': self.other_category.id,
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['id'] for row in rows], [self.slots[1].id, self.slots[3].id])
+        self.assertIsNone(rows[0]['user_id'])
+
+    def test_invalid_date_is_rejected(self):
+        response = self.export('csv', {'start': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_user_cannot_export(self):
+        response = self.export('csv', user=self.user)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def insert_slots(self, rows):
+        table = TimeSlot._meta.db_table
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                # Generate the rows inside SQLite so the test process doesn't
+                # hold them in memory before the export starts.
+                cursor.execute(
+                    f"""
+                    WITH RECURSIVE seq(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM seq WHERE i < %s)
+                    INSERT INTO {table} (category_id, start_time, end_time, user_id)
+                    SELECT %s, datetime('2030-01-01 09:00', '+' || i || ' minutes'),
+                           datetime('2030-01-01 09:01', '+' || i || ' minutes'), NULL
+                    FROM seq
+                    """,
+                    [rows - 1, self.category.id],
+                )
+            else:
+                cursor.executemany(
+                    f'INSERT INTO {table} (category_id, start_time, end_time, user_id) VALUES (%s, %s, %s, NULL)',
+                    (
+                        (self.category.id, self.start + timedelta(minutes=i), self.start + timedelta(minutes=i + 1))
+                        for i in range(rows)
+                    ),
+                )
+
+    def test_peak_memory_is_bounded_for_500k_rows(self):
+        rows = 500_000
+        self.insert_slots(rows)
+
+        # Peak of what the export itself allocates; unlike the process's max
+        # RSS it doesn't depend on what earlier tests already pushed it to.
+        tracemalloc.start()
+        try:
+            response = self.export('ndjson')
+            exported = sum(chunk.count(b'\n') for chunk in response.streaming_content)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        self.assertEqual(exported, rows + len(self.slots))
+        # The full NDJSON body alone is ~70 MB; a streamed export only ever
+        # holds a few chunks of rows.
+        self.assertLess(peak, 20 * 1024 * 1024)
+
+
+class BulkLoadCommandTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def write_slots(self, categories):
+        lines = [
+            json.dumps({
+                'category': category,
+                'start_time': f'2030-01-0{i + 1}T09:00:00',
+                'end_time': f'2030-01-0{i + 1}T10:00:00',
+                'user': 'alice' if i == 0 else None,
+            })
+            for i, category in enumerate(categories)
+        ]
+        return self.write('slots.jsonl', '\n'.join(lines) + '\n')
+
+    def load(self, *args):
+        out = io.StringIO()
+        call_command('bulk_load', *args, stdout=out)
+        return out.getvalue()
+
+    def test_loads_categories_users_and_slots(self):
+        categories = self.write('categories.csv', 'name,description\nYoga,Stretching\nBoxing,Punching\nYoga,Duplicate\n')
+        users = self.write('users.jsonl', '{"username": "alice", "is_staff": true}\n{"username": "bob"}\n')
+
+        self.load('categories', categories)
+        self.load('users', users)
+        with self.assertNumQueries(16):
+            # The progress row and the category and user lookups once, then per
+            # batch of two one INSERT, the availability INSERT and UPDATE and
+            # the progress UPDATE (wrapped in a savepoint inside the test
+            # transaction), and finally the progress row's DELETE.
+            output = self.load('slots', self.write_slots(['Yoga', 'Boxing', 'Yoga']), '--batch-size', '2')
+
+        self.assertIn('rows/sec', output)
+        self.assertEqual(EventCategory.objects.count(), 2)
+        self.assertTrue(User.objects.get(username='alice').is_staff)
+        self.assertFalse(User.objects.get(username='bob').has_usable_password())
+        slots = list(TimeSlot.objects.order_by('start_time').select_related('category', 'user'))
+        self.assertEqual([slot.category.name for slot in slots], ['Yoga', 'Boxing', 'Yoga'])
+        self.assertEqual(slots[0].user.username, 'alice')
+        self.assertIsNone(slots[1].user)
+
+    def test_rejects_plain_text_passwords(self):
+        encoded = make_password('Str0ng-Passw0rd')
+        self.load('users', self.write('hashed.jsonl', json.dumps({'username': 'carol', 'password': encoded}) + '\n'))
+        self.assertTrue(User.objects.get(username='carol').check_password('Str0ng-Passw0rd'))
+
+        path = self.write('plain.jsonl', '{"username": "dave", "password": "hunter22"}\n')
+        with self.assertRaisesMessage(CommandError, "Row 1: password is not a Django password hash"):
+            self.load('users', path)
+        self.assertFalse(User.objects.filter(username='dave').exists())
+
+    def test_resumes_after_interruption(self):
+        EventCategory.objects.create(name="Yoga", description="")
+        User.objects.create(username='alice')
+        path = self.write_slots(['Yoga', 'Yoga', 'Yoga', 'Yoga', 'Pilates', 'Yoga'])
+
+        with self.assertRaisesMessage(CommandError, "Row 5: unknown category 'Pilates'"):
+            self.load('slots', path, '--batch-size', '2')
+        self.assertEqual(TimeSlot.objects.count(), 4)
+
+        with self.assertRaisesMessage(CommandError, '--resume'):
+            self.load('slots', path, '--batch-size', '2')
+
+        EventCategory.objects.create(name="Pilates", description="")
+        self.load('slots', path, '--batch-size', '2', '--resume')
+        self.assertEqual(TimeSlot.objects.count(), 6)
+        self.assertFalse(os.path.exists(path + '.checkpoint'))
+
+    def test_resume_trusts_progress_committed_with_the_batch(self):
+        EventCategory.objects.create(name="Yoga", description="")
+        User.objects.create(username='alice')
+        path = self.write_slots(['Yoga'] * 4)
+        self.load('slots', path, '--batch-size', '2')
+        TimeSlot.objects.filter(start_time__day__gt=2).delete()
+        self.assertFalse(BulkLoadProgress.objects.exists())
+        # A run died after committing rows 1-2. A historical slot identical to
+        # row 3 must not make the resume skip the uncommitted rows 3-4.
+        progress = BulkLoadProgress.objects.create(load_id=uuid.uuid4(), kind='slots', rows=2)
+        with open(path + '.checkpoint', 'w') as f:
+            json.dump({'kind': 'slots', 'load': str(progress.load_id)}, f)
+        slot = TimeSlot.objects.get(start_time__day=1)
+        TimeSlot.objects.create(
+            category=slot.category, start_time=slot.start_time.replace(day=3), end_time=slot.end_time.replace(day=3),
+            user=slot.user,
+        )
+
+        output = self.load('slots', path, '--batch-size', '2', '--resume')
+        self.assertIn('Resuming after row 2', output)
+        self.assertEqual(TimeSlot.objects.count(), 5)
+        self.assertFalse(BulkLoadProgress.objects.exists())
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.async_client = AsyncClient()
+        self.user = User.objects.create_user(username='user', password='user123')
+        self.other_user = User.objects.create_user(username='otheruser', password='other123')
+        self.category = EventCategory.objects.create(name="Category 1", description="Description 1")
+        start = timezone.make_aware(datetime.combine(get_week_start(), datetime.min.time())) + timedelta(hours=12)
+        self.slot = TimeSlot.objects.create(
+            category=self.category,
+            start_time=start,
+            end_time=start + timedelta(hours=1),
+        )
+
+    def get_token(self, user):
+        return f'Bearer {RefreshToken.for_user(user).access_token}'
+
+    async def test_category_list_matches_sync_view(self):
+        response = await self.async_client.get(reverse('async_event_category_list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), [{'id': self.category.id, 'name': 'Category 1'}])
+
+    async def test_week_list_matches_sync_view_and_shares_cache(self):
+        token = await sync_to_async(self.get_token)(self.user)
+        sync_response = await sync_to_async(self.client.get)(
+            reverse('timeslot-list'), {'week': 0}, HTTP_AUTHORIZATION=token
+        )
+        response = await self.async_client.get(
+            reverse('async_timeslot_list'), {'week': 0}, headers={'Authorization': token}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), json.loads(sync_response.content))
+        self.assertEqual(response['ETag'], sync_response['ETag'])
+
+        response = await self.async_client.get(
+            reverse('async_timeslot_list'),
+            {'week': 0},
+            headers={'Authorization': token, 'If-None-Match': sync_response['ETag']},
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    async def test_list_requires_authentication(self):
+        response = await self.async_client.get(reverse('async_timeslot_list'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        response = await self.async_client.get(
+            reverse('async_timeslot_list'), headers={'Authorization': 'Bearer not-a-token'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_book_and_unsubscribe(self):
+        token = await sync_to_async(self.get_token)(self.user)
+        other_token = await sync_to_async(self.get_token)(self.other_user)
+        book_url = reverse('async_timeslot_book', kwargs={'pk': self.slot.id})
+        unsubscribe_url = reverse('async_timeslot_unsubscribe', kwargs={'pk': self.slot.id})
+
+        response = await self.async_client.post(book_url, headers={'Authorization': token})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = await self.async_client.post(book_url, headers={'Authorization': other_token})
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual((await TimeSlot.objects.aget(pk=self.slot.id)).user_id, self.user.id)
+
+        response = await self.async_client.post(unsubscribe_url, headers={'Authorization': other_token})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = await self.async_client.post(unsubscribe_url, headers={'Authorization': token})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone((await TimeSlot.objects.aget(pk=self.slot.id)).user_id)
+
+    async def test_book_missing_slot(self):
+        token = await sync_to_async(self.get_token)(self.user)
+        response = await self.async_client.post(
+            reverse('async_timeslot_book', kwargs={'pk': self.slot.id + 1000}), headers={'Authorization': token}
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class SlotEventTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.async_client = AsyncClient()
+        self.admin_user = User.objects.create_superuser(username='admin', password='admin123')
+        self.user = User.objects.create_user(username='user', password='user123')
+        self.category = EventCategory.objects.create(name="Category 1", description="Description 1")
+        self.other_category = EventCategory.objects.create(name="Category 2", description="Description 2")
+        self.start = timezone.make_aware(datetime.combine(get_week_start(), datetime.min.time())) + timedelta(hours=12)
+        self.slot = TimeSlot.objects.create(
+            category=self.category,
+            start_time=self.start,
+            end_time=self.start + timedelta(hours=1),
+        )
+        # A fresh in-process broadcaster per test.
+        settings_override = override_settings(SLOT_EVENTS={'BACKEND': 'scheduler.events.InProcessBroadcaster'})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.broadcaster = get_broadcaster()
+
+    def get_auth_headers(self, user):
+        refresh = RefreshToken.for_user(user)
+        return {
+            'HTTP_AUTHORIZATION': f'Bearer {str(refresh.access_token)}',
+        }
+
+    def event(self, pk, category_id, start_time, state='free'):
+        return {'id': pk, 'state': state, 'category': category_id, 'start_time': start_time.isoformat()}
+
+    def test_booking_publishes_after_commit(self):
+        url = reverse('timeslot_book', kwargs={'pk': self.slot.id})
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(url, **self.get_auth_headers(self.user))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(self.broadcaster.backlog), [])
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(list(self.broadcaster.backlog), [
+            {**self.event(self.slot.id, self.category.id, self.start, 'booked'), 'version': 1},
+        ])
+
+    def test_unsubscribe_and_batch_publish_free_events(self):
+        self.slot.user = self.user
+        self.slot.save()
+        self.broadcaster.backlog.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('timeslot_batch_unsubscribe'), {'slot_ids': [self.slot.id]},
+                format='json', **self.get_auth_headers(self.user),
+            )
+        self.assertEqual([(event['id'], event['state']) for event in self.broadcaster.backlog], [(self.slot.id, 'free')])
+
+    def test_moving_and_deleting_slot_publish_events(self):
+        url = reverse('timeslot-detail', kwargs={'pk': self.slot.id})
+        new_start = self.start + timedelta(weeks=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(url, {
+                'start_time': new_start.isoformat(),
+                'end_time': (new_start + timedelta(hours=1)).isoformat(),
+            }, format='json', **self.get_auth_headers(self.admin_user))
+            self.client.delete(url, **self.get_auth_headers(self.admin_user))
+
+        moved, deleted = list(self.broadcaster.backlog)[-2:]
+        self.assertEqual(moved['start_time'], new_start.isoformat())
+        self.assertEqual(moved['previous_start_time'], self.start.isoformat())
+        self.assertEqual(deleted['state'], 'deleted')
+
+    async def test_stream_filters_by_week_and_category(self):
+        token = await sync_to_async(RefreshToken.for_user)(self.user)
+        response = await self.async_client.get(
+            reverse('async_timeslot_events'),
+            {'week': 0, 'category': self.category.id, 'token': str(token.access_token)},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+
+        self.broadcaster.publish([
+            self.event(self.slot.id, self.category.id, self.start, 'booked'),
+            self.event(self.slot.id + 1, self.other_category.id, self.start),
+            self.event(self.slot.id + 2, self.category.id, self.start + timedelta(weeks=1)),
+        ])
+        chunk = (await asyncio.wait_for(anext(stream), 1)).decode()
+        self.assertEqual(chunk, (
+            'id: 1\nevent: slot\n'
+            f'data: {{"id":{self.slot.id},"state":"booked","category":{self.category.id},'
+            f'"start_time":"{self.start.isoformat()}","version":1}}\n\n'
+            'id: 3\n\n'
+        ))
+        await stream.aclose()
+
+    async def test_stream_replays_from_last_event_id(self):
+        token = await sync_to_async(self.get_auth_headers)(self.user)
+        headers = {'Authorization': token['HTTP_AUTHORIZATION']}
+        self.broadcaster.publish([self.event(self.slot.id, self.category.id, self.start)] * 2)
+
+        response = await self.async_client.get(reverse('async_timeslot_events'), headers={**headers, 'Last-Event-ID': '1'})
+        stream = aiter(response.streaming_content)
+        await anext(stream)
+        self.assertIn(b'id: 2\n', await asyncio.wait_for(anext(stream), 1))
+        await stream.aclose()
+
+        # A client ahead of the server (e.g. after a restart) must refetch.
+        response = await self.async_client.get(reverse('async_timeslot_events'), headers={**headers, 'Last-Event-ID': '99'})
+        stream = aiter(response.streaming_content)
+        await anext(stream)
+        self.assertEqual(await anext(stream), b'event: reset\ndata: {}\n\n')
+        await stream.aclose()
+
+    def test_stream_is_refused_under_wsgi(self):
+        token = RefreshToken.for_user(self.user).access_token
+        response = self.client.get(reverse('async_timeslot_events'), {'token': str(token)})
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(response.streaming)
+
+    async def test_stream_requires_authentication(self):
+        response = await self.async_client.get(reverse('async_timeslot_events'), {'token': 'not-a-token'})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_sqlite_broadcaster_shares_events_between_instances(self):
+        location = os.path.join(tempfile.mkdtemp(), 'events.sqlite3')
+        publisher = SQLiteBroadcaster(location)
+        listener = SQLiteBroadcaster(location, poll_interval=0.01)
+        self.addCleanup(listener.close)
+
+        subscription, complete = listener.subscribe(after=0)
+        self.assertTrue(complete)
+        publisher.publish([self.event(self.slot.id, self.category.id, self.start, 'booked')])
+        events = await subscription.get(timeout=2)
+        self.assertEqual(events, [{**self.event(self.slot.id, self.category.id, self.start, 'booked'), 'version': 1}])
+
+        # A late subscriber replays from the file.
+        replayed, complete = listener.subscribe(after=0)
+        self.assertTrue(complete)
+        self.assertEqual(await replayed.get(timeout=0), events)
+
+
+class TimeSlotRecurrenceTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = User.objects.create_user(username='admin', password='admin123', is_staff=True)
+        self.user = User.objects.create_user(username='user', password='user123')
+        self.category = EventCategory.objects.create(name="Category 1", description="Description 1")
+        self.url = reverse('timeslot_recurring')
+        # A Tuesday at 18:00, well in the future.
+        self.start = timezone.make_aware(datetime(2030, 1, 1, 18, 0))
+
+    def get_auth_headers(self, user):
+        refresh = RefreshToken.for_user(user)
+        return {
+            'HTTP_AUTHORIZATION': f'Bearer {str(refresh.access_token)}',
+            'Content-Type': 'application/json'
+        }
+
+    def post(self, payload, user=None):
+        data = {
+            'category_id': self.category.id,
+            'start_time': self.start.isoformat(),
+            'duration': '01:00:00',
+        }
+        data.update(payload)
+        return self.client.post(self.url, data=data, format='json', **self.get_auth_headers(user or self.admin))
+
+    def test_weekly_by_weekday_with_count(self):
+        response = self.post({'freq': 'weekly', 'by_weekday': [1, 3], 'count': 6})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 6)
+
+        slots = list(TimeSlot.objects.order_by('start_time'))
+        self.assertEqual([slot.start_time.weekday() for slot in slots], [1, 3] * 3)
+        self.assertEqual(slots[-1].start_time, self.start + timedelta(days=16))
+        self.assertTrue(all(slot.end_time - slot.start_time == timedelta(hours=1) for slot in slots))
+
+    def test_daily_with_interval_until_and_exclusion(self):
+        response = self.post({
+            'freq': 'daily',
+            'interval': 2,
+            'until': (self.start + timedelta(days=10)).isoformat(),
+            'exclude': ['2030-01-05'],
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        days = [slot.start_time.day for slot in TimeSlot.objects.order_by('start_time')]
+        self.assertEqual(days, [1, 3, 7, 9, 11])
+
+    def test_dry_run_creates_nothing(self):
+        response = self.post({'freq': 'weekly', 'interval': 2, 'count': 3, 'dry_run': True})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(
+            response.data['occurrences'][2]['start_time'],
+            (self.start + timedelta(weeks=4)).isoformat()
+        )
+        self.assertFalse(TimeSlot.objects.exists())
+
+    def test_overlap_with_existing_slot_is_rejected(self):
+        TimeSlot.objects.create(
+            category=self.category,
+            start_time=self.start + timedelta(weeks=1, minutes=30),
+            end_time=self.start + timedelta(weeks=1, hours=2),
+        )
+        response = self.post({'freq': 'weekly', 'count': 4})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('overlaps', response.data)
+        self.assertEqual(TimeSlot.objects.count(), 1)
+
+    def test_overlaps_among_existing_slots_are_ignored(self):
+        # Two clashing slots left over from before, between the occurrences.
+        for minutes in (0, 30):
+            TimeSlot.objects.create(
+                category=self.category,
+                start_time=self.start + timedelta(days=3, minutes=minutes),
+                end_time=self.start + timedelta(days=3, hours=1, minutes=minutes),
+            )
+        response = self.post({'freq': 'weekly', 'count': 2})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(TimeSlot.objects.count(), 4)
+
+    def test_slots_in_other_categories_do_not_conflict(self):
+        other = EventCategory.objects.create(name="Category 2", description="Description 2")
+        TimeSlot.objects.create(category=other, start_time=self.start, end_time=self.start + timedelta(hours=1))
+        response = self.post({'freq': 'weekly', 'count': 2})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_self_overlapping_series_is_rejected(self):
+        response = self.post({'freq': 'daily', 'count': 3, 'duration': '1 01:00:00'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_until_or_count_is_required(self):
+        response = self.post({'freq': 'daily'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_expansion_is_bounded(self):
+        with override_settings(SLOT_RECURRENCE_LIMIT=10):
+            response = self.post({'freq': 'daily', 'count': 11})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_user_cannot_generate_slots(self):
+        response = self.post({'freq': 'daily', 'count': 2}, user=self.user)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class TimeSlotQueryPlanTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='user', password='user123')
+        self.category = EventCategory.objects.create(name="Category 1", description="Description 1")
+        now = timezone.now()
+        TimeSlot.objects.bulk_create([
+            TimeSlot(
+                category=self.category,
+                start_time=now + timedelta(hours=i),
+                end_time=now + timedelta(hours=i, minutes=30),
+                user=self.user if i % 3 == 0 else None,
+            )
+            for i in range(200)
+        ])
+        self.start = now
+        self.end = now + timedelta(days=7)
+
+    def get_plan(self, qs):
+        if connection.vendor == 'postgresql':
+            # Tiny test tables would always be sequentially scanned otherwise.
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return qs.explain()
+
+    def assertNoFullScan(self, qs):
+        plan = self.get_plan(qs)
+        table = TimeSlot._meta.db_table
+        full_scans = [
+            line for line in plan.splitlines()
+            if f'SCAN {table}' in line and 'USING' not in line
+            or f'Seq Scan on {table}' in line
+        ]
+        self.assertEqual(full_scans, [], plan)
+
+    def test_week_query_uses_index(self):
+        self.assertNoFullScan(
+            TimeSlot.objects.filter(start_time__gte=self.start, start_time__lte=self.end)
+        )
+
+    def test_category_week_query_uses_index(self):
+        self.assertNoFullScan(
+            TimeSlot.objects.filter(
+                category=self.category, start_time__gte=self.start, start_time__lte=self.end
+            )
+        )
+
+    def test_user_bookings_query_uses_index(self):
+        self.assertNoFullScan(
+            TimeSlot.objects.filter(user=self.user, start_time__gte=self.start)
+        )
+
+    def test_free_slot_search_uses_index(self):
+        self.assertNoFullScan(
+            find_free_slots(self.user, self.start, self.end, 5, category_ids=[self.category.id])
+        )
+
+
+class TimeSlotSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='user', password='user123')
+        self.other_user = User.objects.create_user(username='otheruser', password='other123')
+        self.category = EventCategory.objects.create(name="Category 1", description="Description 1")
+        self.other_category = EventCategory.objects.create(name="Category 2", description="Description 2")
+        self.url = reverse('timeslot-search')
+        # Mondays to Sundays from 2030-01-07, at 08:00, 12:00 and 18:00.
+        self.monday = timezone.make_aware(datetime(2030, 1, 7))
+        self.slots = TimeSlot.objects.bulk_create([
+            TimeSlot(
+                category=self.category if hour != 18 else self.other_category,
+                start_time=self.monday + timedelta(days=day, hours=hour),
+                end_time=self.monday + timedelta(days=day, hours=hour + 1),
+            )
+            for day in range(7) for hour in (8, 12, 18)
+        ])
+
+    def get_auth_headers(self, user):
+        refresh = RefreshToken.for_user(user)
+        return {
+            'HTTP_AUTHORIZATION': f'Bearer {str(refresh.access_token)}',
+            'Content-Type': 'application/json'
+        }
+
+    def search(self, **params):
+        params.setdefault('start', self.monday.isoformat())
+        response = self.client.get(self.url, params, **self.get_auth_headers(self.user))
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return [slot['start_time'] for slot in response.data]
+
+    def at(self, day, hour):
+        return (self.monday + timedelta(days=day, hours=hour)).isoformat().replace('+00:00', 'Z')
+
+    def test_returns_next_free_slots_in_order(self):
+        TimeSlot.objects.filter(start_time=self.monday + timedelta(hours=8)).update(user=self.other_user)
+        self.assertEqual(self.search(limit=3), [self.at(0, 12), self.at(0, 18), self.at(1, 8)])
+
+    def test_filters(self):
+        self.assertEqual(
+            self.search(categories=[self.other_category.id], weekdays=[2, 4], limit=5),
+            [self.at(2, 18), self.at(4, 18)],
+        )
+        self.assertEqual(self.search(from_time='10:00', to_time='17:00', limit=2), [self.at(0, 12), self.at(1, 12)])
+        self.assertEqual(self.search(end=self.at(1, 0), min_duration='02:00:00'), [])
+
+    def test_excludes_slots_overlapping_bookings(self):
+        TimeSlot.objects.create(
+            category=self.other_category,
+            start_time=self.monday + timedelta(hours=8, minutes=30),
+            end_time=self.monday + timedelta(hours=12, minutes=30),
+            user=self.user,
+        )
+        self.assertEqual(self.search(limit=2), [self.at(0, 18), self.at(1, 8)])
+
+    def test_defaults_to_preferred_categories(self):
+        preference = UserPreference.objects.create(user=self.user)
+        preference.categories.set([self.other_category])
+        self.assertEqual(self.search(limit=2), [self.at(0, 18), self.at(1, 18)])
+
+    def test_single_query_with_limit(self):
+        self.search()  # warms the JWT user and preference caches
+        with CaptureQueriesContext(connection) as queries:
+            self.search(limit=2)
+        slot_queries = [query['sql'] for query in queries.captured_queries if 'scheduler_timeslot' in query['sql']]
+        self.assertEqual(len(slot_queries), 1)
+        self.assertIn('LIMIT 2', slot_queries[0])
+
+    def test_invalid_parameters(self):
+        headers = self.get_auth_headers(self.user)
+        for params in (
+            {'start': '2030-02-01T00:00:00Z', 'end': '2030-01-01T00:00:00Z'},
+            {'end': '2040-01-01T00:00:00Z'},
+            {'from_time': '18:00', 'to_time': '09:00'},
+            {'weekdays': 7},
+            {'limit': settings.SLOT_SEARCH_MAX_LIMIT + 1},
+        ):
+            response = self.client.get(self.url, params, **headers)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class UserPreferenceTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='user', password='user123')
+        self.category1 = EventCategory.objects.create(name="Category 1", description="Desc 1")
+        self.category2 = EventCategory.objects.create(name="Category 2", description="Desc 2")
+        self.pref_url = reverse('user_preference_detail')
+    
+    def get_auth_headers(self, user):
+        refresh = RefreshToken.for_user(user)
+        return {
+            'HTTP_AUTHORIZATION': f'Bearer {str(refresh.access_token)}',
+            'Content-Type': 'application/json'
+        }
+
+    def test_get_user_preference(self):
+        pref = UserPreference.objects.create(user=self.user)
+        pref.categories.add(self.category1)
+        pref.save()
+
+        response = self.client.get(self.pref_url, **self.get_auth_headers(self.user))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        categories = response.data['categories']
+        category_ids = [cat['id'] for cat in categories]
+        self.assertIn(self.category1.id, category_ids)
+
+
+class RegisterViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.register_url = reverse('register')
+
+    def test_register_success(self):
+        payload = {
+            "username": "newuser",
+            "password": "StrongPass123!"
+        }
+        response = self.client.post(self.register_url, data=payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['detail'], "User successfully created.")
+        self.assertTrue(User.objects.filter(username="newuser").exists())
+
+    def test_register_missing_fields(self):
+        response = self.client.post(self.register_url, data={}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_register_existing_username(self):
+        User.objects.create_user(username="existing", password="pass123")
+        response = self.client.post(self.register_url, data={"username": "existing", "password": "newpass"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("Username already exists", response.data['detail'])
+
+    def test_register_weak_password(self):
+        payload = {
+            "username": "user2",
+            "password": "123" 
+        }
+        response = self.client.post(self.register_url, data=payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(isinstance(response.data['detail'], list))
+
+
+class ProvisionUsersTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.client = APIClient()
+        self.admin_user = User.objects.create_superuser(username='admin', password='admin123')
+        self.yoga = EventCategory.objects.create(name="Yoga", description="")
+        self.boxing = EventCategory.objects.create(name="Boxing", description="")
+
+    def get_auth_headers(self, user):
+        refresh = RefreshToken.for_user(user)
+        return {
+            'HTTP_AUTHORIZATION': f'Bearer {str(refresh.access_token)}',
+        }
+
+    def test_command_creates_users_and_reports_bad_rows(self):
+        path = os.path.join(self.tmp.name, 'users.csv')
+        with open(path, 'w') as f:
+            f.write(
+                'username,password,categories\n'
+                'alice,Str0ng-Passw0rd,Yoga|Boxing\n'
+                'bob,,Yoga\n'
+                'carol,123,\n'
+                'alice,Str0ng-Passw0rd,\n'
+                'admin,Str0ng-Passw0rd,\n'
+                'dave,Str0ng-Passw0rd,Chess\n'
+                ',Str0ng-Passw0rd,\n'
+            )
+        out, err = io.StringIO(), io.StringIO()
+        call_command('provision_users', path, '--workers', '2', stdout=out, stderr=err)
+
+        self.assertIn('Created 2 users', out.getvalue())
+        errors = {error['row']: error for error in map(json.loads, err.getvalue().splitlines())}
+        self.assertEqual(sorted(errors), [3, 4, 5, 6, 7])
+        self.assertIn("This password is too short. It must contain at least 8 characters.", errors[3]['errors'])
+        self.assertEqual(errors[4]['errors'], ["Username already exists."])
+        self.assertEqual(errors[6]['errors'], ["Unknown category 'Chess'."])
+
+        alice = User.objects.get(username='alice')
+        self.assertTrue(alice.check_password('Str0ng-Passw0rd'))
+        self.assertEqual(set(alice.userpreference.categories.all()), {self.yoga, self.boxing})
+        bob = User.objects.get(username='bob')
+        self.assertFalse(bob.has_usable_password())
+        self.assertEqual(list(bob.userpreference.categories.all()), [self.yoga])
+
+    def test_endpoint_accepts_jsonl_upload_and_json_body(self):
+        url = reverse('user-bulk')
+        upload = SimpleUploadedFile('users.jsonl', b'{"username": "erin", "categories": ["Boxing"]}\nnot json\n')
+        response = self.client.post(url, {'file': upload}, format='multipart', **self.get_auth_headers(self.admin_user))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['errors'], [{'row': 2, 'username': '', 'errors': ["Invalid row."]}])
+
+        with self.assertNumQueries(2):
+            # Auth comes from the user cache; categories and existing usernames
+            # are read once, and every row fails before anything is written.
+            response = self.client.post(
+                url, {'users': [{'username': 'erin'}, {'username': 'frank', 'categories': [999]}]},
+                format='json', **self.get_auth_headers(self.admin_user),
+            )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([error['row'] for error in response.data['errors']], [1, 2])
+
+    @override_settings(PROVISIONING_WORKERS=2)
+    def test_endpoint_shares_one_hashing_pool(self):
+        url = reverse('user-bulk')
+        executors = []
+        for username in ('gina', 'hank'):
+            response = self.client.post(
+                url, {'users': [{'username': username, 'password': 'Str0ng-Passw0rd'}]},
+                format='json', **self.get_auth_headers(self.admin_user),
+            )
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            executors.append(hashing._provisioning_executor)
+        self.assertIsNotNone(executors[0])
+        self.assertIs(executors[0], executors[1])
+        self.assertTrue(User.objects.get(username='hank').check_password('Str0ng-Passw0rd'))
+
+    def test_username_taken_meanwhile_fails_only_its_row(self):
+        def hash_many(credentials):
+            # Someone registers "ivan" between the existence check and the insert.
+            User.objects.create_user(username='ivan')
+            return [([], make_password(password)) for _, password in credentials]
+
+        rows = enumerate([
+            {'username': 'ivan', 'password': 'Str0ng-Passw0rd'},
+            {'username': 'judy', 'password': 'Str0ng-Passw0rd', 'categories': 'Yoga'},
+        ], start=1)
+        result = UserProvisioner().run(rows, hash_many=hash_many)
+        self.assertEqual(result['created'], 1)
+        self.assertEqual([error['row'] for error in result['errors']], [1])
+        self.assertEqual(list(User.objects.get(username='judy').userpreference.categories.all()), [self.yoga])
+
+    def test_endpoint_is_admin_only(self):
+        user = User.objects.create_user(username='user', password='user123')
+        response = self.client.post(
+            reverse('user-bulk'), {'users': [{'username': 'x'}]}, format='json', **self.get_auth_headers(user)
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(User.objects.filter(username='x').exists())
+
+
+class StatelessJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.admin_user = User.objects.create_superuser(username='admin', password='admin123')
+        self.user = User.objects.create_user(username='user', password='user123')
+        self.category = EventCategory.objects.create(name="Category 1", description="Description 1")
+        start = timezone.now() + timedelta(days=1)
+        self.slot = TimeSlot.objects.create(
+            category=self.category,
+            start_time=start,
+            end_time=start + timedelta(hours=1),
+        )
+
+    def get_auth_headers(self, user):
+        # Tokens as issued by /api/token/, carrying the user claims.
+        token = CustomTokenObtainPairSerializer.get_token(user)
+        return {
+            'HTTP_AUTHORIZATION': f'Bearer {str(token.access_token)}',
+        }
+
+    def test_claims_token_skips_user_lookup(self):
+        # The first request reads the user's revocation row; later ones within
+        # AUTH_REVOCATION_CACHE_TIMEOUT don't.
+        self.client.get(reverse('timeslot-list'), {'page_size': 1}, **self.get_auth_headers(self.user))
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('timeslot-list'), {'week': 0}, **self.get_auth_headers(self.user))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_admin_permission_comes_from_claims(self):
+        url = reverse('user-list')
+        self.assertEqual(self.client.get(url, **self.get_auth_headers(self.admin_user)).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(url, **self.get_auth_headers(self.user)).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_claims_user_preferred_week(self):
+        UserPreference.objects.create(user=self.user).categories.add(self.category)
+        response = self.client.get(
+            reverse('timeslot-list'), {'week': 0, 'preferred': 1}, **self.get_auth_headers(self.user)
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_claims_user_can_book_and_unsubscribe(self):
+        headers = self.get_auth_headers(self.user)
+        response = self.client.post(reverse('timeslot_book', kwargs={'pk': self.slot.id}), **headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.slot.refresh_from_db()
+        self.assertEqual(self.slot.user, self.user)
+
+        response = self.client.post(reverse('timeslot_unsubscribe', kwargs={'pk': self.slot.id}), **headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_deactivating_user_revokes_tokens(self):
+        headers = self.get_auth_headers(self.user)
+        self.assertEqual(self.client.get(reverse('timeslot-list'), **headers).status_code, status.HTTP_200_OK)
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('timeslot-list'), **headers).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_revocation_outlives_the_cache(self):
+        headers = self.get_auth_headers(self.user)
+        self.user.is_active = False
+        self.user.save()
+        # Another process, or an evicted entry, falls back to the table.
+        cache.clear()
+        self.assertEqual(self.client.get(reverse('timeslot-list'), **headers).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_losing_staff_revokes_tokens(self):
+        headers = self.get_auth_headers(self.admin_user)
+        self.assertEqual(self.client.get(reverse('user-list'), **headers).status_code, status.HTTP_200_OK)
+
+        self.admin_user.is_staff = False
+        self.admin_user.is_superuser = False
+        self.admin_user.save()
+        self.assertEqual(self.client.get(reverse('user-list'), **headers).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refreshed_token_stays_revoked_after_demotion(self):
+        refresh = CustomTokenObtainPairSerializer.get_token(self.admin_user)
+        self.admin_user.is_staff = False
+        self.admin_user.is_superuser = False
+        self.admin_user.save()
+
+        # Another revocation an access token lifetime later must not prune
+        # the admin's row while their refresh token is still valid.
+        later = time.time() + 600
+        with mock.patch('scheduler.authentication.time.time', return_value=later):
+            self.user.is_active = False
+            self.user.save()
+        cache.clear()
+
+        response = self.client.post(reverse('token_refresh'), {'refresh': str(refresh)}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        headers = {'HTTP_AUTHORIZATION': f"Bearer {response.data['access']}"}
+        self.assertEqual(self.client.get(reverse('user-list'), **headers).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_unrelated_save_keeps_tokens(self):
+        headers = self.get_auth_headers(self.user)
+        self.user.first_name = 'Changed'
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('timeslot-list'), **headers).status_code, status.HTTP_200_OK)
+        self.assertFalse(TokenRevocation.objects.exists())
+
+    def test_tokens_without_claims_use_cached_user(self):
+        token = RefreshToken.for_user(self.user).access_token
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+        self.client.get(reverse('timeslot-list'), {'week': 0}, **headers)
+        with self.assertNumQueries(1):
+            self.client.get(reverse('timeslot-list'), {'page_size': 1}, **headers)
+
+        # Bulk updates skip signals, so they call the revocation hook directly.
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        revoke_user_tokens(self.user.pk)
+        self.assertEqual(self.client.get(reverse('timeslot-list'), **headers).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_new_user_reusing_id_is_not_revoked(self):
+        user_id = self.user.pk
+        self.user.delete()
+        user = User.objects.create_user(id=user_id, username='newuser', password='user123')
+        response = self.client.get(reverse('timeslot-list'), **self.get_auth_headers(user))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class JWTLoginTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.login_url = reverse('token_obtain_pair')  # or your custom URL name
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+
+    def test_login_success(self):
+        payload = {
+            "username": "testuser",
+            "password": "testpass123"
+        }
+        response = self.client.post(self.login_url, data=payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('access', response.data)
+        self.assertIn('refresh', response.data)
+
+    def test_login_wrong_credentials(self):
+        payload = {
+            "username": "testuser",
+            "password": "wrongpass"
+        }
+        response = self.client.post(self.login_url, data=payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class LoginProtectionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.login_url = reverse('token_obtain_pair')
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+
+    def login(self, password, username='testuser'):
+        return self.client.post(self.login_url, data={'username': username, 'password': password}, format='json')
+
+    def test_username_bucket_rejects_brute_force(self):
+        for _ in range(5):
+            self.assertEqual(self.login('wrongpass').status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.login('testpass123')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+        # Other usernames have their own bucket.
+        self.assertEqual(self.login('wrongpass', username='someoneelse').status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_ip_bucket_applies_before_validation(self):
+        for _ in range(30):
+            self.assertEqual(self.client.post(self.login_url, data={}, format='json').status_code, 400)
+        response = self.login('testpass123')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_forwarded_for_header_does_not_reset_ip_bucket(self):
+        for number in range(30):
+            response = self.client.post(self.login_url, data={}, format='json', HTTP_X_FORWARDED_FOR=f'10.0.0.{number}')
+            self.assertEqual(response.status_code, 400)
+        response = self.client.post(self.login_url, data={}, format='json', HTTP_X_FORWARDED_FOR='10.0.1.1')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_failed_login_goes_through_authenticate(self):
+        failures = []
+
+        def record(sender, credentials, **kwargs):
+            failures.append(credentials['username'])
+
+        user_login_failed.connect(record)
+        self.addCleanup(user_login_failed.disconnect, record)
+        self.assertEqual(self.login('wrongpass').status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(failures, ['testuser'])
+
+    @override_settings(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_QUEUE_SIZE=1)
+    def test_login_and_register_hash_in_pool(self):
+        response = self.login('testpass123')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('access', response.data)
+
+        response = self.client.post(
+            reverse('register'), data={'username': 'newuser', 'password': 'StrongPass123!'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(User.objects.get(username='newuser').check_password('StrongPass123!'))
+
+    @override_settings(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_QUEUE_SIZE=0)
+    def test_saturated_pool_returns_503(self):
+        pool = get_hashing_pool()
+        pool.slots.acquire()
+        try:
+            response = self.login('testpass123')
+            register_response = self.client.post(
+                reverse('register'), data={'username': 'newuser', 'password': 'StrongPass123!'}, format='json'
+            )
+        finally:
+            pool.slots.release()
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(register_response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        response = self.client.post(
+            reverse('register'), data={'username': 'newuser', 'password': 'StrongPass123!'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    @override_settings(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_QUEUE_SIZE=0)
+    def test_saturated_pool_falls_back_outside_the_api(self):
+        # The admin login form calls authenticate() directly; it hashes inline.
+        pool = get_hashing_pool()
+        pool.slots.acquire()
+        try:
+            self.assertEqual(authenticate(username='testuser', password='testpass123'), self.user)
+            self.assertIsNone(authenticate(username='testuser', password='wrongpass'))
+        finally:
+            pool.slots.release()
+
+
+@skipIf(connection.vendor != 'sqlite', "SQLite profile only")
+class SQLiteProfileTests(TestCase):
+    def setUp(self):
+        from backend.db.sqlite3.base import DatabaseWrapper
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'profile.sqlite3')
+        self.wrapper = DatabaseWrapper({**connection.settings_dict, 'NAME': self.path}, alias='profile')
+
+    def tearDown(self):
+        self.wrapper.close()
+        self.tmp.cleanup()
+
+    def pragma(self, name):
+        with self.wrapper.cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    @override_settings(SQLITE_PRAGMAS={
+        'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'busy_timeout': 1234,
+        'mmap_size': 1048576, 'cache_size': -2048,
+    })
+    def test_new_connections_get_pragmas(self):
+        self.assertEqual(self.pragma('journal_mode'), 'wal')
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('busy_timeout'), 1234)
+        self.assertEqual(self.pragma('mmap_size'), 1048576)
+        self.assertEqual(self.pragma('cache_size'), -2048)
+
+    @override_settings(SQLITE_PRAGMAS={'journal_mode': 'WAL'})
+    def test_transactions_take_write_lock_up_front(self):
+        import sqlite3
+
+        with self.wrapper.cursor() as cursor:
+            cursor.execute("CREATE TABLE t (x integer)")
+        other = sqlite3.connect(self.path, timeout=0)
+        # What transaction.atomic() runs on entry; no write has happened yet.
+        self.wrapper._start_transaction_under_autocommit()
+        try:
+            with self.assertRaisesMessage(sqlite3.OperationalError, 'database is locked'):
+                other.execute("INSERT INTO t VALUES (1)")
+        finally:
+            self.wrapper.connection.rollback()
+            other.close()
+
+
+class RecordingReplicaRouter(ReplicaRouter):
+    # The test database doubles as the "replica"; record what was routed.
+    routed = []
+
+    def db_for_read(self, model, **hints):
+        db = super().db_for_read(model, **hints)
+        if db is not None:
+            self.routed.append(model._meta.label_lower)
+        return db
+
+
+@override_settings(
+    DATABASE_REPLICAS=['default'],
+    DATABASE_ROUTERS=['scheduler.tests.RecordingReplicaRouter'],
+    MIDDLEWARE=settings.MIDDLEWARE + ['scheduler.routers.ReplicaRoutingMiddleware'],
+    REPLICA_STICKY_SECONDS=5,
+)
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        RecordingReplicaRouter.routed = []
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='user', password='user123')
+        self.category = EventCategory.objects.create(name="Category 1", description="Description 1")
+        self.slot = TimeSlot.objects.create(
+            category=self.category,
+            start_time=timezone.now() + timedelta(days=1),
+            end_time=timezone.now() + timedelta(days=1, hours=1),
+        )
+
+    def get_auth_headers(self, user):
+        refresh = RefreshToken.for_user(user)
+        return {
+            'HTTP_AUTHORIZATION': f'Bearer {str(refresh.access_token)}',
+            'Content-Type': 'application/json'
+        }
+
+    def test_reads_go_to_replica(self):
+        self.client.get(reverse('event_category_list'))
+        self.assertEqual(RecordingReplicaRouter.routed, ['scheduler.eventcategory'])
+
+        RecordingReplicaRouter.routed = []
+        self.client.get(reverse('timeslot-list'), **self.get_auth_headers(self.user))
+        self.assertIn('scheduler.timeslot', RecordingReplicaRouter.routed)
+
+        # The preference row itself comes from get_or_create on the primary.
+        UserPreference.objects.create(user=self.user).categories.add(self.category)
+        RecordingReplicaRouter.routed = []
+        response = self.client.get(reverse('user_preference_detail'), **self.get_auth_headers(self.user))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(RecordingReplicaRouter.routed, ['scheduler.eventcategory'])
+
+    def test_writes_and_other_views_use_primary(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('timeslot_book', kwargs={'pk': self.slot.id}), **self.get_auth_headers(self.user))
+        self.client.get(reverse('timeslot_export', kwargs={'export_format': 'csv'}), **self.get_auth_headers(self.user))
+        self.assertEqual(RecordingReplicaRouter.routed, [])
+
+    def test_week_cache_is_filled_from_primary(self):
+        self.client.get(reverse('timeslot-list') + '?week=0', **self.get_auth_headers(self.user))
+        self.assertNotIn('scheduler.timeslot', RecordingReplicaRouter.routed)
+
+    def test_user_is_pinned_to_primary_after_booking(self):
+        other = User.objects.create_user(username='other', password='other123')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('timeslot_book', kwargs={'pk': self.slot.id}), **self.get_auth_headers(self.user)
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        self.client.get(reverse('timeslot-list'), **self.get_auth_headers(self.user))
+        self.assertEqual(RecordingReplicaRouter.routed, [])
+        # Other users still read from the replica.
+        self.client.get(reverse('timeslot-list'), **self.get_auth_headers(other))
+        self.assertIn('scheduler.timeslot', RecordingReplicaRouter.routed)
+
+    def test_failed_write_does_not_pin(self):
+        self.slot.user = User.objects.create_user(username='other', password='other123')
+        self.slot.save()
+        response = self.client.post(
+            reverse('timeslot_book', kwargs={'pk': self.slot.id}), **self.get_auth_headers(self.user)
+        )
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_pin_is_carried_by_the_client(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('timeslot_book', kwargs={'pk': self.slot.id}), **self.get_auth_headers(self.user))
+        # Another worker has its own cache; the cookie still pins the user.
+        cache.clear()
+        self.client.get(reverse('timeslot-list'), **self.get_auth_headers(self.user))
+        self.assertEqual(RecordingReplicaRouter.routed, [])
+
+        # Without the cookie, or once it is older than REPLICA_STICKY_SECONDS,
+        # reads go back to the replica.
+        later = time.time() + 6
+        with mock.patch('django.core.signing.time.time', return_value=later):
+            self.client.get(reverse('timeslot-list'), **self.get_auth_headers(self.user))
+        self.assertIn('scheduler.timeslot', RecordingReplicaRouter.routed)
+
+    async def test_async_reads_go_to_replica(self):
+        response = await AsyncClient().get(reverse('async_event_category_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('scheduler.eventcategory', RecordingReplicaRouter.routed)
+
+
+class SyncReplicasCommandTests(TestCase):
+    def test_requires_replicas(self):
+        with override_settings(DATABASE_REPLICAS=[]):
+            with self.assertRaisesMessage(CommandError, "No replicas configured"):
+                call_command('sync_replicas')
+
+
+@override_settings(
+    MIDDLEWARE=['scheduler.profiling.RequestProfilingMiddleware'] + settings.MIDDLEWARE,
+    REQUEST_PROFILING_SAMPLE_RATE=1,
+    REQUEST_PROFILING_SQL_THRESHOLD_MS=60000,
+    REQUEST_PROFILING_REPEATED_QUERIES=3,
+)
+class RequestProfilingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='user', password='user123')
+        self.category = EventCategory.objects.create(name="Category 1", description="Description 1")
+        TimeSlot.objects.create(
+            category=self.category,
+            start_time=timezone.now() + timedelta(days=1),
+            end_time=timezone.now() + timedelta(days=1, hours=1),
+        )
+
+    def get_auth_headers(self, user):
+        refresh = RefreshToken.for_user(user)
+        return {
+            'HTTP_AUTHORIZATION': f'Bearer {str(refresh.access_token)}',
+            'Content-Type': 'application/json'
+        }
+
+    def profile_line(self, logs):
+        return json.loads(logs.records[0].getMessage())
+
+    def test_server_timing_and_log_line(self):
+        with self.assertLogs('scheduler.profiling', 'INFO') as logs:
+            response = self.client.get(reverse('timeslot-list'), **self.get_auth_headers(self.user))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        timing = response['Server-Timing']
+        for metric in ('total;dur=', 'db;dur=', 'serialize;dur=', 'render;dur='):
+            self.assertIn(metric, timing)
+
+        line = self.profile_line(logs)
+        self.assertEqual(line['view'], 'timeslot-list')
+        self.assertEqual(line['status'], 200)
+        self.assertGreater(line['queries'], 0)
+        self.assertIn(f'desc="{line["queries"]} queries"', timing)
+        self.assertGreater(line['serialize_ms'], 0)
+        self.assertGreater(line['render_ms'], 0)
+        self.assertNotIn('sql', line)
+
+    @override_settings(REQUEST_PROFILING_SQL_THRESHOLD_MS=0)
+    def test_slow_requests_dump_sql(self):
+        with self.assertLogs('scheduler.profiling', 'INFO') as logs:
+            self.client.get(reverse('event_category_list'))
+        line = self.profile_line(logs)
+        self.assertEqual(len(line['sql']), line['queries'])
+        self.assertIn('scheduler_eventcategory', line['sql'][0]['sql'])
+
+    @override_settings(REQUEST_PROFILING_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_untouched(self):
+        with self.assertNoLogs('scheduler.profiling'):
+            response = self.client.get(reverse('event_category_list'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    def test_repeated_queries_are_flagged(self):
+        from django.test import RequestFactory
+        from django.urls import resolve
+        from scheduler.profiling import RequestProfilingMiddleware
+
+        def view(request):
+            for category in EventCategory.objects.all():
+                list(TimeSlot.objects.filter(category=category))
+            return HttpResponse()
+
+        for i in range(2):
+            EventCategory.objects.create(name=f"Extra {i}", description="")
+        request = RequestFactory().get(reverse('event_category_list'))
+        request.resolver_match = resolve(request.path)
+        with self.assertLogs('scheduler.profiling', 'INFO') as logs:
+            RequestProfilingMiddleware(view)(request)
+        line = self.profile_line(logs)
+        self.assertEqual(line['repeated_queries'][0]['count'], 3)
+        self.assertIn('scheduler_timeslot', line['repeated_queries'][0]['sql'])
+        self.assertIn('Possible N+1 in event_category_list', logs.output[1])
+
+    async def test_async_views_are_profiled(self):
+        from scheduler.profiling import _install_query_wrapper
+
+        # The test database connection predates the middleware; servers only
+        # connect after loading it, which installs the wrapper.
+        await sync_to_async(lambda: _install_query_wrapper(connection))()
+        with self.assertLogs('scheduler.profiling', 'INFO') as logs:
+            response = await AsyncClient().get(reverse('async_event_category_list'))
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertEqual(self.profile_line(logs)['queries'], 1)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_metrics()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='user', password='user123')
+        self.other_user = User.objects.create_user(username='otheruser', password='other123')
+        self.staff = User.objects.create_user(username='staff', password='staff123', is_staff=True)
+        self.category = EventCategory.objects.create(name="Category 1", description="Description 1")
+        self.slot = TimeSlot.objects.create(
+            category=self.category,
+            start_time=timezone.now() + timedelta(days=1),
+            end_time=timezone.now() + timedelta(days=1, hours=1),
+        )
+
+    def get_auth_headers(self, user):
+        refresh = RefreshToken.for_user(user)
+        return {
+            'HTTP_AUTHORIZATION': f'Bearer {str(refresh.access_token)}',
+            'Content-Type': 'application/json'
+        }
+
+    def scrape(self, **extra):
+        response = self.client.get(reverse('metrics'), **(extra or self.get_auth_headers(self.staff)))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.content.decode()
+
+    def test_booking_and_unsubscribe_counters(self):
+        book_url = reverse('timeslot_book', kwargs={'pk': self.slot.id})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(book_url, **self.get_auth_headers(self.user))
+        self.client.post(book_url, **self.get_auth_headers(self.other_user))
+        self.client.post(reverse('timeslot_book', kwargs={'pk': 999}), **self.get_auth_headers(self.user))
+        unsubscribe_url = reverse('timeslot_unsubscribe', kwargs={'pk': self.slot.id})
+        self.client.post(unsubscribe_url, **self.get_auth_headers(self.other_user))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(unsubscribe_url, **self.get_auth_headers(self.user))
+
+        text = self.scrape()
+        self.assertIn('bookings_total{result="booked"} 1\n', text)
+        self.assertIn('bookings_total{result="conflict"} 1\n', text)
+        self.assertIn('bookings_total{result="not_found"} 1\n', text)
+        self.assertIn('unsubscribes_total{result="not_subscribed"} 1\n', text)
+        self.assertIn('unsubscribes_total{result="unsubscribed"} 1\n', text)
+
+    def test_request_latency_and_queries_by_view(self):
+        self.client.get(reverse('timeslot-list'), **self.get_auth_headers(self.user))
+        self.client.get(reverse('timeslot-list'), **self.get_auth_headers(self.user))
+
+        text = self.scrape()
+        self.assertIn('http_request_duration_seconds_count{view="timeslot-list",method="GET"} 2\n', text)
+        self.assertIn('http_request_duration_seconds_bucket{view="timeslot-list",method="GET",le="+Inf"} 2\n', text)
+        self.assertRegex(text, r'db_queries_total\{view="timeslot-list"\} [1-9]')
+
+    @override_settings(PASSWORD_HASH_WORKERS=0)
+    def test_login_hash_time(self):
+        self.client.post(reverse('token_obtain_pair'), {'username': 'user', 'password': 'user123'}, format='json')
+        self.assertIn('login_hash_seconds_count 1\n', self.scrape())
+
+    async def test_async_booking_counter(self):
+        token = self.get_auth_headers(self.user)['HTTP_AUTHORIZATION']
+        response = await AsyncClient().post(
+            reverse('async_timeslot_book', kwargs={'pk': self.slot.id}), headers={'Authorization': token}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('bookings_total{result="booked"} 1\n', await sync_to_async(self.scrape)())
+
+    def test_aggregates_other_processes(self):
+        self.client.post(reverse('timeslot_book', kwargs={'pk': 999}), **self.get_auth_headers(self.user))
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            # Another worker's last flush.
+            write_snapshot({
+                ('bookings_total', ('not_found',)): 2,
+                ('http_request_duration_seconds', ('timeslot_book', 'POST')): [1] + [0] * 11 + [0.004, 1],
+            }, pid=999999)
+            text = self.scrape()
+        self.assertIn('bookings_total{result="not_found"} 3\n', text)
+        self.assertIn('http_request_duration_seconds_count{view="timeslot_book",method="POST"} 2\n', text)
+
+    def test_nonstandard_methods_share_one_label(self):
+        for method in ('PROPFIND', 'BREW', 'GET'):
+            self.client.generic(method, reverse('timeslot-list'), **self.get_auth_headers(self.user))
+
+        text = self.scrape()
+        self.assertIn('http_request_duration_seconds_count{view="timeslot-list",method="other"} 2\n', text)
+        self.assertNotIn('BREW', text)
+
+    def test_staff_or_token_required(self):
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.client.get(url, **self.get_auth_headers(self.user)).status_code, 401)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer nonsense').status_code, 401)
+        self.client.force_login(self.staff)
+        self.scrape(HTTP_ACCEPT='text/plain')
+        self.client.logout()
+        with override_settings(METRICS_PUBLIC=True):
+            self.scrape(HTTP_ACCEPT='text/plain')
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token_required_when_configured(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.scrape(HTTP_AUTHORIZATION='Bearer secret')
+
+
+class SlotAvailabilityTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.admin = User.objects.create_user(username='admin', password='admin123', is_staff=True)
+        self.user = User.objects.create_user(username='user', password='user123')
+        self.category = EventCategory.objects.create(name="Category 1", description="Description 1")
+        self.other_category = EventCategory.objects.create(name="Category 2", description="Description 2")
+        self.day = timezone.make_aware(datetime(2030, 1, 1))
+        self.slots = [
+            TimeSlot.objects.create(
+                category=self.category,
+                start_time=self.day + timedelta(hours=9 + i),
+                end_time=self.day + timedelta(hours=10 + i),
+            )
+            for i in range(3)
+        ]
+
+    def get_auth_headers(self, user):
+        refresh = RefreshToken.for_user(user)
+        return {
+            'HTTP_AUTHORIZATION': f'Bearer {str(refresh.access_token)}',
+            'Content-Type': 'application/json'
+        }
+
+    def summary(self):
+        return {
+            (category_id, day.isoformat()): (total, booked)
+            for category_id, day, total, booked in SlotAvailability.objects.values_list(
+                'category_id', 'day', 'total', 'booked'
+            )
+        }
+
+    def test_created_slots_are_counted(self):
+        self.assertEqual(self.summary(), {(self.category.id, '2030-01-01'): (3, 0)})
+
+    def test_book_and_unsubscribe(self):
+        headers = self.get_auth_headers(self.user)
+        self.client.post(reverse('timeslot_book', kwargs={'pk': self.slots[0].id}), **headers)
+        self.client.post(reverse('timeslot_book', kwargs={'pk': self.slots[1].id}), **headers)
+        self.assertEqual(self.summary(), {(self.category.id, '2030-01-01'): (3, 2)})
+
+        self.client.post(reverse('timeslot_unsubscribe', kwargs={'pk': self.slots[0].id}), **headers)
+        self.assertEqual(self.summary(), {(self.category.id, '2030-01-01'): (3, 1)})
+
+    def test_batch_book_and_unsubscribe(self):
+        headers = self.get_auth_headers(self.user)
+        ids = [slot.id for slot in self.slots]
+        self.client.post(reverse('timeslot_batch_book'), {'slot_ids': ids}, format='json', **headers)
+        self.assertEqual(self.summary(), {(self.category.id, '2030-01-01'): (3, 3)})
+
+        self.client.post(reverse('timeslot_batch_unsubscribe'), {'slot_ids': ids[:2]}, format='json', **headers)
+        self.assertEqual(self.summary(), {(self.category.id, '2030-01-01'): (3, 1)})
+
+    def test_failed_batch_leaves_summary_alone(self):
+        self.slots[2].user = self.admin
+        self.slots[2].save()
+        ids = [slot.id for slot in self.slots]
+        response = self.client.post(
+            reverse('timeslot_batch_book'), {'slot_ids': ids}, format='json', **self.get_auth_headers(self.user)
+        )
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(self.summary(), {(self.category.id, '2030-01-01'): (3, 1)})
+
+    def test_retime_recategorise_and_delete(self):
+        headers = self.get_auth_headers(self.admin)
+        slot = self.slots[0]
+        response = self.client.patch(
+            reverse('timeslot-detail', kwargs={'pk': slot.id}),
+            {
+                'category_id': self.other_category.id,
+                'start_time': (self.day + timedelta(days=1, hours=9)).isoformat(),
+                'end_time': (self.day + timedelta(days=1, hours=10)).isoformat(),
+                'user_id': self.user.id,
+            },
+            format='json', **headers,
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.summary(), {
+            (self.category.id, '2030-01-01'): (2, 0),
+            (self.other_category.id, '2030-01-02'): (1, 1),
+        })
+
+        self.client.delete(reverse('timeslot-detail', kwargs={'pk': slot.id}), **headers)
+        self.assertEqual(self.summary(), {
+            (self.category.id, '2030-01-01'): (2, 0),
+            (self.other_category.id, '2030-01-02'): (0, 0),
+        })
+
+    def test_deleting_user_releases_bookings(self):
+        self.slots[0].user = self.user
+        self.slots[0].save()
+        self.user.delete()
+        self.assertEqual(self.summary(), {(self.category.id, '2030-01-01'): (3, 0)})
+
+    def test_recurrence_adds_slots(self):
+        response = self.client.post(reverse('timeslot_recurring'), {
+            'category_id': self.other_category.id,
+            'start_time': self.day.isoformat(),
+            'duration': '01:00:00',
+            'freq': 'daily',
+            'count': 3,
+        }, format='json', **self.get_auth_headers(self.admin))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.summary(), {
+            (self.category.id, '2030-01-01'): (3, 0),
+            (self.other_category.id, '2030-01-01'): (1, 0),
+            (self.other_category.id, '2030-01-02'): (1, 0),
+            (self.other_category.id, '2030-01-03'): (1, 0),
+        })
+
+    def test_rebuild_repairs_drift(self):
+        # Queryset updates bypass the summary, like raw SQL would.
+        TimeSlot.objects.filter(pk=self.slots[0].pk).update(user=self.user)
+        SlotAvailability.objects.create(category=self.other_category, day=self.day.date(), total=5)
+
+        out = io.StringIO()
+        call_command('rebuild_availability', '--start', '2030-01-01', '--end', '2030-01-02', stdout=out)
+        self.assertIn('Rebuilt 1 availability rows.', out.getvalue())
+        self.assertEqual(self.summary(), {(self.category.id, '2030-01-01'): (3, 1)})
+
+        for value in ('tomorrow', '2030-02-30'):
+            with self.assertRaises(CommandError):
+                call_command('rebuild_availability', '--start', value)
+
+    def test_endpoint_returns_range_in_one_query(self):
+        TimeSlot.objects.create(
+            category=self.other_category,
+            start_time=self.day + timedelta(days=40),
+            end_time=self.day + timedelta(days=40, hours=1),
+        )
+        url = reverse('timeslot_availability')
+        headers = self.get_auth_headers(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'start': '2030-01-01', 'end': '2030-04-01'}, **headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['days'], [
+            {'day': datetime(2030, 1, 1).date(), 'category': self.category.id, 'total': 3, 'booked': 0},
+            {'day': datetime(2030, 2, 10).date(), 'category': self.other_category.id, 'total': 1, 'booked': 0},
+        ])
+        self.assertEqual(sum('scheduler_slotavailability' in query['sql'] for query in queries.captured_queries), 1)
+
+        response = self.client.get(
+            url, {'start': '2030-01-01', 'end': '2030-04-01', 'category': self.other_category.id}, **headers
+        )
+        self.assertEqual([day['category'] for day in response.data['days']], [self.other_category.id])
+
+    def test_endpoint_validates_range(self):
+        url = reverse('timeslot_availability')
+        headers = self.get_auth_headers(self.user)
+        for params in (
+            {'start': 'soon'},
+            {'start': '2030-02-30'},
+            {'start': '2030-02-01', 'end': '2030-01-01'},
+            {'start': '2030-01-01', 'end': '2032-01-01'},
+            {'category': 'yoga'},
+        ):
+            response = self.client.get(url, params, **headers)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class SlotArchiveTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.admin = User.objects.create_superuser(username='admin', password='admin123')
+        self.user = User.objects.create_user(username='user', password='user123')
+        self.category = EventCategory.objects.create(name="Category 1", description="Description 1")
+        now = timezone.now()
+        self.old = [
+            TimeSlot.objects.create(
+                category=self.category,
+                start_time=now - timedelta(days=200 - i),
+                end_time=now - timedelta(days=200 - i, hours=-1),
+                user=self.user if i == 0 else None,
+            )
+            for i in range(5)
+        ]
+        self.recent = TimeSlot.objects.create(
+            category=self.category,
+            start_time=now - timedelta(days=1),
+            end_time=now - timedelta(days=1, hours=-1),
+        )
+        self.upcoming = TimeSlot.objects.create(
+            category=self.category,
+            start_time=now + timedelta(days=1),
+            end_time=now + timedelta(days=1, hours=1),
+        )
+        WaitlistEntry.objects.create(slot=self.old[0], user=self.admin)
+
+    def get_auth_headers(self, user):
+        refresh = RefreshToken.for_user(user)
+        return {
+            'HTTP_AUTHORIZATION': f'Bearer {str(refresh.access_token)}',
+            'Content-Type': 'application/json'
+        }
+
+    def archive(self, *args):
+        out = io.StringIO()
+        call_command('archive_slots', '--pause', '0', *args, stdout=out)
+        return out.getvalue()
+
+    def test_moves_old_slots_in_batches(self):
+        summary = list(SlotAvailability.objects.order_by('day').values_list('day', 'total', 'booked'))
+        output = self.archive('--days', '90', '--batch-size', '2')
+
+        self.assertIn('Archived 5 slots', output)
+        self.assertEqual(set(TimeSlot.objects.values_list('id', flat=True)), {self.recent.id, self.upcoming.id})
+        archived = list(ArchivedTimeSlot.objects.order_by('start_time').values_list('original_id', 'user_id'))
+        self.assertEqual(archived, [(slot.id, slot.user_id) for slot in self.old])
+        self.assertFalse(WaitlistEntry.objects.exists())
+
+        # The calendar keeps counting archived slots, also after a rebuild.
+        self.assertEqual(list(SlotAvailability.objects.order_by('day').values_list('day', 'total', 'booked')), summary)
+        call_command('rebuild_availability', stdout=io.StringIO())
+        self.assertEqual(list(SlotAvailability.objects.order_by('day').values_list('day', 'total', 'booked')), summary)
+
+        self.assertIn('Archived 0 slots', self.archive())
+
+    def test_deleting_user_releases_archived_bookings(self):
+        self.archive()
+        self.user.delete()
+        self.assertFalse(SlotAvailability.objects.filter(booked__gt=0).exists())
+        self.assertIsNone(ArchivedTimeSlot.objects.get(original_id=self.old[0].id).user_id)
+
+    def test_limit_and_validation(self):
+        self.assertIn('Archived 3 slots', self.archive('--limit', '3', '--batch-size', '2'))
+        self.assertEqual(ArchivedTimeSlot.objects.count(), 3)
+        with self.assertRaises(CommandError):
+            self.archive('--days', '0')
+
+    def test_export_archived_slots(self):
+        self.archive()
+        response = self.client.get(
+            reverse('timeslot_export', kwargs={'export_format': 'ndjson'}), {'archived': '1'},
+            **self.get_auth_headers(self.admin),
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('slots-archive.ndjson', response['Content-Disposition'])
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['id'] for row in rows], [slot.id for slot in self.old])
+        self.assertEqual(rows[0]['username'], 'user')
+
+        response = self.client.get(
+            reverse('timeslot_export', kwargs={'export_format': 'ndjson'}), {'archived': 'false'},
+            **self.get_auth_headers(self.admin),
+        )
+        self.assertIn('slots.ndjson', response['Content-Disposition'])
+
+    def test_admin_lists_archived_slots(self):
+        self.archive()
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('admin:scheduler_archivedtimeslot_changelist'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertContains(response, '5 archived time slots')
+        response = self.client.get(reverse('admin:scheduler_archivedtimeslot_add'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        archived = ArchivedTimeSlot.objects.first()
+        response = self.client.get(reverse('admin:scheduler_archivedtimeslot_delete', args=[archived.pk]))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -1,13 +1,27 @@
 from django.urls import path, include, re_path
 from rest_framework.routers import DefaultRouter
 from django.views.generic import TemplateView
+from .async_views import (
+    async_category_list,
+    async_slot_book,
+    async_slot_events,
+    async_slot_list,
+    async_slot_unsubscribe,
+)
+from .metrics import metrics_view
 from .views import (
     EventCategoryListView, 
     UserPreferenceDetailView,
     RegisterView,
+    TimeSlotAvailabilityView,
+    TimeSlotBatchBookView,
+    TimeSlotBatchUnsubscribeView,
     TimeSlotBookView,
+    TimeSlotExportView,
+    TimeSlotRecurrenceView,
     TimeSlotUnsubscribeView,
     TimeSlotViewSet,
+    TimeSlotWaitlistView,
     UserViewSet,
 )
 
@@ -20,8 +34,22 @@ urlpatterns = [
     path('categories/', EventCategoryListView.as_view(), name='event_category_list'),
     path('preferences/', UserPreferenceDetailView.as_view(), name='user_preference_detail'),
     path('register/', RegisterView.as_view(), name='register'),
+    path('metrics/', metrics_view, name='metrics'),
+    path('slots/book/', TimeSlotBatchBookView.as_view(), name='timeslot_batch_book'),
+    path('slots/unsubscribe/', TimeSlotBatchUnsubscribeView.as_view(), name='timeslot_batch_unsubscribe'),
+    path('slots/availability/', TimeSlotAvailabilityView.as_view(), name='timeslot_availability'),
+    re_path(r'^slots/export\.(?P<export_format>csv|ndjson)$', TimeSlotExportView.as_view(), name='timeslot_export'),
+    path('slots/recurring/', TimeSlotRecurrenceView.as_view(), name='timeslot_recurring'),
     path('slots/<int:pk>/book/', TimeSlotBookView.as_view(), name='timeslot_book'),
     path('slots/<int:pk>/unsubscribe/', TimeSlotUnsubscribeView.as_view(), name='timeslot_unsubscribe'),
+    path('slots/<int:pk>/waitlist/', TimeSlotWaitlistView.as_view(), name='timeslot_waitlist'),
+
+    # ASGI-native variants of the hot endpoints
+    path('async/categories/', async_category_list, name='async_event_category_list'),
+    path('async/slots/', async_slot_list, name='async_timeslot_list'),
+    path('async/slots/events/', async_slot_events, name='async_timeslot_events'),
+    path('async/slots/<int:pk>/book/', async_slot_book, name='async_timeslot_book'),
+    path('async/slots/<int:pk>/unsubscribe/', async_slot_unsubscribe, name='async_timeslot_unsubscribe'),
 
     path('', include(router.urls)),
 ]
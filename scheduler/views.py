@@ -1,28 +1,101 @@
 from rest_framework import generics, viewsets, permissions
+from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
 from django.contrib.auth.models import User
-from django.contrib.auth.password_validation import validate_password
-from django.core.exceptions import ValidationError
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists
+from django.http import StreamingHttpResponse
 from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.dateparse import parse_date
 from datetime import timedelta
-from .models import EventCategory, UserPreference, TimeSlot
+import io
+from .availability import get_availability, update_availability
+from .booking import (book_slot,
+                      find_free_slots,
+                      get_batch_conflicts,
+                      join_waitlist,
+                      leave_waitlist,
+                      lock_user_bookings,
+                      lock_waiting_users,
+                      overlapping_bookings,
+                      promote_waitlist,
+                      unsubscribe_slot,
+                      waitlist_position,
+                      )
+from .cache import (bump_week_versions,
+                    etag_matches,
+                    get_cached_week,
+                    get_etag,
+                    get_preferred_category_ids,
+                    get_week_cache_key,
+                    get_week_start,
+                    get_week_version,
+                    parse_flag,
+                    parse_week_offset,
+                    set_cached_week,
+                    )
+from .events import BOOKED, FREE, publish_slot_events, slot_event
+from .export import ARCHIVE_EXPORT_FIELDS, EXPORT_FIELDS, parse_export_datetime, stream_csv, stream_ndjson
+from .hashing import (HashingPoolFull,
+                      HashingUnavailable,
+                      fail_when_full,
+                      shared_hash_many,
+                      validate_and_hash_password)
+from .metrics import record_booking, record_unsubscribe
+from .models import ArchivedTimeSlot, EventCategory, UserPreference, TimeSlot
+from .pagination import TimeSlotCursorPagination, UserCursorPagination
+from .provisioning import UserProvisioner, read_user_rows
+from .routers import use_primary
 from .serializers import (EventCategorySerializer, 
                           UserPreferenceSerializer, 
                           TimeSlotSerializer, 
                           TimeSlotCreateSerializer,
+                          TimeSlotBatchSerializer,
+                          TimeSlotRecurrenceSerializer,
+                          TimeSlotSearchSerializer,
                           UserSerializer,
                           )
+from .throttling import LoginIPThrottle, LoginUsernameThrottle
 
 
 class UserViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = User.objects.all()
+    queryset = User.objects.only('id', 'username').order_by('id')
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAdminUser]
+    pagination_class = UserCursorPagination
+
+    def paginate_queryset(self, queryset):
+        # The admin page still expects a plain list; page only when asked to.
+        params = self.request.query_params
+        if self.paginator.cursor_query_param not in params and self.paginator.page_size_query_param not in params:
+            return None
+        return super().paginate_queryset(queryset)
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        # Either a CSV/JSONL upload in "file" or a JSON body {"users": [...]}.
+        upload = request.FILES.get('file')
+        if upload is not None:
+            file_format = request.data.get('format') or ('csv' if upload.name.lower().endswith('.csv') else 'jsonl')
+            rows = read_user_rows(io.TextIOWrapper(upload.file, encoding='utf-8', newline=''), file_format)
+        elif isinstance(request.data.get('users'), list):
+            rows = (
+                (number, row if isinstance(row, dict) else {'_invalid': row})
+                for number, row in enumerate(request.data['users'], start=1)
+            )
+        else:
+            return Response({"detail": "Upload a CSV/JSONL 'file' or send a 'users' list."}, status=400)
+
+        result = UserProvisioner().run(rows, hash_many=shared_hash_many)
+        return Response(result, status=201 if result['created'] else 400)
 
 class RegisterView(APIView):
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [LoginIPThrottle, LoginUsernameThrottle]
 
     def post(self, request):
         username = request.data.get("username")
@@ -34,12 +107,15 @@ class RegisterView(APIView):
         if User.objects.filter(username=username).exists():
             return Response({"detail": "Username already exists."}, status=400)
         
+        # Validation and hashing run in the hashing pool, off this worker.
         try:
-            validate_password(password)
-        except ValidationError as e:
-            return Response({"detail": e.messages}, status=400)
+            messages, encoded_password = validate_and_hash_password(username, password)
+        except HashingPoolFull:
+            raise HashingUnavailable()
+        if messages:
+            return Response({"detail": messages}, status=400)
         
-        user = User.objects.create_user(username=username, password=password)
+        user = User.objects.create(username=User.normalize_username(username), password=encoded_password)
         return Response({"detail": "User successfully created."}, status=201)
 
 
@@ -48,14 +124,16 @@ class EventCategoryListView(generics.ListAPIView):
     queryset = EventCategory.objects.all()
     serializer_class = EventCategorySerializer
     permission_classes = [permissions.AllowAny]
+    read_from_replica = True
 
 
 class UserPreferenceDetailView(generics.RetrieveUpdateAPIView):
     serializer_class = UserPreferenceSerializer
     permission_classes = [permissions.IsAuthenticated]
+    read_from_replica = True
 
     def get_object(self):
-        obj, created = UserPreference.objects.get_or_create(user=self.request.user)
+        obj, created = UserPreference.objects.get_or_create(user_id=self.request.user.pk)
         return obj
 
 
@@ -63,40 +141,220 @@ class TimeSlotBookView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, pk):
-        try:
-            slot = TimeSlot.objects.get(pk=pk)
-        except TimeSlot.DoesNotExist:
-            return Response({"detail": "Slot not found."}, status=404)
+        status, detail = book_slot(request.user, pk)
+        record_booking(status)
+        return Response({"detail": detail}, status=status)
 
-        if slot.user is not None:
-            return Response({"detail": "Slot already taken."}, status=400)
 
-        slot.user = request.user
-        slot.save()
-        return Response({"detail": "Successfully booked."}, status=200)
+class TimeSlotUnsubscribeView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
 
+    def post(self, request, pk):
+        status, detail = unsubscribe_slot(request.user, pk)
+        record_unsubscribe(status)
+        return Response({"detail": detail}, status=status)
 
-class TimeSlotUnsubscribeView(APIView):
+
+class TimeSlotWaitlistView(APIView):
+    # Users queue for a taken slot instead of polling the book endpoint; the
+    # unsubscribe that frees it books it for the head of the queue.
     permission_classes = [permissions.IsAuthenticated]
+    read_from_replica = True
 
-    def post(Self, request, pk):
-        try:
-            slot = TimeSlot.objects.get(pk=pk)
-        except TimeSlot.DoesNotExist:
-            return Response({"detail": "Slot not found."}, status=404)
-        
-        if slot.user != request.user:
-            return Response({"detail": "You are not subscribed to this slot."}, status=403)
+    def get(self, request, pk):
+        position = waitlist_position(request.user, pk)
+        if position is None:
+            return Response({"detail": "You are not on the waitlist."}, status=404)
+        return Response({"position": position})
+
+    def post(self, request, pk):
+        status, detail, position = join_waitlist(request.user, pk)
+        if position is None:
+            return Response({"detail": detail}, status=status)
+        return Response({"detail": detail, "position": position}, status=status)
 
-        slot.user = None
-        slot.save()
-        return Response({"detail": "Unsubscribed."}, status=200)
+    def delete(self, request, pk):
+        if not leave_waitlist(request.user, pk):
+            return Response({"detail": "You are not on the waitlist."}, status=404)
+        return Response(status=204)
     
 
+
+class TimeSlotBatchBookView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = TimeSlotBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        slot_ids = serializer.validated_data['slot_ids']
+
+        # All-or-nothing: one UPDATE for the whole batch, rolled back unless
+        # every requested slot was still free and clash-free.
+        booked = 0
+        with transaction.atomic():
+            lock_user_bookings(request.user)
+            slots, conflicts = get_batch_conflicts(request.user, slot_ids)
+            if not any(conflicts.values()):
+                booked = TimeSlot.objects.filter(
+                    ~Exists(overlapping_bookings(request.user)), pk__in=slot_ids, user__isnull=True
+                ).update(user_id=request.user.pk)
+                if booked == len(slot_ids):
+                    update_availability(
+                        (category_id, start_time, 0, 1) for start_time, _, _, category_id in slots.values()
+                    )
+                    bump_week_versions(*(slot[0] for slot in slots.values()))
+                    publish_slot_events(*(
+                        slot_event(pk, start_time, category_id, BOOKED)
+                        for pk, (start_time, end_time, user_id, category_id) in slots.items()
+                    ))
+                else:
+                    transaction.set_rollback(True)
+
+        if booked == len(slot_ids):
+            return Response({"detail": "Successfully booked.", "booked": slot_ids}, status=200)
+
+        if not any(conflicts.values()):
+            # Lost a race after the pre-check; report the state that beat us.
+            slots, conflicts = get_batch_conflicts(request.user, slot_ids)
+        return Response({"detail": "Some slots could not be booked.", **conflicts}, status=409)
+
+
+class TimeSlotBatchUnsubscribeView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = TimeSlotBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        slot_ids = serializer.validated_data['slot_ids']
+
+        with transaction.atomic():
+            waiting = lock_waiting_users(slot_ids)
+            slots = TimeSlot.objects.filter(pk__in=slot_ids)
+            released = slots.filter(user_id=request.user.pk).update(user=None)
+            if released == len(slot_ids):
+                released_slots = list(slots.values_list('id', 'start_time', 'category_id'))
+                promoted = promote_waitlist(slot_ids, waiting)
+                update_availability(
+                    (category_id, start_time, 0, -1)
+                    for pk, start_time, category_id in released_slots if pk not in promoted
+                )
+                bump_week_versions(*(start_time for pk, start_time, category_id in released_slots))
+                publish_slot_events(*(
+                    slot_event(pk, start_time, category_id, BOOKED if pk in promoted else FREE)
+                    for pk, start_time, category_id in released_slots
+                ))
+            else:
+                transaction.set_rollback(True)
+
+        if released == len(slot_ids):
+            return Response({"detail": "Unsubscribed.", "unsubscribed": slot_ids}, status=200)
+
+        owners = dict(TimeSlot.objects.filter(pk__in=slot_ids).values_list('id', 'user_id'))
+        return Response({
+            "detail": "You are not subscribed to some of these slots.",
+            "not_subscribed": [pk for pk in slot_ids if pk in owners and owners[pk] != request.user.pk],
+            "not_found": [pk for pk in slot_ids if pk not in owners],
+        }, status=403)
+
+
+class TimeSlotExportView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, export_format):
+        # ?archived=1 exports the slots moved out by archive_slots instead.
+        archived = parse_flag(request.query_params.get('archived'))
+        if archived:
+            qs, fields = ArchivedTimeSlot.objects.order_by('start_time', 'id'), ARCHIVE_EXPORT_FIELDS
+        else:
+            qs, fields = TimeSlot.objects.order_by('start_time', 'id'), EXPORT_FIELDS
+        for param, lookup in (('start', 'start_time__gte'), ('end', 'start_time__lt')):
+            value = request.query_params.get(param)
+            if value is None:
+                continue
+            parsed = parse_export_datetime(value)
+            if parsed is None:
+                return Response({"detail": f"Invalid '{param}' date."}, status=400)
+            qs = qs.filter(**{lookup: parsed})
+        category = request.query_params.get('category')
+        if category is not None:
+            if not category.isdigit():
+                return Response({"detail": "Invalid 'category'."}, status=400)
+            qs = qs.filter(category_id=category)
+
+        rows = qs.values_list(*fields).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+        if export_format == 'csv':
+            content, content_type = stream_csv(rows), 'text/csv'
+        else:
+            content, content_type = stream_ndjson(rows), 'application/x-ndjson'
+
+        response = StreamingHttpResponse(content, content_type=content_type)
+        filename = 'slots-archive' if archived else 'slots'
+        response['Content-Disposition'] = f'attachment; filename="{filename}.{export_format}"'
+        return response
+
+
+class TimeSlotAvailabilityView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    read_from_replica = True
+
+    def get(self, request):
+        dates = {}
+        for param in ('start', 'end'):
+            value = request.query_params.get(param)
+            try:
+                # None for a malformed value, ValueError for e.g. 2030-02-30.
+                dates[param] = parse_date(value) if value is not None else None
+            except ValueError:
+                dates[param] = None
+            if value is not None and dates[param] is None:
+                return Response({"detail": f"Invalid '{param}' date."}, status=400)
+        start = dates['start'] or timezone.localdate().replace(day=1)
+        end = dates['end'] or start + timedelta(days=92)
+        if end <= start:
+            return Response({"detail": "'end' must be after 'start'."}, status=400)
+        if (end - start).days > settings.AVAILABILITY_MAX_DAYS:
+            return Response({"detail": f"At most {settings.AVAILABILITY_MAX_DAYS} days per request."}, status=400)
+        category = request.query_params.get('category')
+        if category is not None and not category.isdigit():
+            return Response({"detail": "Invalid 'category'."}, status=400)
+
+        return Response({
+            "start": start,
+            "end": end,
+            "days": [
+                {"day": day, "category": category_id, "total": total, "booked": booked}
+                for day, category_id, total, booked in get_availability(start, end, category)
+            ],
+        })
+
+
+class TimeSlotRecurrenceView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request):
+        serializer = TimeSlotRecurrenceSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        occurrences = serializer.validated_data['occurrences']
+
+        if serializer.validated_data['dry_run']:
+            return Response({
+                "count": len(occurrences),
+                "occurrences": [
+                    {"start_time": start.isoformat(), "end_time": end.isoformat()}
+                    for start, end in occurrences
+                ],
+            }, status=200)
+
+        slots = serializer.save()
+        return Response({"created": len(slots)}, status=201)
+
+
 class TimeSlotViewSet(viewsets.ModelViewSet):
-    queryset = TimeSlot.objects.all()
+    queryset = TimeSlot.objects.select_related('category', 'user')
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['category']
+    pagination_class = TimeSlotCursorPagination
+    read_from_replica = True
 
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
@@ -104,26 +362,99 @@ class TimeSlotViewSet(viewsets.ModelViewSet):
         return TimeSlotSerializer
 
     def get_permissions(self):
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'search']:
             permission_classes = [permissions.IsAuthenticated]
         else:
             permission_classes = [permissions.IsAdminUser]
         return [permission() for permission in permission_classes]
 
+    def paginate_queryset(self, queryset):
+        # A single week is already bounded; keep returning a plain list there.
+        if 'week' in self.request.query_params:
+            return None
+        return super().paginate_queryset(queryset)
+
+    def get_week_start(self):
+        week = self.request.query_params.get('week')
+        if week is None:
+            return None
+        return get_week_start(parse_week_offset(week))
+
+    def get_preferred_category_ids(self):
+        if not parse_flag(self.request.query_params.get('preferred')):
+            return None
+        # No stored preferences means "everything", as in the calendar view.
+        return get_preferred_category_ids(self.request.user) or None
+
+    def list(self, request, *args, **kwargs):
+        start_of_week = self.get_week_start()
+        # Only week listings with the known filters are cached; anything else
+        # (paging, unknown filters) goes straight to the database.
+        if start_of_week is None or not set(request.query_params) <= {'week', 'category', 'preferred', 'only_free'}:
+            return super().list(request, *args, **kwargs)
+
+        preferred = self.get_preferred_category_ids()
+        cache_key = get_week_cache_key(
+            start_of_week,
+            get_week_version(start_of_week),
+            request.query_params.get('category', ''),
+            ','.join(str(pk) for pk in preferred or []),
+            parse_flag(request.query_params.get('only_free')),
+        )
+        etag = get_etag(cache_key)
+
+        if etag_matches(request.META.get('HTTP_IF_NONE_MATCH'), etag):
+            response = Response(status=304)
+        else:
+            data = get_cached_week(cache_key)
+            if data is None:
+                # Cached under the current version, so read what was committed.
+                with use_primary():
+                    response = super().list(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                set_cached_week(cache_key, list(response.data))
+            else:
+                response = Response(data)
+
+        response['ETag'] = etag
+        patch_vary_headers(response, ['Authorization'])
+        return response
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        # The next free slots matching the filters, in one LIMIT query, so
+        # clients don't page through ?week=N themselves.
+        serializer = TimeSlotSearchSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        filters = serializer.validated_data
+        category_ids = filters.get('categories') or get_preferred_category_ids(request.user)
+        slots = find_free_slots(
+            request.user,
+            filters['start'],
+            filters['end'],
+            filters['limit'],
+            category_ids=category_ids,
+            from_time=filters.get('from_time'),
+            to_time=filters.get('to_time'),
+            weekdays=filters.get('weekdays'),
+            min_duration=filters.get('min_duration'),
+        )
+        return Response(TimeSlotSerializer(slots, many=True).data)
+
     def get_queryset(self):
         qs = super().get_queryset()
-        week = self.request.query_params.get('week')
-        if week is not None:
-            try:
-                week_offset = int(week)
-            except ValueError:
-                week_offset = 0
-            today = timezone.now().date()
-            start_of_week = today - timedelta(days=today.weekday())
-            start_of_week = start_of_week + timedelta(weeks=week_offset)
+        start_of_week = self.get_week_start()
+        if start_of_week is not None:
             end_of_week = start_of_week + timedelta(days=7)
 
             qs = qs.filter(start_time__gte=start_of_week, start_time__lte=end_of_week)
+
+        preferred = self.get_preferred_category_ids()
+        if preferred is not None:
+            qs = qs.filter(category_id__in=preferred)
+        if parse_flag(self.request.query_params.get('only_free')):
+            qs = qs.filter(user__isnull=True)
         return qs
     
 
@@ -132,5 +463,14 @@ from .serializers import CustomTokenObtainPairSerializer
 
 class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
+    throttle_classes = [LoginIPThrottle, LoginUsernameThrottle]
+
+    def post(self, request, *args, **kwargs):
+        # Answer 503 instead of hashing inline when the pool is full.
+        try:
+            with fail_when_full():
+                return super().post(request, *args, **kwargs)
+        except HashingPoolFull:
+            raise HashingUnavailable()
 
     
\ No newline at end of file